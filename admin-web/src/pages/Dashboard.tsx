@@ -21,52 +21,41 @@ export default function Dashboard() {
 
   const fetchStats = async () => {
     try {
-      const [ordersRes, productsRes, usersRes] = await Promise.all([
-        api.get('/orders/'),
+      // Order totals are aggregated by the server (recent and archived); the orders themselves aren't fetched
+      const [orderStatsRes, productsRes, usersRes] = await Promise.all([
+        api.get('/orders/stats/'),
         api.get('/products/'),
         api.get('/users/')
       ]);
 
-      const orders = ordersRes.data;
+      const orderStats = orderStatsRes.data;
       const products = productsRes.data;
       const users = usersRes.data;
 
-      const revenue = orders.reduce((sum: number, order: any) => sum + parseFloat(order.total_amount), 0);
-
       setStats({
-        totalOrders: orders.length,
-        totalRevenue: revenue,
+        totalOrders: orderStats.count,
+        totalRevenue: parseFloat(orderStats.revenue),
         totalProducts: products.length,
         totalUsers: users.length
       });
 
-      // Process data for Revenue Chart (group by date)
-      const revenueByDate: any = {};
-      orders.forEach((order: any) => {
-        const date = new Date(order.created_at).toLocaleDateString('en-US', { month: 'short', day: 'numeric' });
-        revenueByDate[date] = (revenueByDate[date] || 0) + parseFloat(order.total_amount);
-      });
-
-      const chartData = Object.keys(revenueByDate).map(date => ({
-        name: date,
-        revenue: revenueByDate[date]
-      })).slice(-7); // Last 7 entries
+      // Revenue Chart: the last days that had orders, oldest first
+      const chartData = orderStats.revenue_by_day.map((day: any) => ({
+        name: new Date(`${day.date}T00:00:00`).toLocaleDateString('en-US', { month: 'short', day: 'numeric' }),
+        revenue: parseFloat(day.revenue)
+      }));
 
       setRevenueData(chartData as any);
 
-      // Process data for Order Status Chart
-      const statusCounts: any = {};
-      orders.forEach((order: any) => {
-        const status = order.status.replace(/_/g, ' ');
-        const formattedStatus = status.charAt(0).toUpperCase() + status.slice(1);
-        statusCounts[formattedStatus] = (statusCounts[formattedStatus] || 0) + 1;
+      // Order Status Chart
+      const statusChartData = Object.keys(orderStats.by_status).map(key => {
+        const status = key.replace(/_/g, ' ');
+        return {
+          name: status.charAt(0).toUpperCase() + status.slice(1),
+          orders: orderStats.by_status[key]
+        };
       });
 
-      const statusChartData = Object.keys(statusCounts).map(status => ({
-        name: status,
-        orders: statusCounts[status]
-      }));
-
       setOrderStatusData(statusChartData as any);
 
     } catch (error) {
@@ -27,10 +27,15 @@ export default function Orders() {
     const [selectedOrder, setSelectedOrder] = useState<Order | null>(null);
     const [searchTerm, setSearchTerm] = useState('');
     const [isLoading, setIsLoading] = useState(true);
+    // Orders come a page at a time; archived (old delivered/cancelled) orders are a separate list
+    const [archived, setArchived] = useState(false);
+    const [nextPage, setNextPage] = useState<string | null>(null);
+    const [isLoadingMore, setIsLoadingMore] = useState(false);
 
     useEffect(() => {
+        setSelectedOrder(null);
         fetchOrders();
-    }, []);
+    }, [archived]);
 
     useEffect(() => {
         const results = orders.filter(order =>
@@ -43,11 +48,10 @@ export default function Orders() {
     const fetchOrders = async () => {
         setIsLoading(true);
         try {
-            const response = await api.get('/orders/');
-            setOrders(response.data);
-            if (response.data && response.data.length > 0 && !selectedOrder) {
-                // Optionally select the first order
-            }
+            // page_size opts into cursor paging; `next` then links the following page
+            const response = await api.get('/orders/', { params: { page_size: 50, ...(archived ? { archive: 'only' } : {}) } });
+            setOrders(response.data.results);
+            setNextPage(response.data.next);
         } catch (error) {
             console.error('Error fetching orders:', error);
         } finally {
@@ -55,6 +59,20 @@ export default function Orders() {
         }
     };
 
+    const loadMore = async () => {
+        if (!nextPage) return;
+        setIsLoadingMore(true);
+        try {
+            const response = await api.get(nextPage);
+            setOrders(prev => [...prev, ...response.data.results]);
+            setNextPage(response.data.next);
+        } catch (error) {
+            console.error('Error fetching orders:', error);
+        } finally {
+            setIsLoadingMore(false);
+        }
+    };
+
     const updateStatus = async (id: number, status: string) => {
         try {
             await api.patch(`/orders/${id}/`, { status });
@@ -99,8 +117,19 @@ export default function Orders() {
                             <h2 className="text-2xl font-bold text-gray-900">Orders</h2>
                             <p className="text-sm text-gray-500 font-medium">Manage and track deliveries</p>
                         </div>
-                        <div className="bg-gray-100 px-3 py-1 rounded-full text-xs font-bold text-gray-500">
-                            {orders.length} Total
+                        <div className="flex items-center gap-2">
+                            <button
+                                onClick={() => setArchived(!archived)}
+                                className={`px-3 py-1 rounded-full text-xs font-bold border transition-colors ${archived
+                                    ? 'bg-gray-900 text-white border-gray-900'
+                                    : 'bg-white text-gray-500 border-gray-200 hover:border-gray-300'
+                                    }`}
+                            >
+                                Archived
+                            </button>
+                            <div className="bg-gray-100 px-3 py-1 rounded-full text-xs font-bold text-gray-500">
+                                {orders.length}{nextPage ? '+' : ''} Shown
+                            </div>
                         </div>
                     </div>
 
@@ -152,6 +181,15 @@ export default function Orders() {
                                     </div>
                                 </div>
                             ))}
+                            {nextPage && (
+                                <button
+                                    onClick={loadMore}
+                                    disabled={isLoadingMore}
+                                    className="w-full py-3 rounded-xl text-sm font-bold text-gray-500 bg-gray-50 hover:bg-gray-100 transition-colors disabled:opacity-50"
+                                >
+                                    {isLoadingMore ? 'Loading...' : 'Load more'}
+                                </button>
+                            )}
                         </div>
                     ) : (
                         <div className="flex flex-col items-center justify-center h-48 text-gray-400">
@@ -181,8 +219,8 @@ export default function Orders() {
                         </div>
 
                         <div className="flex-1 overflow-y-auto p-8 space-y-8 custom-scrollbar">
-                            {/* Detailed Status Actions */}
-                            <div>
+                            {/* Detailed Status Actions (archived orders are read-only) */}
+                            {!archived && <div>
                                 <h3 className="text-xs font-bold text-gray-400 uppercase tracking-widest mb-4">Update Status</h3>
                                 <div className="grid grid-cols-5 gap-2">
                                     {['received', 'preparing', 'ready', 'out_for_delivery', 'delivered'].map((status) => {
@@ -212,7 +250,7 @@ export default function Orders() {
                                 <div className="text-center mt-2 text-xs font-medium text-gray-400">
                                     Current Status: <span className="text-gray-900 font-bold uppercase">{selectedOrder.status.replace(/_/g, ' ')}</span>
                                 </div>
-                            </div>
+                            </div>}
 
                             {/* Customer & Delivery */}
                             <div className="bg-gray-50/50 rounded-2xl p-6 border border-gray-100">
@@ -4,5 +4,6 @@ import { defineConfig } from 'vite'
 // https://vite.dev/config/
 export default defineConfig({
   plugins: [react()],
-  base: '/',
+  // Served by Django under STATIC_URL; the SPA shell itself is served at every route
+  base: '/static/',
 })
@@ -120,7 +120,10 @@ const ReelItem = memo(({ item, isActive, isFocused, handleSave }: { item: any, i
             </View>
             <TouchableOpacity
               style={styles.orderButton}
-              onPress={() => router.push(`/product/${item.product}` as any)}
+              onPress={() => {
+                api.post(`/reels/${item.id}/order_click/`).catch((err) => { });
+                router.push(`/product/${item.product}` as any);
+              }}
             >
               <Text style={styles.orderButtonText}>Order from {item.restaurant_data?.name || 'Restaurant'}</Text>
               <ShoppingBag size={16} color="#FFF" style={{ marginLeft: 4 }} />
@@ -3,25 +3,63 @@ import api from '@/constants/api';
 import { useAuthStore } from '@/store/useAuthStore';
 import { useCartStore } from '@/store/useCartStore';
 import { useOrderStore } from '@/store/useOrderStore';
+import * as Crypto from 'expo-crypto';
 import { Stack, useRouter } from 'expo-router';
 import { ArrowLeft, MapPin } from 'lucide-react-native';
-import React, { useState } from 'react';
+import React, { useCallback, useEffect, useRef, useState } from 'react';
 import { Alert, Linking, ScrollView, StyleSheet, Text, TextInput, TouchableOpacity, View } from 'react-native';
 import { SafeAreaView } from 'react-native-safe-area-context';
 
+interface Quote {
+    subtotal: number;
+    delivery_fee: number;
+    total: number;
+}
+
 export default function CheckoutScreen() {
     const router = useRouter();
-    const { items, getTotal, clearCart } = useCartStore();
+    const { items, clearCart } = useCartStore();
     const { setStatus } = useOrderStore();
     const { isAuthenticated, user } = useAuthStore();
 
     const [address, setAddress] = useState('');
     const [loading, setLoading] = useState(false);
     const [focusedInput, setFocusedInput] = useState<string | null>(null);
+    // Reused while the order body is unchanged, so a retry can't create a second order
+    const idempotency = useRef<{ key: string; body: string } | null>(null);
+
+    // Priced by the server with the same rules as the order, so what is shown is what is charged
+    const [quote, setQuote] = useState<Quote | null>(null);
+    // Trimmed before it is priced or sent, as the server does
+    const deliveryAddress = address.trim();
+    const delivers = deliveryAddress !== '' && deliveryAddress !== 'Pickup';
+
+    const fetchQuote = useCallback(async () => {
+        if (items.length === 0) {
+            setQuote(null);
+            return;
+        }
+        try {
+            const { data } = await api.post('/cart/quote/', {
+                items: items.map(item => ({ id: item.id, quantity: item.quantity })),
+                delivery_address: delivers ? deliveryAddress : '',
+            });
+            setQuote({
+                subtotal: Number(data.subtotal),
+                delivery_fee: Number(data.delivery_fee),
+                total: Number(data.total),
+            });
+        } catch (error) {
+            setQuote(null);
+        }
+    // The fee only depends on whether there is a delivery address, not on its text
+    }, [items, delivers]);
+
+    useEffect(() => {
+        fetchQuote();
+    }, [fetchQuote]);
 
-    const subtotal = getTotal();
-    const deliveryFee = 500; // Fixed delivery fee
-    const total = subtotal + deliveryFee;
+    const formatAmount = (amount?: number) => (amount === undefined ? '…' : `KSh ${amount.toFixed(2)}`);
 
     const handlePlaceOrder = async () => {
         if (!isAuthenticated) {
@@ -32,24 +70,38 @@ export default function CheckoutScreen() {
             return;
         }
 
-        if (!address.trim()) {
+        if (!deliveryAddress) {
             Alert.alert('Error', 'Please enter your delivery location/address');
             return;
         }
 
+        if (!quote) {
+            Alert.alert('Error', 'Could not price your order. Please try again.');
+            fetchQuote();
+            return;
+        }
+        const total = quote.total;
+
         setLoading(true);
         try {
             const orderData = {
                 items: items.map(item => ({ id: item.id, quantity: item.quantity })),
                 total_amount: total,
-                delivery_address: address,
+                delivery_address: deliveryAddress,
                 payment_method: 'whatsapp', // Default for now
                 phone_number: '',
                 status: 'received'
             };
 
+            const body = JSON.stringify(orderData);
+            if (idempotency.current?.body !== body) {
+                idempotency.current = { key: Crypto.randomUUID(), body };
+            }
+
             // Post order to backend
-            await api.post('/orders/', orderData);
+            await api.post('/orders/', orderData, {
+                headers: { 'Idempotency-Key': idempotency.current.key },
+            });
 
             setStatus('received');
 
@@ -62,7 +114,7 @@ export default function CheckoutScreen() {
 
             const message = `*New Order from ${user?.first_name || 'Customer'}*\n\n` +
                 `*Items:*\n${itemsList}\n\n` +
-                `*Location:* ${address}\n` +
+                `*Location:* ${deliveryAddress}\n` +
                 `*Total:* KSh ${total.toFixed(2)}\n\n` +
                 `Please confirm my order.`;
 
@@ -83,7 +135,12 @@ export default function CheckoutScreen() {
             router.replace('/tracking');
         } catch (error: any) {
             // Order failed
-            const errorMessage = error.response?.data?.detail
+            if (error.response?.data?.total_amount) {
+                // Prices changed since the quote: show the new total before anything is charged
+                fetchQuote();
+            }
+            const errorMessage = error.response?.data?.total_amount?.[0]
+                || error.response?.data?.detail
                 || error.response?.data?.message
                 || 'Failed to place order. Please try again.';
 
@@ -132,15 +189,15 @@ export default function CheckoutScreen() {
                     <View style={styles.summaryCard}>
                         <View style={styles.summaryRow}>
                             <Text style={styles.summaryLabel}>Subtotal</Text>
-                            <Text style={styles.summaryValue}>KSh {subtotal.toFixed(2)}</Text>
+                            <Text style={styles.summaryValue}>{formatAmount(quote?.subtotal)}</Text>
                         </View>
                         <View style={styles.summaryRow}>
                             <Text style={styles.summaryLabel}>Delivery Fee</Text>
-                            <Text style={styles.summaryValue}>KSh {deliveryFee.toFixed(2)}</Text>
+                            <Text style={styles.summaryValue}>{formatAmount(quote?.delivery_fee)}</Text>
                         </View>
                         <View style={[styles.summaryRow, styles.totalRow]}>
                             <Text style={styles.totalLabel}>Total Amount</Text>
-                            <Text style={styles.totalValue}>KSh {total.toFixed(2)}</Text>
+                            <Text style={styles.totalValue}>{formatAmount(quote?.total)}</Text>
                         </View>
                     </View>
                 </View>
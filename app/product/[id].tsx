@@ -18,10 +18,12 @@ export default function ProductDetailsScreen() {
     const [product, setProduct] = useState<any>(null);
     const [loading, setLoading] = useState(true);
     const [quantity, setQuantity] = useState(1);
+    const [related, setRelated] = useState<any[]>([]);
 
     useEffect(() => {
         if (id) {
             fetchProduct();
+            fetchRelated();
         }
     }, [id]);
 
@@ -36,6 +38,15 @@ export default function ProductDetailsScreen() {
         }
     };
 
+    const fetchRelated = async () => {
+        try {
+            const response = await api.get(`/products/${id}/related/`);
+            setRelated(response.data);
+        } catch (error) {
+            // Recommendations are optional
+        }
+    };
+
 
 
     if (loading) {
@@ -158,6 +169,22 @@ export default function ProductDetailsScreen() {
                         <Text style={styles.sectionTitle}>About this item</Text>
                         <Text style={styles.description}>{product.description}</Text>
                     </View>
+
+                    {/* Frequently ordered together */}
+                    {related.length > 0 && (
+                        <View style={styles.section}>
+                            <Text style={styles.sectionTitle}>Frequently ordered together</Text>
+                            <ScrollView horizontal showsHorizontalScrollIndicator={false}>
+                                {related.map((item) => (
+                                    <TouchableOpacity key={item.id} style={styles.relatedCard} onPress={() => router.push(`/product/${item.id}`)}>
+                                        <Image source={{ uri: getImageUrl(item.image) }} style={styles.relatedImage} />
+                                        <Text style={styles.relatedName} numberOfLines={1}>{item.name}</Text>
+                                        <Text style={styles.relatedPrice}>KSh {Math.round(item.discounted_price)}</Text>
+                                    </TouchableOpacity>
+                                ))}
+                            </ScrollView>
+                        </View>
+                    )}
                 </View>
             </ScrollView>
 
@@ -340,6 +367,26 @@ const styles = StyleSheet.create({
         lineHeight: 24,
         fontWeight: '400',
     },
+    relatedCard: {
+        width: 120,
+        marginRight: 12,
+    },
+    relatedImage: {
+        width: 120,
+        height: 90,
+        borderRadius: 12,
+        backgroundColor: '#F3F4F6',
+        marginBottom: 6,
+    },
+    relatedName: {
+        fontSize: 13,
+        fontWeight: '600',
+        color: '#111',
+    },
+    relatedPrice: {
+        fontSize: 12,
+        color: '#6B7280',
+    },
     footer: {
         position: 'absolute',
         bottom: 20,
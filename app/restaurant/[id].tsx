@@ -35,17 +35,14 @@ export default function RestaurantDetailsScreen() {
     const fetchRestaurantData = async () => {
         try {
             setLoading(true);
-            const [restRes, catRes, prodRes] = await Promise.all([
-                api.get(`/restaurants/${id}/`),
-                api.get(`/categories/?restaurant=${id}`),
-                api.get(`/products/?restaurant=${id}`)
-            ]);
+            // Restaurant, categories and products grouped by category in one response
+            const { data } = await api.get(`/restaurants/${id}/menu/`);
 
-            setRestaurant(restRes.data);
-            const fetchedCategories = catRes.data;
+            setRestaurant(data.restaurant);
+            const fetchedCategories = data.categories;
             // Prepend "All" category
             setCategories([{ id: 'all', name: 'All' }, ...fetchedCategories]);
-            setProducts(prodRes.data);
+            setProducts(fetchedCategories.flatMap((category: any) => category.products));
 
             // Default select "All" is already set in initial state, or set here:
             setSelectedCategory('all');
@@ -20,6 +20,14 @@ class OrderAdmin(admin.ModelAdmin):
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ('order', 'product', 'quantity', 'price')
 
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'total_amount', 'created_at', 'archived_at')
+    list_filter = ('status',)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(Restaurant)
 class RestaurantAdmin(admin.ModelAdmin):
     list_display = ('name', 'discount_percentage', 'is_verified', 'is_popular', 'is_featured_campaign')
@@ -30,3 +38,10 @@ class RestaurantAdmin(admin.ModelAdmin):
 class ReelAdmin(admin.ModelAdmin):
     list_display = ('product', 'is_highlight', 'views')
     list_editable = ('is_highlight',)
+
+@admin.register(Promotion)
+class PromotionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'starts_at', 'ends_at', 'discount_percentage', 'mark_hot', 'feature_campaign')
+    list_filter = ('mark_hot', 'feature_campaign')
+    filter_horizontal = ('products', 'restaurants')
+    search_fields = ('name',)
@@ -0,0 +1,60 @@
+"""
+Order archival.
+
+Delivered and cancelled orders older than ORDER_ARCHIVE_AFTER_DAYS are moved,
+with their items, to ArchivedOrder / ArchivedOrderItem under their original
+ids, one batch per transaction. The Order and OrderItem tables then only hold
+recent and still-open orders, so their size and index depth stay bounded by
+the archive window instead of growing with the business.
+
+GET /api/orders/ pages through recent orders; ?archive=only pages through
+the archive the same way, and a receipt (GET /api/orders/<id>/) is found in
+whichever table the order currently lives.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+ARCHIVABLE_STATUSES = ('delivered', 'cancelled')
+
+
+def archivable(now=None):
+    cutoff = (now or timezone.now()) - timedelta(days=settings.ORDER_ARCHIVE_AFTER_DAYS)
+    return Order.objects.filter(status__in=ARCHIVABLE_STATUSES, created_at__lt=cutoff)
+
+
+def archive_batch(order_ids):
+    """Move these orders and their items to the archive. Returns the number moved."""
+    with transaction.atomic():
+        # Re-checked under lock: an order reopened since it was picked stays put.
+        orders = list(Order.objects.select_for_update().filter(id__in=order_ids, status__in=ARCHIVABLE_STATUSES))
+        ids = [order.id for order in orders]
+        items = list(OrderItem.objects.filter(order_id__in=ids))
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(id=o.id, user_id=o.user_id, status=o.status, total_amount=o.total_amount, created_at=o.created_at)
+            for o in orders
+        ])
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(id=i.id, order_id=i.order_id, product_id=i.product_id, quantity=i.quantity, price=i.price)
+            for i in items
+        ])
+        OrderItem.objects.filter(order_id__in=ids).delete()
+        Order.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def archive(now=None, batch_size=None, limit=None):
+    """Archive everything eligible, oldest first. Returns the number of orders moved."""
+    batch_size = batch_size or settings.ORDER_ARCHIVE_BATCH_SIZE
+    moved = 0
+    while limit is None or moved < limit:
+        size = batch_size if limit is None else min(batch_size, limit - moved)
+        ids = list(archivable(now).order_by('id').values_list('id', flat=True)[:size])
+        if not ids:
+            break
+        moved += archive_batch(ids)
+    return moved
@@ -0,0 +1,162 @@
+"""
+Async implementations of the hot catalog read paths for ASGI deployments.
+
+GET requests are served with Django's async ORM so a worker can keep many slow
+connections open without tying up a thread each. Every other method, and GETs
+asking for something only the viewset implements (`?stream=` exports), is
+handed to the regular DRF viewset, so responses don't depend on the server
+mode. Bearer tokens are checked as DRF checks them, so a bad one gets the
+same 401. Related rows are loaded up front because serializers must not
+lazy-load inside the event loop.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework.settings import api_settings
+
+from .models import Product, Reel, Restaurant, SavedReel
+from .promotions import get_active_promotions
+from .renderers import FastJSONRenderer, MessagePackRenderer, dumps, packb
+from .serializers import ProductSerializer, ReelSerializer, RestaurantSerializer
+from .geo import nearby
+from .trending import record_view
+from .views import ProductViewSet, ReelViewSet, RestaurantViewSet, filter_products, filter_reels, filter_restaurants, parse_near
+
+
+def _wants_msgpack(request):
+    if request.GET.get('format'):
+        return request.GET['format'] == MessagePackRenderer.format
+    return MessagePackRenderer.media_type in request.headers.get('Accept', '')
+
+
+def _render(request, data, status=200):
+    if _wants_msgpack(request):
+        return HttpResponse(packb(data), status=status, content_type=MessagePackRenderer.media_type)
+    return HttpResponse(dumps(data), status=status, content_type=FastJSONRenderer.media_type)
+
+
+def _not_found(request, model):
+    return _render(request, {'detail': f'No {model._meta.object_name} matches the given query.'}, status=404)
+
+
+def _authenticate(request):
+    """The token's user, or None without credentials; raises AuthenticationFailed like DRF would."""
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = authentication_class().authenticate(request)
+        if result is not None:
+            return result[0]
+    return None
+
+
+def _not_authenticated(request, exc):
+    # What DRF's exception handler answers for the same token on the sync views.
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    header = api_settings.DEFAULT_AUTHENTICATION_CLASSES[0]().authenticate_header(request)
+    response = _render(request, data, status=401 if header else 403)
+    if header:
+        response['WWW-Authenticate'] = header
+    return response
+
+
+# Query params whose handling lives only in the viewsets (api.streaming).
+SYNC_ONLY_PARAMS = ('stream',)
+
+
+def _catalog_view(list_handler, detail_handler, viewset):
+    """Route GET to the async handler and everything else to the DRF viewset."""
+    list_fallback = viewset.as_view({'get': 'list', 'post': 'create'})
+    detail_fallback = viewset.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'})
+
+    async def prepare(request):
+        # A bad token is refused here too, and the user is kept for the handlers (request.api_user).
+        try:
+            request.api_user = await sync_to_async(_authenticate)(request)
+        except AuthenticationFailed as exc:
+            return _not_authenticated(request, exc)
+        # Warm the promotions snapshot off the event loop; serializers read it per row.
+        await sync_to_async(get_active_promotions)()
+        return None
+
+    @csrf_exempt
+    async def list_view(request):
+        if request.method != 'GET' or any(param in request.GET for param in SYNC_ONLY_PARAMS):
+            return await sync_to_async(list_fallback)(request)
+        refused = await prepare(request)
+        return refused if refused is not None else await list_handler(request)
+
+    @csrf_exempt
+    async def detail_view(request, pk):
+        if request.method != 'GET':
+            return await sync_to_async(detail_fallback)(request, pk=pk)
+        refused = await prepare(request)
+        return refused if refused is not None else await detail_handler(request, pk)
+
+    return list_view, detail_view
+
+
+async def _restaurant_list(request):
+    try:
+        near = parse_near(request.GET)
+    except ValidationError as exc:
+        return _render(request, exc.detail, status=400)
+    queryset = filter_restaurants(Restaurant.objects.all(), request.GET)
+    if near is not None:
+        restaurants = await sync_to_async(nearby)(queryset, *near)
+    else:
+        restaurants = [r async for r in queryset]
+    return _render(request, RestaurantSerializer(restaurants, many=True, context={'request': request}).data)
+
+
+async def _restaurant_detail(request, pk):
+    try:
+        restaurant = await Restaurant.objects.aget(pk=pk)
+    except (Restaurant.DoesNotExist, ValueError):
+        return _not_found(request, Restaurant)
+    return _render(request, RestaurantSerializer(restaurant, context={'request': request}).data)
+
+
+async def _product_list(request):
+    queryset = filter_products(Product.objects.select_related('restaurant').order_by('id'), request.GET)
+    products = [p async for p in queryset]
+    return _render(request, ProductSerializer(products, many=True, context={'request': request}).data)
+
+
+async def _product_detail(request, pk):
+    try:
+        product = await Product.objects.select_related('restaurant').aget(pk=pk)
+    except (Product.DoesNotExist, ValueError):
+        return _not_found(request, Product)
+    await sync_to_async(record_view)(product.id, product.restaurant_id)
+    return _render(request, ProductSerializer(product, context={'request': request}).data)
+
+
+async def _saved_reel_ids(request, reel_ids):
+    if request.api_user is None:
+        return set()
+    saved = SavedReel.objects.filter(user=request.api_user, reel_id__in=reel_ids).values_list('reel_id', flat=True)
+    return {reel_id async for reel_id in saved}
+
+
+async def _reel_list(request):
+    queryset = filter_reels(
+        Reel.objects.select_related('restaurant', 'product__restaurant').order_by('-is_highlight', '-created_at'),
+        request.GET,
+    )
+    reels = [r async for r in queryset]
+    context = {'request': request, 'saved_reel_ids': await _saved_reel_ids(request, [r.id for r in reels])}
+    return _render(request, ReelSerializer(reels, many=True, context=context).data)
+
+
+async def _reel_detail(request, pk):
+    try:
+        reel = await Reel.objects.select_related('restaurant', 'product__restaurant').aget(pk=pk)
+    except (Reel.DoesNotExist, ValueError):
+        return _not_found(request, Reel)
+    context = {'request': request, 'saved_reel_ids': await _saved_reel_ids(request, [reel.id])}
+    return _render(request, ReelSerializer(reel, context=context).data)
+
+
+restaurant_list, restaurant_detail = _catalog_view(_restaurant_list, _restaurant_detail, RestaurantViewSet)
+product_list, product_detail = _catalog_view(_product_list, _product_detail, ProductViewSet)
+reel_list, reel_detail = _catalog_view(_reel_list, _reel_detail, ReelViewSet)
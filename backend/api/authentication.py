@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def password_version(password):
+    """The revoke claim a token issued for this password carries (None when revocation is off)."""
+    return get_md5_hash_password(password) if api_settings.CHECK_REVOKE_TOKEN else None
+
+
+def user_cache_key(user_id, version=None):
+    # Per password version, so a token issued after a password change never
+    # meets a user cached before it, on any worker.
+    return f'auth:user:{user_id}:{version or ""}'
+
+
+def invalidate_cached_user(user_id, *passwords):
+    """Drop the entries cached for the user under each of `passwords` (current, and previous if it changed)."""
+    cache.delete_many(list({user_cache_key(user_id, password_version(p)) for p in passwords if p is not None}))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user from a short-TTL cache
+    instead of loading the User row on every request.
+
+    Entries are keyed by the token's password version as well as the user, and
+    dropped whenever the user is saved or deleted (api.signals), including the
+    entry for the old password when it changes. The active and password-version
+    checks run against the cached user on every request, so deactivation and
+    password-based revocation still apply; a change made without a save (e.g.
+    QuerySet.update) reaches tokens of the old password within the TTL.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        version = validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) if api_settings.CHECK_REVOKE_TOKEN else None
+        key = user_cache_key(user_id, version)
+        user = cache.get(key)
+        if user is None:
+            # Raises for unknown or inactive users, so only good users are cached.
+            user = super().get_user(validated_token)
+            cache.set(key, user, settings.AUTH_USER_CACHE_TTL)
+            return user
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
@@ -0,0 +1,197 @@
+"""
+Reel engagement analytics.
+
+Views, saves, unsaves and order clicks are appended to ReelEvent. Each worker
+collects events in memory and writes them with one bulk INSERT once
+ENGAGEMENT_BATCH_SIZE have accumulated or the oldest is ENGAGEMENT_FLUSH_SECONDS
+old (by a timer, so an idle worker writes them too, and at exit), so recording
+an event costs a list append.
+
+rollup_reel_engagement (cron, every few minutes) reads the events added since
+its cursor by primary key range, groups them per reel and hour in the
+database, adds the counts to the hourly and daily ReelEngagement rows and moves
+the cursor, all in one transaction per chunk. Ids are handed out before the
+inserting transaction commits, so a range only ends at events the database
+wrote (inserted_at) more than COMMIT_LAG_SECONDS ago: every lower id has
+committed by then, and none is skipped for good. Time series are read from those
+rollups with one index range scan, however many raw events there are. Raw
+events are kept for ENGAGEMENT_RAW_RETENTION_DAYS and hourly rollups for
+ENGAGEMENT_HOURLY_RETENTION_DAYS; daily rollups are kept.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max, Q
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import Reel, ReelEngagement, ReelEvent, RollupCursor
+
+logger = logging.getLogger(__name__)
+
+CURSOR = 'reel_engagement'
+# Longer than any bulk insert of events stays uncommitted.
+COMMIT_LAG_SECONDS = 60
+METRICS = {
+    ReelEvent.VIEW: 'views',
+    ReelEvent.SAVE: 'saves',
+    ReelEvent.UNSAVE: 'unsaves',
+    ReelEvent.ORDER_CLICK: 'order_clicks',
+}
+
+
+class EventBuffer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = []
+        self.first_at = 0.0
+        self.timer = None
+
+    def add(self, event):
+        with self.lock:
+            if not self.events:
+                self.first_at = time.monotonic()
+            self.events.append(event)
+            due = (len(self.events) >= settings.ENGAGEMENT_BATCH_SIZE
+                   or time.monotonic() - self.first_at >= settings.ENGAGEMENT_FLUSH_SECONDS)
+            if not due and self.timer is None:
+                # Also written when no further event arrives to trigger it.
+                self.timer = threading.Timer(settings.ENGAGEMENT_FLUSH_SECONDS, self._flush_in_background)
+                self.timer.daemon = True
+                self.timer.start()
+        if due:
+            self.flush()
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        with self.lock:
+            events, self.events = self.events, []
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if not events:
+            return 0
+        try:
+            ReelEvent.objects.bulk_create(events, batch_size=settings.ENGAGEMENT_BATCH_SIZE)
+        except Exception:
+            # Analytics must never fail the request that triggered the flush.
+            logger.exception('Dropped %d reel engagement events', len(events))
+            return 0
+        return len(events)
+
+
+_buffer = EventBuffer()
+atexit.register(_buffer.flush)
+
+
+def record(reel_id, kind, user=None):
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    _buffer.add(ReelEvent(reel_id=reel_id, kind=kind, user_id=user_id, created_at=timezone.now()))
+
+
+def flush():
+    return _buffer.flush()
+
+
+def _day(hour):
+    return timezone.localtime(hour).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _merge(period, deltas):
+    """Add {(reel_id, bucket): Counter} to the `period` rollups."""
+    reels = {reel_id for reel_id, _ in deltas}
+    buckets = {bucket for _, bucket in deltas}
+    existing = {
+        (row.reel_id, row.bucket): row
+        for row in ReelEngagement.objects.filter(period=period, reel_id__in=reels, bucket__in=buckets)
+    }
+    updated, created = [], []
+    for key, counts in deltas.items():
+        row = existing.get(key)
+        if row is None:
+            created.append(ReelEngagement(reel_id=key[0], period=period, bucket=key[1], **counts))
+            continue
+        for name, n in counts.items():
+            setattr(row, name, getattr(row, name) + n)
+        updated.append(row)
+    ReelEngagement.objects.bulk_update(updated, list(METRICS.values()), batch_size=500)
+    ReelEngagement.objects.bulk_create(created, batch_size=500)
+
+
+def rollup(now=None, chunk_size=None):
+    """Fold committed new events into the rollups. Returns the number of events read."""
+    now = now or timezone.now()
+    chunk_size = chunk_size or settings.ENGAGEMENT_ROLLUP_CHUNK
+    cursor, _ = RollupCursor.objects.get_or_create(name=CURSOR)
+    upper = ReelEvent.objects.filter(
+        id__gt=cursor.last_id, inserted_at__lt=now - timedelta(seconds=COMMIT_LAG_SECONDS),
+    ).aggregate(m=Max('id'))['m']
+    if upper is None:
+        return 0
+
+    read = 0
+    while True:
+        with transaction.atomic():
+            # Locked so two runs never count the same range.
+            cursor = RollupCursor.objects.select_for_update().get(name=CURSOR)
+            if cursor.last_id >= upper:
+                break
+            end = min(cursor.last_id + chunk_size, upper)
+            rows = (
+                ReelEvent.objects.filter(id__gt=cursor.last_id, id__lte=end)
+                .annotate(hour=TruncHour('created_at'))
+                .values('reel_id', 'hour')
+                .annotate(**{name: Count('id', filter=Q(kind=kind)) for kind, name in METRICS.items()})
+                .order_by()
+            )
+            hourly, daily = {}, defaultdict(Counter)
+            for row in rows:
+                counts = Counter({name: row[name] for name in METRICS.values() if row[name]})
+                hourly[(row['reel_id'], row['hour'])] = counts
+                daily[(row['reel_id'], _day(row['hour']))] += counts
+                read += sum(counts.values())
+            # Events of reels deleted since are dropped with them.
+            live = set(Reel.objects.filter(id__in={reel_id for reel_id, _ in hourly}).values_list('id', flat=True))
+            _merge('hour', {key: counts for key, counts in hourly.items() if key[0] in live})
+            _merge('day', {key: counts for key, counts in daily.items() if key[0] in live})
+            cursor.last_id = end
+            cursor.save(update_fields=['last_id', 'updated_at'])
+    return read
+
+
+def prune(now=None, batch_size=10000):
+    """Delete rolled-up raw events and hourly rollups past retention. Returns (events, hourly rows) deleted."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=settings.ENGAGEMENT_RAW_RETENTION_DAYS)
+    rolled_up = RollupCursor.objects.filter(name=CURSOR).values_list('last_id', flat=True).first() or 0
+    events = 0
+    while True:
+        # Oldest first by primary key; stop at the first event still within retention.
+        last = None
+        for pk, created_at in ReelEvent.objects.filter(id__lte=rolled_up).order_by('id').values_list('id', 'created_at')[:batch_size]:
+            if created_at >= cutoff:
+                break
+            last = pk
+        if last is None:
+            break
+        events += ReelEvent.objects.filter(id__lte=last).delete()[0]
+
+    hourly_cutoff = now - timedelta(days=settings.ENGAGEMENT_HOURLY_RETENTION_DAYS)
+    hourly = ReelEngagement.objects.filter(period='hour', bucket__lt=hourly_cutoff).delete()[0]
+    return events, hourly
+
+
+def series(reel_id, period, since, until):
+    rows = ReelEngagement.objects.filter(reel_id=reel_id, period=period, bucket__gte=since, bucket__lt=until)
+    return list(rows.values('bucket', *METRICS.values()))
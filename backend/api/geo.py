@@ -0,0 +1,97 @@
+"""
+Geohash bucketing for "restaurants near me" without PostGIS.
+
+Each restaurant stores the geohash of its coordinates in an indexed column.
+A radius search picks the geohash precision whose cells are at least as large
+as the radius, so the circle is always covered by the centre cell and its eight
+neighbours. Those nine prefixes become index range scans in one query, and only
+the few candidates they return get an exact distance check.
+"""
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+MAX_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+
+
+def encode(lat, lng, precision=MAX_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def cell_size_degrees(precision):
+    """(lat_degrees, lng_degrees) covered by one cell."""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def precision_for_radius(radius_km, lat):
+    """Finest precision whose cells are still at least radius_km on both sides."""
+    for precision in range(MAX_PRECISION, 0, -1):
+        lat_deg, lng_deg = cell_size_degrees(precision)
+        height_km = lat_deg * 110.574
+        width_km = lng_deg * 111.320 * max(math.cos(math.radians(lat)), 0.01)
+        if min(height_km, width_km) >= radius_km:
+            return precision
+    return 1
+
+
+def neighbourhood(lat, lng, precision):
+    """Geohash of the cell containing the point plus its eight neighbours."""
+    lat_deg, lng_deg = cell_size_degrees(precision)
+    cells = set()
+    for dlat in (-lat_deg, 0, lat_deg):
+        for dlng in (-lng_deg, 0, lng_deg):
+            neighbour_lat = max(-90.0, min(90.0, lat + dlat))
+            neighbour_lng = (lng + dlng + 180.0) % 360.0 - 180.0
+            cells.add(encode(neighbour_lat, neighbour_lng, precision))
+    return sorted(cells)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def prefix_filter(field, prefixes):
+    """Q matching any of the prefixes as index-friendly range lookups."""
+    from django.db.models import Q
+    query = Q()
+    for prefix in prefixes:
+        # '{' sorts right after 'z', the last geohash character
+        query |= Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + '{'})
+    return query
+
+
+def nearby(queryset, lat, lng, radius_km):
+    """Objects within radius_km of the point, nearest first, each with .distance_km set."""
+    precision = precision_for_radius(radius_km, lat)
+    candidates = queryset.filter(prefix_filter('geohash', neighbourhood(lat, lng, precision)))
+    results = []
+    for obj in candidates:
+        distance = haversine_km(lat, lng, obj.latitude, obj.longitude)
+        if distance <= radius_km:
+            obj.distance_km = round(distance, 3)
+            results.append(obj)
+    results.sort(key=lambda obj: obj.distance_km)
+    return results
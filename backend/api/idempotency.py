@@ -0,0 +1,134 @@
+"""
+Idempotency-Key support for endpoints that must not run twice.
+
+The first request with a key reserves a row (unique per user and key) before
+doing any work, then stores the response on it in the same transaction as the
+work itself. A retry with the same key gets that stored response back
+untouched, so pricing, writes and payment calls are not repeated. Calls
+outside the database, like the M-Pesa prompt, go in transaction.on_commit so
+they only happen once the response is stored. While the first request runs,
+retries get 409; the reservation is a lease of IDEMPOTENCY_LEASE_SECONDS, so
+if its worker dies a retry takes the key over instead of being refused until
+the key expires. Keys are honoured for
+IDEMPOTENCY_KEY_TTL seconds; older rows are ignored and removed by the
+purge_idempotency_keys command.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+RESERVE_ATTEMPTS = 3
+
+
+def request_hash(data):
+    payload = json.dumps(data, sort_keys=True, default=str).encode()
+    return hashlib.sha256(payload).hexdigest()
+
+
+def expired_before():
+    return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+
+def _in_flight():
+    return Response(
+        {'error': 'A request with this idempotency key is still being processed'},
+        status=status.HTTP_409_CONFLICT,
+    )
+
+
+def _replay(record, fingerprint):
+    if record.request_hash != fingerprint:
+        return Response(
+            {'error': f'{HEADER} was already used with a different request body'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if record.response_status is None:
+        return _in_flight()
+    response = Response(record.response_body, status=record.response_status)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+class LeaseLost(Exception):
+    """Another request took the key over while this one was running."""
+
+
+def _lease():
+    return timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS)
+
+
+def _reserve(user, key, fingerprint):
+    """The new in-flight row, or the existing record for this key."""
+    keys = IdempotencyKey.objects.filter(user=user, key=key)
+    keys.filter(created_at__lt=expired_before()).delete()
+    for _ in range(RESERVE_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(user=user, key=key, request_hash=fingerprint, locked_until=_lease()), None
+        except IntegrityError:
+            pass
+        # Left in flight by a request that died: take it over.
+        lease = _lease()
+        if keys.filter(request_hash=fingerprint, response_status__isnull=True, locked_until__lt=timezone.now()).update(locked_until=lease):
+            return keys.get(), None
+        try:
+            return None, keys.get()
+        except IdempotencyKey.DoesNotExist:
+            # Released (the request failed) between our insert and this read.
+            continue
+    return None, None
+
+
+def _release(record):
+    IdempotencyKey.objects.filter(pk=record.pk, locked_until=record.locked_until, response_status__isnull=True).delete()
+
+
+def idempotent(request, handler):
+    """
+    Run handler() at most once per (user, Idempotency-Key). Requests without the
+    header are passed straight through.
+    """
+    key = request.headers.get(HEADER)
+    if not key:
+        return handler()
+    if len(key) > MAX_KEY_LENGTH:
+        return Response({'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'}, status=status.HTTP_400_BAD_REQUEST)
+
+    fingerprint = request_hash(request.data)
+    record, existing = _reserve(request.user, key, fingerprint)
+    if existing is not None:
+        return _replay(existing, fingerprint)
+    if record is None:
+        return _in_flight()
+
+    try:
+        with transaction.atomic():
+            response = handler()
+            if not status.is_server_error(response.status_code):
+                # Only while we still hold the lease; otherwise roll our work back.
+                stored = IdempotencyKey.objects.filter(
+                    pk=record.pk, locked_until=record.locked_until, response_status__isnull=True,
+                ).update(response_status=response.status_code, response_body=response.data)
+                if not stored:
+                    raise LeaseLost()
+    except LeaseLost:
+        current = IdempotencyKey.objects.filter(pk=record.pk).first()
+        return _replay(current, fingerprint) if current else _in_flight()
+    except Exception:
+        # Nothing was committed for this key; let the client retry it.
+        _release(record)
+        raise
+
+    if status.is_server_error(response.status_code):
+        _release(record)
+    return response
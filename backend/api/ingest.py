@@ -0,0 +1,160 @@
+"""
+Pull remote media into local storage.
+
+Image and video fields that still hold a remote URL (seed data, pasted links)
+are found across the catalog, each distinct URL is downloaded once with a
+bounded pool of workers, and every row using it is then pointed at the stored
+blob in batched updates.
+
+Downloads stream to INGEST_DIR in blocks, so a video is never held in memory,
+and use connect/read timeouts. An interrupted download leaves its part file
+behind; the next attempt (a retry, or the next run) asks the server for the
+rest with a Range request.
+"""
+import hashlib
+import mimetypes
+import os
+import posixpath
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from . import media
+
+BLOCK_SIZE = 64 * 1024
+
+
+@dataclass
+class Target:
+    model: type
+    pk: int
+    attname: str
+    url: str
+
+
+@dataclass
+class Result:
+    url: str
+    name: str = None
+    error: str = None
+    targets: list = field(default_factory=list)
+
+
+class _DownloadedFile(File):
+    # Lets the storage move the download into place instead of copying it.
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def find_remote(models=None, limit=None):
+    """Targets grouped by URL: {url: [Target, ...]}, at most `limit` distinct URLs."""
+    by_url = defaultdict(list)
+    for model in media.tracked_models():
+        if models and model._meta.model_name not in models:
+            continue
+        for f in media.file_fields(model):
+            rows = model._base_manager.filter(**{f'{f.attname}__regex': r'^https?://'}).values_list('pk', f.attname)
+            for pk, url in rows.iterator():
+                if limit is not None and url not in by_url and len(by_url) >= limit:
+                    return by_url
+                by_url[url].append(Target(model, pk, f.attname, url))
+    return by_url
+
+
+def _part_path(url):
+    return os.path.join(settings.INGEST_DIR, hashlib.sha256(url.encode()).hexdigest() + '.part')
+
+
+def _extension(url, content_type):
+    extension = posixpath.splitext(urlparse(url).path)[1].lower()
+    if extension and len(extension) <= 6:
+        return extension
+    return mimetypes.guess_extension((content_type or '').split(';')[0].strip()) or ''
+
+
+def download(url):
+    """Stream `url` to its part file, resuming a previous attempt. Returns (path, extension)."""
+    import requests
+
+    os.makedirs(settings.INGEST_DIR, exist_ok=True)
+    path = _part_path(url)
+    last_error = None
+    for _ in range(settings.INGEST_RETRIES + 1):
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        try:
+            with requests.get(url, headers=headers, stream=True, timeout=(settings.INGEST_CONNECT_TIMEOUT, settings.INGEST_READ_TIMEOUT)) as response:
+                if response.status_code == 416:  # nothing left past our offset
+                    return path, _extension(url, response.headers.get('Content-Type'))
+                response.raise_for_status()
+                # 206 continues the part file; a 200 means the server ignored Range, so start over.
+                mode = 'ab' if response.status_code == 206 else 'wb'
+                with open(path, mode) as f:
+                    for block in response.iter_content(BLOCK_SIZE):
+                        f.write(block)
+                        if f.tell() > settings.INGEST_MAX_BYTES:
+                            raise ValueError(f'larger than {settings.INGEST_MAX_BYTES} bytes')
+                return path, _extension(url, response.headers.get('Content-Type'))
+        except ValueError:
+            os.remove(path)
+            raise
+        except requests.HTTPError as exc:
+            if exc.response is not None and exc.response.status_code < 500:
+                raise
+            last_error = exc
+        except requests.RequestException as exc:
+            last_error = exc
+    raise last_error
+
+
+def _fetch(url):
+    result = Result(url)
+    try:
+        path, extension = download(url)
+        with open(path, 'rb') as f:
+            result.name = default_storage.save('ingest' + extension, _DownloadedFile(f, name='ingest' + extension))
+    except Exception as exc:
+        result.error = str(exc) or exc.__class__.__name__
+    return result
+
+
+def attach(results, batch_size):
+    """Point every target of the successful downloads at its blob, one bulk_update per batch."""
+    updates = defaultdict(list)
+    for result in results:
+        if result.name:
+            for target in result.targets:
+                updates[(target.model, target.attname)].append((target.pk, result.url, result.name))
+
+    attached = 0
+    for (model, attname), pairs in updates.items():
+        for start in range(0, len(pairs), batch_size):
+            batch = {pk: (url, name) for pk, url, name in pairs[start:start + batch_size]}
+            with transaction.atomic():
+                rows = model._base_manager.select_for_update().filter(pk__in=batch).only('pk', attname)
+                # Skip rows whose field was changed while we were downloading.
+                objs = [obj for obj in rows if getattr(obj, attname).name == batch[obj.pk][0]]
+                for obj in objs:
+                    setattr(obj, attname, batch[obj.pk][1])
+                model._base_manager.bulk_update(objs, [attname])
+                # bulk_update skips the refcount signals; the replaced values were URLs, not blobs.
+                media.acquire(Counter(batch[obj.pk][1] for obj in objs))
+            attached += len(objs)
+    return attached
+
+
+def ingest(by_url, concurrency=None, batch_size=None):
+    """Download every URL concurrently, then attach. Returns (results, rows_attached)."""
+    concurrency = concurrency or settings.INGEST_CONCURRENCY
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(_fetch, by_url))
+    for result in results:
+        result.targets = by_url[result.url]
+    return results, attach(results, batch_size)
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api.archive import archivable, archive
+
+class Command(BaseCommand):
+    help = 'Move old delivered and cancelled orders to the archive tables (run from cron nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, help='Archive at most this many orders')
+        parser.add_argument('--batch-size', type=int, default=settings.ORDER_ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Only count eligible orders')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(f'{archivable().count()} orders eligible for archiving')
+            return
+        moved = archive(batch_size=options['batch_size'], limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'✓ {moved} orders archived'))
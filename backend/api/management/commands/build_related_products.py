@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from api.recommendations import build
+
+class Command(BaseCommand):
+    help = 'Update "frequently ordered together" lists from orders placed since the last run (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recount every order instead of only new ones')
+        parser.add_argument('--top-k', type=int, help='Neighbours kept per product')
+        parser.add_argument('--min-orders', type=int, help='Orders two products must share to be related')
+
+    def handle(self, *args, **options):
+        orders, products, rows = build(full=options['full'], k=options['top_k'], min_orders=options['min_orders'])
+        if not orders and not options['full']:
+            self.stdout.write(self.style.WARNING('No new orders since the last run.'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'✓ {orders} orders counted; {rows} related entries written for {products} products'))
@@ -0,0 +1,38 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from api.media import file_fields, rebuild_refcounts, tracked_models
+from api.models import MediaBlob
+
+class Command(BaseCommand):
+    help = 'Move existing media into content-addressed storage, pointing duplicates at one blob, and recount references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete-originals', action='store_true', help='Remove the old files once every row points at its blob')
+
+    def handle(self, *args, **options):
+        moved, originals = {}, set()
+        for model in tracked_models():
+            for field in file_fields(model):
+                rows = model._base_manager.exclude(**{f'{field.attname}__startswith': 'blobs/'}).exclude(**{field.attname: ''})
+                for pk, name in rows.exclude(**{f'{field.attname}__isnull': True}).values_list('pk', field.attname).iterator():
+                    if name not in moved:
+                        if not default_storage.exists(name):
+                            continue  # external URLs from the seed scripts, or files already gone
+                        with default_storage.open(name) as f:
+                            moved[name] = default_storage.save(name, f)
+                        originals.add(name)
+                    # .update() so the refcount signals don't run per row; counts are rebuilt below.
+                    model._base_manager.filter(pk=pk).update(**{field.attname: moved[name]})
+                    self.stdout.write(f'  {model._meta.label}.{field.name} #{pk}: {name} -> {moved[name]}')
+
+        counts = rebuild_refcounts()
+        if options['delete_originals']:
+            for name in originals:
+                default_storage.delete(name)
+
+        blobs = len(set(moved.values()))
+        stored = sum(MediaBlob.objects.filter(name__in=set(moved.values())).values_list('size', flat=True))
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {len(originals)} files stored as {blobs} blobs ({stored / 1024 / 1024:.1f} MB); '
+            f'{sum(counts.values())} references to {len(counts)} blobs'
+        ))
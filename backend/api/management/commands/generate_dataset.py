@@ -0,0 +1,293 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.utils import timezone
+
+from api.geo import encode
+from api.models import Restaurant, Category, Product, Order, OrderItem, ArchivedOrder, ArchivedOrderItem, Reel, SavedReel
+
+LOCATIONS = {
+    'Nairobi': (-1.2864, 36.8172), 'Mombasa': (-4.0435, 39.6682), 'Kisumu': (-0.0917, 34.7680),
+    'Nakuru': (-0.3031, 36.0800), 'Eldoret': (0.5143, 35.2698), 'Garissa': (-0.4532, 39.6461),
+    'Thika': (-1.0333, 37.0693), 'Malindi': (-3.2175, 40.1191),
+}
+CATEGORY_NAMES = ['Swahili Dishes', 'Nyama Choma', 'Fast Food', 'Pizza', 'Breakfast', 'Desserts', 'Drinks', 'Salads']
+DISHES = ['Pilau', 'Biryani', 'Chapati', 'Ugali', 'Sukuma Wiki', 'Mandazi', 'Samosa', 'Burger', 'Masala Chips',
+          'Pizza', 'Nyama Choma', 'Kuku Choma', 'Githeri', 'Mukimo', 'Chai', 'Mango Juice', 'Smokie', 'Bhajia']
+ADJECTIVES = ['Classic', 'Spicy', 'Double', 'Family', 'Special', 'Coastal', 'Grilled', 'Crispy', 'Fresh', 'Mega']
+PLACEHOLDER_COUNT = 8
+
+
+def zipf_cum_weights(n, s=1.1):
+    """Cumulative weights for picking index i with probability ~ 1/(i+1)^s."""
+    total, cumulative = 0.0, []
+    for i in range(n):
+        total += 1.0 / (i + 1) ** s
+        cumulative.append(total)
+    return cumulative
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep the historical timestamps we generate instead of now()."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic synthetic dataset for benchmarking and index tuning'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=50)
+        parser.add_argument('--products', type=int, default=40, help='Average products per restaurant')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--reels', type=int, default=200)
+        parser.add_argument('--saved-reels', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=365, help='Spread orders over this many past days')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--clear', action='store_true', help='Delete existing catalog, orders and reels first')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+
+        if options['clear']:
+            for model in (SavedReel, Reel, ArchivedOrderItem, ArchivedOrder, OrderItem, Order, Product, Category, Restaurant):
+                model.objects.all().delete()
+            User.objects.filter(username__startswith='synthetic-').delete()
+            self.stdout.write('Cleared existing data')
+
+        media = self.create_placeholder_media()
+        restaurants = self.create_restaurants(options['restaurants'], media)
+        catalog = self.create_catalog(restaurants, options['products'], media)
+        users = self.create_users(options['users'])
+        self.create_orders(options['orders'], restaurants, catalog, users, options['days'])
+        reels = self.create_reels(options['reels'], catalog, media)
+        self.create_saved_reels(options['saved_reels'], reels, users)
+
+        self.reset_sequences()
+        self.stdout.write(self.style.SUCCESS('✓ Synthetic dataset generated'))
+
+    def next_id(self, model):
+        # Always ask the primary: a lagging replica would hand out ids already in use
+        last = model.objects.using(DEFAULT_DB_ALIAS).order_by('-pk').values_list('pk', flat=True).first()
+        # Archived orders keep their ids; never hand those out again
+        archive = {Order: ArchivedOrder, OrderItem: ArchivedOrderItem}.get(model)
+        if archive is not None:
+            archived = archive.objects.using(DEFAULT_DB_ALIAS).order_by('-pk').values_list('pk', flat=True).first()
+            last = max(last or 0, archived or 0)
+        return (last or 0) + 1
+
+    def bulk_create(self, model, objs):
+        with transaction.atomic():
+            model.objects.bulk_create(objs, batch_size=self.batch_size)
+
+    def create_placeholder_media(self):
+        """Tiny local files so image and video fields resolve without network downloads."""
+        root = Path(settings.MEDIA_ROOT)
+        media = {'images': [], 'videos': []}
+        for i in range(PLACEHOLDER_COUNT):
+            for kind, folder, ext in (('images', 'synthetic/images', 'jpg'), ('videos', 'synthetic/videos', 'mp4')):
+                relative = f'{folder}/placeholder-{i}.{ext}'
+                path = root / relative
+                if not path.exists():
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    path.write_bytes(f'placeholder {kind} {i}'.encode())
+                media[kind].append(relative)
+        return media
+
+    def create_restaurants(self, count, media):
+        rng = self.rng
+        start = self.next_id(Restaurant)
+        restaurants = []
+        for i in range(count):
+            location = rng.choice(list(LOCATIONS))
+            # Scatter within ~10km of the town centre; bulk_create skips save(), so set geohash here
+            lat = LOCATIONS[location][0] + rng.gauss(0, 0.05)
+            lng = LOCATIONS[location][1] + rng.gauss(0, 0.05)
+            restaurants.append(Restaurant(
+                id=start + i,
+                name=f'{rng.choice(ADJECTIVES)} {rng.choice(DISHES)} House {start + i}',
+                logo=rng.choice(media['images']),
+                cover_image=rng.choice(media['images']),
+                discount_percentage=Decimal(rng.choice([0, 0, 0, 0, 5, 10, 15, 20])),
+                is_verified=rng.random() < 0.4,
+                whatsapp_number=f'2547{rng.randint(10000000, 99999999)}',
+                location=location,
+                latitude=lat,
+                longitude=lng,
+                geohash=encode(lat, lng),
+                description='Synthetic restaurant',
+                is_popular=rng.random() < 0.15,
+                is_featured_campaign=rng.random() < 0.05,
+            ))
+        self.bulk_create(Restaurant, restaurants)
+        self.stdout.write(f'Created {count} restaurants')
+        return restaurants
+
+    def create_catalog(self, restaurants, per_restaurant, media):
+        """Returns {restaurant_id: [(product_id, price), ...]} ordered by popularity."""
+        rng = self.rng
+        category_id = self.next_id(Category)
+        product_id = self.next_id(Product)
+        categories, products, catalog = [], [], {}
+
+        for restaurant in restaurants:
+            restaurant_categories = []
+            for name in rng.sample(CATEGORY_NAMES, rng.randint(2, 5)):
+                categories.append(Category(id=category_id, restaurant=restaurant, name=name, image=rng.choice(media['images'])))
+                restaurant_categories.append(category_id)
+                category_id += 1
+
+            # Menu sizes are long-tailed: most restaurants are small, a few are huge.
+            size = max(1, int(rng.lognormvariate(0, 0.6) * per_restaurant))
+            catalog[restaurant.id] = []
+            for _ in range(size):
+                price = Decimal(rng.randint(5, 300) * 10)
+                is_promoted = rng.random() < 0.08
+                products.append(Product(
+                    id=product_id,
+                    restaurant=restaurant,
+                    category_id=rng.choice(restaurant_categories),
+                    name=f'{rng.choice(ADJECTIVES)} {rng.choice(DISHES)}',
+                    description='Synthetic product',
+                    price=price,
+                    image=rng.choice(media['images']),
+                    is_hot=rng.random() < 0.03,
+                    is_promoted=is_promoted,
+                    discount_percentage=rng.choice([10, 15, 20, 25]) if is_promoted else 0,
+                    shipping_fee=Decimal(rng.choice([0, 0, 0, 50, 100])),
+                    rating=Decimal(rng.randint(30, 50)) / 10,
+                    calories=rng.randint(100, 1200),
+                ))
+                catalog[restaurant.id].append((product_id, price))
+                product_id += 1
+
+        self.bulk_create(Category, categories)
+        self.bulk_create(Product, products)
+        self.stdout.write(f'Created {len(categories)} categories and {len(products)} products')
+        return catalog
+
+    def create_users(self, count):
+        start = self.next_id(User)
+        password = make_password('password123')  # hashing is slow; share one hash
+        users = [
+            User(id=start + i, username=f'synthetic-{start + i}', email=f'synthetic-{start + i}@example.com',
+                 first_name='Synthetic', last_name=str(start + i), password=password)
+            for i in range(count)
+        ]
+        self.bulk_create(User, users)
+        self.stdout.write(f'Created {count} users')
+        return [user.id for user in users]
+
+    def create_orders(self, count, restaurants, catalog, users, days):
+        rng = self.rng
+        if not count or not users:
+            return
+        restaurant_ids = [r.id for r in restaurants if catalog.get(r.id)]
+        rng.shuffle(restaurant_ids)  # popularity rank independent of id
+        restaurant_weights = zipf_cum_weights(len(restaurant_ids))
+        user_weights = zipf_cum_weights(len(users), s=0.8)
+        product_weights = {rid: zipf_cum_weights(len(catalog[rid])) for rid in restaurant_ids}
+        order_id = self.next_id(Order)
+        item_id = self.next_id(OrderItem)
+        span = days * 24 * 3600
+
+        with explicit_timestamps(Order._meta.get_field('created_at')):
+            for batch_start in range(0, count, self.batch_size):
+                orders, items = [], []
+                for _ in range(min(self.batch_size, count - batch_start)):
+                    # sqrt skews orders towards the recent past, like a growing business
+                    age = timedelta(seconds=int(span * (1 - rng.random() ** 0.5)))
+                    created_at = self.now - age
+                    if age < timedelta(hours=2):
+                        status = rng.choice(['pending', 'preparing', 'ready', 'delivered'])
+                    else:
+                        status = 'cancelled' if rng.random() < 0.07 else 'delivered'
+
+                    restaurant_id = rng.choices(restaurant_ids, cum_weights=restaurant_weights)[0]
+                    menu = catalog[restaurant_id]
+                    lines = min(len(menu), rng.choices([1, 2, 3, 4, 5], weights=[35, 30, 20, 10, 5])[0])
+                    picked = set(rng.choices(range(len(menu)), cum_weights=product_weights[restaurant_id], k=lines))
+                    total = Decimal(0)
+                    for index in picked:
+                        product_id, price = menu[index]
+                        quantity = rng.choices([1, 2, 3], weights=[70, 22, 8])[0]
+                        items.append(OrderItem(id=item_id, order_id=order_id, product_id=product_id, quantity=quantity, price=price))
+                        total += price * quantity
+                        item_id += 1
+
+                    orders.append(Order(
+                        id=order_id,
+                        user_id=rng.choices(users, cum_weights=user_weights)[0],
+                        status=status,
+                        total_amount=total,
+                        created_at=created_at,
+                    ))
+                    order_id += 1
+
+                self.bulk_create(Order, orders)
+                self.bulk_create(OrderItem, items)
+                self.stdout.write(f'Created {batch_start + len(orders)}/{count} orders')
+
+    def create_reels(self, count, catalog, media):
+        rng = self.rng
+        products = [(rid, pid) for rid, menu in catalog.items() for pid, _ in menu]
+        if not count or not products:
+            return []
+        start = self.next_id(Reel)
+        reels = []
+        with explicit_timestamps(Reel._meta.get_field('created_at')):
+            for i in range(count):
+                restaurant_id, product_id = rng.choice(products)
+                reels.append(Reel(
+                    id=start + i,
+                    restaurant_id=restaurant_id,
+                    product_id=product_id,
+                    video=rng.choice(media['videos']),
+                    caption='Synthetic reel',
+                    is_highlight=rng.random() < 0.05,
+                    views=int(rng.paretovariate(1.2) * 50),
+                    created_at=self.now - timedelta(minutes=rng.randint(0, 90 * 24 * 60)),
+                ))
+            self.bulk_create(Reel, reels)
+        self.stdout.write(f'Created {count} reels')
+        return [reel.id for reel in reels]
+
+    def create_saved_reels(self, count, reels, users):
+        rng = self.rng
+        if not count or not reels or not users:
+            return
+        reel_weights = zipf_cum_weights(len(reels))
+        pairs = set()
+        for _ in range(count * 2):
+            if len(pairs) >= count:
+                break
+            pairs.add((rng.choice(users), rng.choices(reels, cum_weights=reel_weights)[0]))
+        existing = set(SavedReel.objects.using(DEFAULT_DB_ALIAS).values_list('user_id', 'reel_id'))
+        self.bulk_create(SavedReel, [SavedReel(user_id=u, reel_id=r) for u, r in sorted(pairs - existing)])
+        self.stdout.write(f'Created {len(pairs - existing)} saved reels')
+
+    def reset_sequences(self):
+        """Explicit ids bypass PostgreSQL sequences; move them past the generated rows."""
+        statements = connection.ops.sequence_reset_sql(no_style(), [Restaurant, Category, Product, User, Order, OrderItem, Reel])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
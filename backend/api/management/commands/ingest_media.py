@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api.ingest import find_remote, ingest
+
+class Command(BaseCommand):
+    help = 'Download media fields that hold remote URLs into local storage and point the rows at the stored files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', nargs='+', help='Only these models, e.g. product restaurant reel')
+        parser.add_argument('--limit', type=int, help='At most this many distinct URLs')
+        parser.add_argument('--concurrency', type=int, default=settings.INGEST_CONCURRENCY)
+        parser.add_argument('--batch-size', type=int, default=settings.INGEST_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        by_url = find_remote(options['models'], options['limit'])
+        if not by_url:
+            self.stdout.write(self.style.WARNING('No remote media found.'))
+            return
+        self.stdout.write(f'Downloading {len(by_url)} URLs used by {sum(map(len, by_url.values()))} fields...')
+        results, attached = ingest(by_url, options['concurrency'], options['batch_size'])
+
+        failed = [r for r in results if r.error]
+        for result in failed:
+            self.stdout.write(self.style.WARNING(f'  ✗ {result.url}: {result.error}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {len(results) - len(failed)} downloaded, {len(failed)} failed; {attached} fields now use local files'
+        ))
+        if failed:
+            self.stdout.write('Run again to retry the failures; partial downloads resume where they stopped.')
@@ -0,0 +1,43 @@
+import os
+
+from django.core.management.base import BaseCommand
+from api.media import adopt, orphaned_blobs, prunable, prune, stale_tmp_files
+
+class Command(BaseCommand):
+    help = 'Delete media blobs nothing has referenced for MEDIA_BLOB_GRACE_SECONDS (run hourly from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        deleted, freed = 0, 0
+        for name, size, last_used in orphaned_blobs():
+            if dry_run:
+                deleted += 1
+                freed += size
+            else:
+                # Pruned below with the rest, under the same lock and checks.
+                adopt(name, size, last_used)
+
+        for blob in prunable().iterator():
+            size = blob.size if dry_run else prune(blob.name)
+            if size is None:
+                continue
+            deleted += 1
+            freed += size
+
+        stale = 0
+        for path, size in stale_tmp_files():
+            if not dry_run:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+            stale += 1
+            freed += size
+
+        verb = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {verb} {deleted} unreferenced blobs and {stale} stale temporary files ({freed / 1024 / 1024:.1f} MB)'
+        ))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from api.idempotency import expired_before
+from api.models import IdempotencyKey
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys older than IDEMPOTENCY_KEY_TTL (run daily from cron)'
+
+    def handle(self, *args, **kwargs):
+        deleted, _ = IdempotencyKey.objects.filter(created_at__lt=expired_before()).delete()
+        self.stdout.write(self.style.SUCCESS(f'✓ Purged {deleted} expired idempotency keys'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from api.uploads import abort, expired
+
+class Command(BaseCommand):
+    help = 'Delete reel upload sessions not finalized within REEL_UPLOAD_TTL, with their part files (run daily from cron)'
+
+    def handle(self, *args, **kwargs):
+        count = 0
+        for upload in expired().iterator():
+            abort(upload)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'✓ Purged {count} abandoned reel uploads'))
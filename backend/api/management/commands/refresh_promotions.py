@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.promotions import refresh_active_promotions
+
+class Command(BaseCommand):
+    help = 'Rebuild the active scheduled promotions snapshot (run from cron at window boundaries)'
+
+    def handle(self, *args, **kwargs):
+        snapshot = refresh_active_promotions()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✓ {len(snapshot.product_discounts)} products and {len(snapshot.restaurant_discounts)} restaurants on promotion, '
+                f'valid until {timezone.localtime(snapshot.valid_until):%Y-%m-%d %H:%M}'
+            )
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from api.suggest import refresh_index
+
+class Command(BaseCommand):
+    help = 'Rebuild the search suggestion index with current order popularity (cron, more often than SUGGEST_INDEX_TTL)'
+
+    def handle(self, *args, **kwargs):
+        index = refresh_index()
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ {len(index.entries)} names indexed as {len(index.terms)} terms, {len(index.heads)} precomputed prefixes')
+        )
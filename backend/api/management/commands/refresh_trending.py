@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from api.trending import refresh
+
+class Command(BaseCommand):
+    help = 'Recompute decayed trending scores from recent order and view counters (run from cron every few minutes)'
+
+    def handle(self, *args, **kwargs):
+        products, restaurants = refresh()
+        self.stdout.write(self.style.SUCCESS(f'✓ {products} products and {restaurants} restaurants trending'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from api.engagement import prune, rollup
+
+class Command(BaseCommand):
+    help = 'Fold new reel engagement events into hourly and daily rollups (run from cron every few minutes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true', help='Also delete raw events and hourly rollups past retention')
+
+    def handle(self, *args, **options):
+        read = rollup()
+        self.stdout.write(self.style.SUCCESS(f'✓ {read} events rolled up'))
+        if options['prune']:
+            events, hourly = prune()
+            self.stdout.write(self.style.SUCCESS(f'✓ {events} raw events and {hourly} hourly rollups pruned'))
@@ -0,0 +1,174 @@
+"""
+Reference counting for content-addressed media (api.storage).
+
+Every image/file field value that names a blob counts as one reference. Saves
+compare the row's stored names with the new ones and adjust the counts in the
+same transaction as the row (models.MediaRefcounted); deletes release theirs.
+
+The storage claims a blob's row before it writes or reuses the file, which
+restarts its grace period. A blob nobody references is left in place for
+MEDIA_BLOB_GRACE_SECONDS after that, so an upload that is stored but not yet
+saved onto a row is never pulled from under it, and then removed by the
+prune_media_blobs command. Prune locks the row and checks it again before
+deleting, so it can't race a claim or a new reference. Files with no row at
+all (written before a crash, or before refcounting) are adopted with their
+mtime as the last use and pruned the same way.
+"""
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import MediaBlob
+from .storage import PREFIX, TMP_DIR, is_blob
+
+
+def file_fields(model):
+    return [f for f in model._meta.concrete_fields if isinstance(f, models.FileField)]
+
+
+def tracked_models():
+    return [model for model in apps.get_app_config('api').get_models() if file_fields(model)]
+
+
+def references(values):
+    return Counter(name for name in values if is_blob(name))
+
+
+def instance_references(instance):
+    return references(getattr(instance, f.attname).name for f in file_fields(type(instance)))
+
+
+def stored_references(instance, using):
+    """The blob names the row currently has in the database."""
+    if instance._state.adding or instance.pk is None:
+        return Counter()
+    fields = [f.attname for f in file_fields(type(instance))]
+    row = type(instance)._base_manager.using(using).filter(pk=instance.pk).values_list(*fields).first()
+    return references(row or ())
+
+
+def _size(name):
+    return default_storage.size(name) if default_storage.exists(name) else 0
+
+
+def acquire(names, using='default'):
+    blobs = MediaBlob.objects.using(using)
+    now = timezone.now()
+    for name, count in names.items():
+        if blobs.filter(name=name).update(refcount=F('refcount') + count, updated_at=now):
+            continue
+        try:
+            with transaction.atomic(using=using):
+                blobs.create(name=name, size=_size(name), refcount=count)
+        except IntegrityError:
+            # Created concurrently by another save of the same content
+            blobs.filter(name=name).update(refcount=F('refcount') + count, updated_at=now)
+
+
+def release(names, using='default'):
+    blobs = MediaBlob.objects.using(using)
+    now = timezone.now()
+    for name, count in names.items():
+        blobs.filter(name=name).update(refcount=Greatest(F('refcount') - count, 0), updated_at=now)
+
+
+def claim(name, size):
+    """The storage is about to hand out `name`: make sure it has a row and restart its grace period."""
+    now = timezone.now()
+    if MediaBlob.objects.filter(name=name).update(updated_at=now):
+        return
+    try:
+        with transaction.atomic():
+            MediaBlob.objects.create(name=name, size=size, refcount=0)
+    except IntegrityError:
+        MediaBlob.objects.filter(name=name).update(updated_at=now)
+
+
+def _cutoff():
+    return timezone.now() - timedelta(seconds=settings.MEDIA_BLOB_GRACE_SECONDS)
+
+
+def prunable():
+    return MediaBlob.objects.filter(refcount=0, updated_at__lt=_cutoff())
+
+
+def prune(name):
+    """Delete blob `name` if it is still unreferenced and past its grace period; returns its size or None."""
+    with transaction.atomic():
+        # The lock makes a concurrent claim() or acquire() wait, then see the row gone.
+        blob = prunable().select_for_update().filter(name=name).first()
+        if blob is None:
+            return None
+        default_storage.delete(name)
+        blob.delete()
+    return blob.size
+
+
+def _walk(directory, skip=None):
+    skip = skip and default_storage.path(skip)
+    for dirpath, dirnames, filenames in os.walk(default_storage.path(directory)):
+        dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) != skip]
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield path, stat
+
+
+def orphaned_blobs():
+    """(name, size, mtime) of blob files past the grace period that have no MediaBlob row."""
+    cutoff = _cutoff().timestamp()
+    media_root = default_storage.path('')
+    for path, stat in _walk(PREFIX, skip=TMP_DIR):
+        if stat.st_mtime >= cutoff:
+            continue
+        name = os.path.relpath(path, media_root).replace(os.sep, '/')
+        if not MediaBlob.objects.filter(name=name).exists():
+            yield name, stat.st_size, datetime.fromtimestamp(stat.st_mtime, dt_timezone.utc)
+
+
+def adopt(name, size, last_used):
+    """Give an orphaned blob file a row dated `last_used`, so prune() treats it like any other."""
+    try:
+        with transaction.atomic():
+            # Fails if a claim() created the row meanwhile, which keeps the file.
+            MediaBlob.objects.create(name=name, size=size, refcount=0)
+            MediaBlob.objects.filter(name=name).update(updated_at=last_used)
+    except IntegrityError:
+        return False
+    return True
+
+
+def stale_tmp_files():
+    """Paths and sizes of files the storage left under TMP_DIR (e.g. a crash mid-upload)."""
+    cutoff = _cutoff().timestamp()
+    for path, stat in _walk(TMP_DIR):
+        if stat.st_mtime < cutoff:
+            yield path, stat.st_size
+
+
+def rebuild_refcounts():
+    """Recount every reference from scratch, e.g. after bulk_create or raw SQL."""
+    counts = Counter()
+    for model in tracked_models():
+        fields = [f.attname for f in file_fields(model)]
+        for row in model._base_manager.values_list(*fields).iterator(chunk_size=2000):
+            counts.update(references(row))
+
+    now = timezone.now()
+    MediaBlob.objects.exclude(name__in=list(counts)).update(refcount=0, updated_at=now)
+    for name, count in counts.items():
+        updated = MediaBlob.objects.filter(name=name).exclude(refcount=count).update(refcount=count, updated_at=now)
+        if not updated and not MediaBlob.objects.filter(name=name).exists():
+            MediaBlob.objects.create(name=name, refcount=count, size=_size(name))
+    return counts
@@ -0,0 +1,64 @@
+"""
+Restaurant menu bundle.
+
+One response for the restaurant screen: the restaurant, then its categories in
+order, each with a product count and its products. Built with three queries and
+cached per restaurant. Like the price table, keys include the active promotions
+snapshot, so discounts starting or ending move every menu to fresh keys; catalog
+saves drop the menus they touch (api.signals).
+
+Image URLs are left relative to the site so one cached bundle serves every host.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Category, Product, Restaurant
+from .pricing import current_generation
+from .serializers import MenuProductSerializer, RestaurantSerializer
+
+
+def menu_key(restaurant_id, generation=None):
+    return f'menu:{generation if generation is not None else current_generation()}:{restaurant_id}'
+
+
+def build_menu(restaurant):
+    products = list(Product.objects.filter(restaurant=restaurant).select_related('category').order_by('category_id', 'id'))
+    # Categories the restaurant owns are listed even when empty; shared ones only when it uses them.
+    categories = {c.id: c for c in Category.objects.filter(restaurant=restaurant).order_by('id')}
+    grouped = {category_id: [] for category_id in categories}
+    for product in products:
+        product.restaurant = restaurant
+        categories.setdefault(product.category_id, product.category)
+        grouped.setdefault(product.category_id, []).append(product)
+
+    serialized = MenuProductSerializer(products, many=True).data
+    by_id = {item['id']: item for item in serialized}
+    return {
+        'restaurant': RestaurantSerializer(restaurant).data,
+        'categories': [
+            {
+                'id': category.id,
+                'name': category.name,
+                'image': category.image.url if category.image else None,
+                'product_count': len(grouped[category.id]),
+                'products': [by_id[p.id] for p in grouped[category.id]],
+            }
+            for category in sorted(categories.values(), key=lambda c: c.id)
+        ],
+        'product_count': len(products),
+    }
+
+
+def get_menu(restaurant_id):
+    """The menu bundle for `restaurant_id`; raises Restaurant.DoesNotExist."""
+    key = menu_key(restaurant_id)
+    menu = cache.get(key)
+    if menu is None:
+        menu = build_menu(Restaurant.objects.get(pk=restaurant_id))
+        cache.set(key, menu, settings.MENU_CACHE_TTL)
+    return menu
+
+
+def invalidate_menus(restaurant_ids):
+    generation = current_generation()
+    cache.delete_many([menu_key(rid, generation) for rid in set(restaurant_ids) if rid is not None])
@@ -0,0 +1,261 @@
+"""
+Per-route request metrics in Prometheus text format.
+
+Each gunicorn worker aggregates into plain dicts in memory (cheap on the hot
+path) and periodically snapshots them to ``METRICS_DIR/worker-<pid>.json`` with
+an atomic rename. The /metrics view sums every worker's file, so whichever
+worker serves the scrape reports totals for the whole server.
+
+The gunicorn master (gunicorn.conf.py) empties the directory when it starts,
+so files of a previous run never count, and retires a worker's file when the
+worker exits: renamed out of the worker-* namespace, so a new worker that
+reuses the pid starts from zero, and folded into retired.json so the totals
+never go backwards.
+"""
+import atexit
+import glob
+import json
+import os
+import shutil
+import threading
+import time
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': ('Request latency by route', LATENCY_BUCKETS),
+    'http_request_db_queries': ('Database queries per request by route', QUERY_BUCKETS),
+    'http_response_size_bytes': ('Response body size by route', SIZE_BUCKETS),
+}
+COUNTERS = {
+    'http_requests_total': 'Requests by route, method and status',
+    'http_request_db_query_seconds_total': 'Time spent in database queries by route',
+}
+
+LABEL_NAMES = {
+    'http_requests_total': ('route', 'method', 'status'),
+    'http_request_db_query_seconds_total': ('route',),
+    'http_request_duration_seconds': ('route', 'method'),
+    'http_request_db_queries': ('route',),
+    'http_response_size_bytes': ('route',),
+}
+
+
+class MetricsStore:
+    def __init__(self, directory, flush_interval):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.last_flush = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def path(self):
+        # Looked up on every flush so forked workers never share a file.
+        return os.path.join(self.directory, f'worker-{os.getpid()}.json')
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, labels)
+        with self.lock:
+            state = self.histograms.get(key)
+            if state is None:
+                state = self.histograms[key] = [0] * (len(buckets) + 2)  # buckets..., sum, count
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def record(self, route, method, status, duration, queries, query_time, size):
+        self.inc('http_requests_total', (route, method, str(status)))
+        self.observe('http_request_duration_seconds', (route, method), duration)
+        if queries is not None:
+            self.inc('http_request_db_query_seconds_total', (route,), query_time)
+            self.observe('http_request_db_queries', (route,), queries)
+        if size is not None:
+            self.observe('http_response_size_bytes', (route,), size)
+        self.maybe_flush()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(state)] for (name, labels), state in self.histograms.items()],
+            }
+
+    def maybe_flush(self):
+        now = time.monotonic()
+        if now - self.last_flush < self.flush_interval:
+            return
+        self.last_flush = now
+        self.flush()
+
+    def flush(self):
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, self.path)
+
+    def collect(self):
+        """Merge every worker's last snapshot, using live numbers for this worker."""
+        for _ in range(3):
+            snapshots, complete = _read_snapshots(self.directory, skip=self.path)
+            if complete:
+                break
+        return _merge([self.snapshot(), *snapshots])
+
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _read_snapshots(directory, skip=None):
+    """
+    Every snapshot in `directory` once, and whether that's certain: False when a
+    worker's file was retired between listing and reading it.
+    """
+    # Listed before retired.json is read, so a file it has just absorbed is skipped, not missed.
+    paths = sorted(glob.glob(os.path.join(directory, 'worker-*.json')) + glob.glob(os.path.join(directory, 'retired-*.json')))
+    try:
+        retired = _load(os.path.join(directory, RETIRED))
+    except (OSError, ValueError):
+        retired = None
+    absorbed = set(retired['merged']) if retired else set()
+    snapshots, complete = [retired] if retired else [], True
+    for path in paths:
+        if path == skip or os.path.basename(path) in absorbed:
+            continue
+        try:
+            snapshots.append(_load(path))
+        except FileNotFoundError:
+            complete = complete and not os.path.basename(path).startswith('worker-')
+        except (OSError, ValueError):
+            continue
+    return snapshots, complete
+
+
+def _merge(snapshots):
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, state in snapshot['histograms']:
+            key = (name, tuple(labels))
+            merged = histograms.setdefault(key, [0] * len(state))
+            for i, v in enumerate(state):
+                merged[i] += v
+    return counters, histograms
+
+
+RETIRED = 'retired.json'
+
+
+def reset(directory):
+    """Start a server with no snapshots; called by the gunicorn master before it forks."""
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def retire_worker(directory, pid):
+    """Fold an exited worker's last snapshot into retired.json; called by the gunicorn master."""
+    path = os.path.join(directory, f'worker-{pid}.json')
+    try:
+        os.replace(path, os.path.join(directory, f'retired-{pid}-{time.time_ns()}.json'))
+    except FileNotFoundError:
+        pass
+
+    retired_path = os.path.join(directory, RETIRED)
+    try:
+        previous = _load(retired_path)
+    except (OSError, ValueError):
+        previous = {'merged': [], 'counters': [], 'histograms': []}
+    snapshots, names = [previous], []
+    for path in sorted(glob.glob(os.path.join(directory, 'retired-*.json'))):
+        name = os.path.basename(path)
+        if name not in previous['merged']:
+            try:
+                snapshots.append(_load(path))
+            except (OSError, ValueError):
+                continue
+        names.append(name)
+
+    counters, histograms = _merge(snapshots)
+    tmp = f'{retired_path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({
+            'merged': names,
+            'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+            'histograms': [[name, list(labels), state] for (name, labels), state in histograms.items()],
+        }, f)
+    os.replace(tmp, retired_path)
+    # Readers skip these from now on, so removing them changes no total.
+    for name in names:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _labels(name, values, extra=None):
+    pairs = list(zip(LABEL_NAMES[name], values))
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def render(counters, histograms):
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f'{name}{_labels(name, labels)} {value}')
+
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (metric, labels), state in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, state):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(name, labels, ("le", bound))} {cumulative}')
+            lines.append(f'{name}_bucket{_labels(name, labels, ("le", "+Inf"))} {state[-1]}')
+            lines.append(f'{name}_sum{_labels(name, labels)} {state[-2]}')
+            lines.append(f'{name}_count{_labels(name, labels)} {state[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = MetricsStore(settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL)
+                atexit.register(_store.flush)
+    return _store
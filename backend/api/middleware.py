@@ -0,0 +1,170 @@
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+
+from .metrics import get_store
+from .profiling import RequestProfiler, execute_wrapper_everywhere, save_profile
+from .routers import begin_request, end_request
+
+
+class MetricsMiddleware:
+    """
+    Records latency, query count/time, response size and status per route.
+    Routes are labelled by URL name (e.g. ``reel-view``) so ids in the path
+    don't explode the number of series.
+
+    Queries are counted on every database alias, replicas included. Under ASGI
+    the async ORM runs queries on other threads, where these connection
+    wrappers can't see them, so async requests report no query stats.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        stats = {'queries': 0, 'query_time': 0.0}
+
+        def track(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                stats['queries'] += 1
+                stats['query_time'] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with execute_wrapper_everywhere(track):
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, stats['queries'], stats['query_time'])
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, None, None)
+        return response
+
+    def record(self, request, response, duration, queries, query_time):
+        match = getattr(request, 'resolver_match', None)
+        route = (match.view_name or match.route) if match else 'unmatched'
+        if response.streaming:
+            size = int(response['Content-Length']) if response.has_header('Content-Length') else None
+        else:
+            size = len(response.content)
+        get_store().record(route, request.method, response.status_code, duration, queries, query_time, size)
+
+
+class ReplicaPinMiddleware:
+    """
+    Sends every query of an unsafe request to the primary database, gives a
+    safe one the replica it reads from, and scopes that choice (and any pin set
+    by a write, see api.routers) to the request that made it.
+    """
+    sync_capable = True
+    async_capable = True
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = begin_request(request.method not in self.safe_methods)
+        try:
+            return self.get_response(request)
+        finally:
+            end_request(token)
+
+    async def __acall__(self, request):
+        token = begin_request(request.method not in self.safe_methods)
+        try:
+            return await self.get_response(request)
+        finally:
+            end_request(token)
+
+
+def _is_staff(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    # API clients authenticate in the view, so resolve their token here.
+    from rest_framework.settings import api_settings
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authentication_class().authenticate(request)
+        except Exception:
+            return False
+        if result is not None:
+            return result[0].is_staff
+    return False
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a request when a staff user sends ``X-Profile: 1`` (result stored,
+    id returned in ``X-Profile-Id``) or ``X-Profile: inline`` (result returned
+    instead of the response). PROFILING_SAMPLE_RATE additionally profiles that
+    fraction of all requests in the background.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def should_profile(self, request):
+        mode = request.headers.get('X-Profile')
+        if mode:
+            return mode, True
+        sampled = bool(settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE)
+        return None, sampled
+
+    def finish(self, profiler, response, mode):
+        result = profiler.result(response)
+        save_profile(result)
+        if mode == 'inline':
+            return JsonResponse(result)
+        if mode:
+            response['X-Profile-Id'] = result['id']
+        return response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        mode, profile = self.should_profile(request)
+        if not profile or (mode and not _is_staff(request)):
+            return self.get_response(request)
+
+        profiler = RequestProfiler(request)
+        response = profiler.run(self.get_response)
+        return self.finish(profiler, response, mode)
+
+    async def __acall__(self, request):
+        mode, profile = self.should_profile(request)
+        if not profile or (mode and not await sync_to_async(_is_staff)(request)):
+            return await self.get_response(request)
+
+        # The SQL log stays empty here: async ORM queries run on worker threads.
+        profiler = RequestProfiler(request)
+        response = await profiler.arun(self.get_response)
+        return await sync_to_async(self.finish)(profiler, response, mode)
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_reel_is_highlight'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Promotion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('starts_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField()),
+                ('discount_percentage', models.DecimalField(decimal_places=2, default=0.0, help_text='Discount percentage (0-100)', max_digits=5)),
+                ('mark_hot', models.BooleanField(default=False, help_text='Show targeted products in Hot Products section while active')),
+                ('feature_campaign', models.BooleanField(default=False, help_text='Show targeted restaurants as Hero Campaign while active')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('products', models.ManyToManyField(blank=True, related_name='promotions', to='api.product')),
+                ('restaurants', models.ManyToManyField(blank=True, related_name='promotions', to='api.restaurant')),
+            ],
+            options={
+                'ordering': ['-starts_at'],
+                'indexes': [models.Index(fields=['starts_at', 'ends_at'], name='api_promoti_starts__e331df_idx'), models.Index(fields=['ends_at'], name='api_promoti_ends_at_3c5c85_idx')],
+            },
+        ),
+    ]
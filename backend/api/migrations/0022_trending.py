@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_relatedproduct'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='trending_score',
+            field=models.FloatField(db_index=True, default=0, editable=False, help_text='Decayed recent orders and views, from refresh_trending'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='trending_score',
+            field=models.FloatField(db_index=True, default=0, editable=False, help_text='Decayed recent orders and views, from refresh_trending'),
+        ),
+        migrations.CreateModel(
+            name='TrendingCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('product', 'Product'), ('restaurant', 'Restaurant')], max_length=10)),
+                ('object_id', models.PositiveIntegerField()),
+                ('bucket', models.DateTimeField(db_index=True)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('views', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('scope', 'object_id', 'bucket'), name='unique_trending_counter')],
+            },
+        ),
+    ]
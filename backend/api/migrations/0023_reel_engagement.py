@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_trending'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCursor',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReelEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'View'), (2, 'Save'), (3, 'Unsave'), (4, 'Order click')])),
+                ('created_at', models.DateTimeField()),
+                ('reel', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.reel')),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReelEngagement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('saves', models.PositiveIntegerField(default=0)),
+                ('unsaves', models.PositiveIntegerField(default=0)),
+                ('order_clicks', models.PositiveIntegerField(default=0)),
+                ('reel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='engagement', to='api.reel')),
+            ],
+            options={
+                'ordering': ['reel', 'period', 'bucket'],
+                'indexes': [models.Index(fields=['period', 'bucket'], name='api_reeleng_period_201236_idx')],
+                'constraints': [models.UniqueConstraint(fields=('reel', 'period', 'bucket'), name='unique_reel_engagement_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_reelevent_inserted_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reelupload',
+            name='sha256',
+            field=models.CharField(blank=True, help_text='Hex SHA-256 of the whole file, checked at finalize if given', max_length=64),
+        ),
+    ]
@@ -1,7 +1,22 @@
-from django.db import models
+import uuid
+
+from django.db import models, router, transaction
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.functions import Now
+
+class MediaRefcounted:
+    """
+    For models with file fields: saves the row in the same transaction as the
+    blob refcount changes its save signals make (api.signals, api.media), so
+    the count can never lag behind a committed reference.
+    """
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
 
-class Restaurant(models.Model):
+class Restaurant(MediaRefcounted, models.Model):
     name = models.CharField(max_length=100)
     logo = models.ImageField(upload_to='restaurants/', null=True, blank=True)
     cover_image = models.ImageField(upload_to='restaurants/covers/', null=True, blank=True)
@@ -10,9 +25,13 @@ class Restaurant(models.Model):
     is_verified = models.BooleanField(default=False)
     whatsapp_number = models.CharField(max_length=20)
     location = models.CharField(max_length=255)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False, help_text="Derived from latitude/longitude for nearby search")
     description = models.TextField(blank=True)
     delivery_note = models.TextField(blank=True, help_text="Specific delivery instructions for this restaurant")
     is_popular = models.BooleanField(default=False)
+    trending_score = models.FloatField(default=0, db_index=True, editable=False, help_text="Decayed recent orders and views, from refresh_trending")
     is_featured_campaign = models.BooleanField(default=False, help_text="Show as Hero Campaign on Home Screen")
     
     # Payment Details
@@ -23,10 +42,25 @@ class Restaurant(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    @property
+    def effective_discount_percentage(self):
+        from decimal import Decimal
+        from .promotions import get_active_promotions
+        scheduled = get_active_promotions().restaurant_discounts.get(self.id, Decimal(0))
+        return max(self.discount_percentage, scheduled)
+
+    def save(self, *args, **kwargs):
+        from .geo import encode
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
-class Category(models.Model):
+class Category(MediaRefcounted, models.Model):
     restaurant = models.ForeignKey(Restaurant, related_name='categories', on_delete=models.CASCADE, null=True, blank=True)
     name = models.CharField(max_length=100)
     image = models.ImageField(upload_to='categories/', null=True, blank=True)
@@ -34,7 +68,7 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
-class Product(models.Model):
+class Product(MediaRefcounted, models.Model):
     restaurant = models.ForeignKey(Restaurant, related_name='products', on_delete=models.CASCADE, null=True, blank=True)
     category = models.ForeignKey(Category, related_name='products', on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
@@ -47,14 +81,17 @@ class Product(models.Model):
     shipping_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, help_text="Shipping fee for this product (0 for free)")
     rating = models.DecimalField(max_digits=3, decimal_places=1, default=5.0)
     calories = models.IntegerField(default=0)
+    trending_score = models.FloatField(default=0, db_index=True, editable=False, help_text="Decayed recent orders and views, from refresh_trending")
     
     @property
     def effective_discount_percentage(self):
         from decimal import Decimal
+        from .promotions import get_active_promotions
         prod_discount = Decimal(self.discount_percentage) if (self.is_promoted and self.discount_percentage > 0) else Decimal(0)
-        rest_discount = self.restaurant.discount_percentage if self.restaurant else Decimal(0)
+        rest_discount = self.restaurant.effective_discount_percentage if self.restaurant else Decimal(0)
+        scheduled_discount = get_active_promotions().product_discounts.get(self.id, Decimal(0))
         
-        return max(prod_discount, rest_discount)
+        return max(prod_discount, rest_discount, scheduled_discount)
 
     @property
     def discounted_price(self):
@@ -94,7 +131,122 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
 
-class Reel(models.Model):
+class ArchivedOrder(models.Model):
+    """
+    A delivered or cancelled order moved out of the Order table by
+    archive_orders once it is old, keeping its original id. Read-only; see
+    api.archive.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"Order #{self.id} - {self.user.username} (archived)"
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, related_name='items', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.IntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name}"
+
+class RelatedProduct(models.Model):
+    """
+    One of a product's top "frequently ordered together" neighbours, ranked
+    from 0. Rebuilt from order history by build_related_products; see
+    api.recommendations.
+    """
+    product = models.ForeignKey(Product, related_name='related_entries', on_delete=models.CASCADE)
+    related = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField(help_text="Cosine similarity of the two products' order sets")
+    orders_together = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['product', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_related_product_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} (#{self.rank})"
+
+class TrendingCounter(models.Model):
+    """
+    Orders and views of one product or restaurant within one time bucket.
+    Incremented as they happen and folded into trending_score by
+    refresh_trending; see api.trending.
+    """
+    SCOPE_CHOICES = (
+        ('product', 'Product'),
+        ('restaurant', 'Restaurant'),
+    )
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    object_id = models.PositiveIntegerField()
+    bucket = models.DateTimeField(db_index=True)
+    orders = models.PositiveIntegerField(default=0)
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'object_id', 'bucket'], name='unique_trending_counter'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.object_id} @ {self.bucket:%Y-%m-%d %H:%M}"
+
+class MediaBlob(models.Model):
+    """
+    A file in content-addressed media storage and how many model fields point
+    at it. Blobs whose count drops to zero are removed by prune_media_blobs
+    after a grace period. See api.storage and api.media.
+    """
+    name = models.CharField(max_length=255, primary_key=True)
+    size = models.BigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
+
+class IdempotencyKey(models.Model):
+    """
+    A client-supplied Idempotency-Key and the response it produced, so a retried
+    submission gets the original response instead of running again. A row
+    without a status is a request still in flight; a retry may take it over
+    once locked_until has passed. See api.idempotency.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.user_id})"
+
+class Reel(MediaRefcounted, models.Model):
     restaurant = models.ForeignKey(Restaurant, related_name='reels', on_delete=models.CASCADE, null=True, blank=True)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reels')
     video = models.FileField(upload_to='reels/')
@@ -106,6 +258,28 @@ class Reel(models.Model):
     def __str__(self):
         return f"Reel for {self.product.name}"
 
+class ReelUpload(models.Model):
+    """
+    A resumable reel video upload: the reel's fields up front, then the video in
+    chunks appended to a file on disk, then one finalize that creates the Reel.
+    See api.uploads.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, null=True, blank=True)
+    caption = models.TextField(blank=True)
+    is_highlight = models.BooleanField(default=False)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField(help_text="Total bytes the client will send")
+    sha256 = models.CharField(max_length=64, blank=True, help_text="Hex SHA-256 of the whole file, checked at finalize if given")
+    received = models.BigIntegerField(default=0)
+    reel = models.OneToOneField(Reel, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
 class SavedReel(models.Model):
     user = models.ForeignKey(User, related_name='saved_reels', on_delete=models.CASCADE)
     reel = models.ForeignKey(Reel, related_name='saves', on_delete=models.CASCADE)
@@ -113,3 +287,89 @@ class SavedReel(models.Model):
 
     class Meta:
         unique_together = ('user', 'reel')
+
+class ReelEvent(models.Model):
+    """
+    One raw engagement event on a reel, appended in batches. Only the primary
+    key is indexed: rollup_reel_engagement reads new events by id range into
+    ReelEngagement and prunes old ones, and nothing else queries this table.
+    See api.engagement.
+    """
+    VIEW, SAVE, UNSAVE, ORDER_CLICK = 1, 2, 3, 4
+    KIND_CHOICES = (
+        (VIEW, 'View'),
+        (SAVE, 'Save'),
+        (UNSAVE, 'Unsave'),
+        (ORDER_CLICK, 'Order click'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    # No foreign key constraints: inserts stay cheap and deleting a reel never scans this table.
+    reel = models.ForeignKey(Reel, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+')
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, null=True, blank=True, related_name='+')
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+    created_at = models.DateTimeField()
+    # When the row was written, by the database: events are buffered, so created_at can be much older.
+    inserted_at = models.DateTimeField(db_default=Now())
+
+class ReelEngagement(models.Model):
+    """Engagement counts of one reel over one hour or one day, built from ReelEvent."""
+    PERIOD_CHOICES = (
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    )
+
+    reel = models.ForeignKey(Reel, related_name='engagement', on_delete=models.CASCADE)
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+    saves = models.PositiveIntegerField(default=0)
+    unsaves = models.PositiveIntegerField(default=0)
+    order_clicks = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['reel', 'period', 'bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['reel', 'period', 'bucket'], name='unique_reel_engagement_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['period', 'bucket']),
+        ]
+
+    def __str__(self):
+        return f"{self.reel_id} {self.period} {self.bucket:%Y-%m-%d %H:%M}"
+
+class RollupCursor(models.Model):
+    """How far a rollup job has read an append-only table, by primary key."""
+    name = models.CharField(max_length=50, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_id}"
+
+class Promotion(models.Model):
+    """
+    A time-windowed promotion. While the window is open its discount applies to
+    the targeted products and restaurants; see api.promotions for how the
+    active set is precomputed.
+    """
+    name = models.CharField(max_length=100)
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField()
+    discount_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0.00, help_text="Discount percentage (0-100)")
+    products = models.ManyToManyField(Product, related_name='promotions', blank=True)
+    restaurants = models.ManyToManyField(Restaurant, related_name='promotions', blank=True)
+    mark_hot = models.BooleanField(default=False, help_text="Show targeted products in Hot Products section while active")
+    feature_campaign = models.BooleanField(default=False, help_text="Show targeted restaurants as Hero Campaign while active")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-starts_at']
+        indexes = [
+            models.Index(fields=['starts_at', 'ends_at']),
+            models.Index(fields=['ends_at']),
+        ]
+
+    def __str__(self):
+        return self.name
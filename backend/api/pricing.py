@@ -0,0 +1,104 @@
+"""
+Authoritative cart pricing.
+
+Prices live in a cached price table: one entry per product holding its unit
+price, effective discount, discounted price and shipping fee. Entries are keyed
+on the active promotions snapshot, so a promotion starting or ending moves the
+whole table to fresh keys, and product/restaurant saves drop their entries
+(api.signals). A quote costs one cache get_many plus at most one query for the
+misses, whatever the cart size.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Product
+from .promotions import get_active_promotions
+
+DELIVERY_FEE = Decimal('500.00')  # KES, charged unless the order is picked up
+CENTS = Decimal('0.01')
+
+
+class UnknownProducts(Exception):
+    def __init__(self, ids):
+        super().__init__(f"Unknown product ids: {', '.join(map(str, ids))}")
+        self.ids = ids
+
+
+def current_generation():
+    """Cache key component for the active promotions snapshot; changes whenever a discount starts or ends."""
+    built_at = get_active_promotions().built_at
+    return int(built_at.timestamp() * 1000) if built_at else 0
+
+
+def price_key(product_id, generation=None):
+    return f'price:{generation if generation is not None else current_generation()}:{product_id}'
+
+
+def _entry(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'restaurant': product.restaurant_id,
+        'unit_price': product.price,
+        'discount_percentage': product.effective_discount_percentage,
+        'discounted_price': product.discounted_price.quantize(CENTS, rounding=ROUND_HALF_UP),
+        'shipping_fee': product.shipping_fee,
+    }
+
+
+def get_prices(product_ids, use_cache=True):
+    """{product_id: price entry}; ids that don't exist are simply absent."""
+    product_ids = set(product_ids)
+    prices = {}
+    if use_cache:
+        generation = current_generation()
+        keys = {price_key(pid, generation): pid for pid in product_ids}
+        prices = {keys[k]: v for k, v in cache.get_many(list(keys)).items()}
+
+    missing = product_ids - set(prices)
+    if missing:
+        fetched = {p.id: _entry(p) for p in Product.objects.filter(id__in=missing).select_related('restaurant')}
+        prices.update(fetched)
+        if use_cache and fetched:
+            cache.set_many({price_key(pid, generation): entry for pid, entry in fetched.items()}, settings.PRICE_CACHE_TTL)
+    return prices
+
+
+def invalidate_prices(product_ids):
+    generation = current_generation()
+    cache.delete_many([price_key(pid, generation) for pid in product_ids])
+
+
+def charges_delivery(delivery_address):
+    # Stripped here as well as in the serializers, so every caller agrees on the fee.
+    address = (delivery_address or '').strip()
+    return bool(address) and address != 'Pickup'
+
+
+def quote(items, delivery_address=None, use_cache=True):
+    """
+    Price a cart of [{'id': product_id, 'quantity': n}, ...]: the discounted
+    lines plus the delivery fee, once per order. Each line reports its
+    product's shipping fee, which is not charged.
+    """
+    prices = get_prices((item['id'] for item in items), use_cache=use_cache)
+    unknown = sorted({item['id'] for item in items} - set(prices))
+    if unknown:
+        raise UnknownProducts(unknown)
+
+    lines, subtotal = [], Decimal(0)
+    for item in items:
+        entry = prices[item['id']]
+        line_total = entry['discounted_price'] * item['quantity']
+        subtotal += line_total
+        lines.append({**entry, 'quantity': item['quantity'], 'line_total': line_total})
+
+    delivery_fee = DELIVERY_FEE if charges_delivery(delivery_address) else Decimal(0)
+    return {
+        'items': lines,
+        'subtotal': subtotal,
+        'delivery_fee': delivery_fee,
+        'total': subtotal + delivery_fee,
+    }
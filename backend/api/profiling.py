@@ -0,0 +1,149 @@
+"""
+On-demand request profiling for staff.
+
+A profile holds the cProfile stats of the request plus every SQL query it ran
+with its duration, and groups repeated statements so N+1 patterns stand out.
+Profiles are written as JSON under PROFILING_DIR so any worker can serve them
+back through /api/profiles/.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+
+def execute_wrapper_everywhere(wrapper):
+    """connection.execute_wrapper() on every database alias, replicas included."""
+    stack = ExitStack()
+    for conn in connections.all():
+        stack.enter_context(conn.execute_wrapper(wrapper))
+    return stack
+
+
+class RequestProfiler:
+    def __init__(self, request):
+        self.request = request
+        self.profiler = cProfile.Profile()
+        self.queries = []
+
+    def _track(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': repr(params)[:500],
+                'many': many,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+            })
+
+    def run(self, get_response):
+        started = time.perf_counter()
+        with execute_wrapper_everywhere(self._track):
+            self.profiler.enable()
+            try:
+                response = get_response(self.request)
+            finally:
+                self.profiler.disable()
+        self.duration_ms = round((time.perf_counter() - started) * 1000, 3)
+        return response
+
+    async def arun(self, get_response):
+        started = time.perf_counter()
+        self.profiler.enable()
+        try:
+            response = await get_response(self.request)
+        finally:
+            self.profiler.disable()
+        self.duration_ms = round((time.perf_counter() - started) * 1000, 3)
+        return response
+
+    def duplicates(self):
+        groups = {}
+        for query in self.queries:
+            group = groups.setdefault(query['sql'], {'sql': query['sql'], 'count': 0, 'total_ms': 0.0})
+            group['count'] += 1
+            group['total_ms'] += query['duration_ms']
+        repeated = [g for g in groups.values() if g['count'] > 1]
+        for group in repeated:
+            group['total_ms'] = round(group['total_ms'], 3)
+        return sorted(repeated, key=lambda g: g['count'], reverse=True)
+
+    def stats_text(self, limit):
+        out = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=out)
+        stats.sort_stats('cumulative').print_stats(limit)
+        return out.getvalue()
+
+    def result(self, response):
+        return {
+            'id': uuid.uuid4().hex,
+            'created_at': timezone.now().isoformat(),
+            'method': self.request.method,
+            'path': self.request.get_full_path(),
+            'status': response.status_code,
+            'duration_ms': self.duration_ms,
+            'query_count': len(self.queries),
+            'query_time_ms': round(sum(q['duration_ms'] for q in self.queries), 3),
+            'duplicate_queries': self.duplicates(),
+            'queries': self.queries,
+            'profile': self.stats_text(settings.PROFILING_TOP_FUNCTIONS),
+        }
+
+
+def _path(profile_id):
+    return os.path.join(settings.PROFILING_DIR, f'{profile_id}.json')
+
+
+def save_profile(result):
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    tmp = _path(result['id']) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(result, f)
+    os.replace(tmp, _path(result['id']))
+    _prune()
+
+
+def load_profile(profile_id):
+    if not profile_id.isalnum():
+        return None
+    try:
+        with open(_path(profile_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def recent_profiles():
+    """Newest first, without the bulky query log and stats."""
+    summaries = []
+    for entry in _entries():
+        profile = load_profile(entry.name[:-len('.json')])
+        if profile:
+            summaries.append({k: profile[k] for k in ('id', 'created_at', 'method', 'path', 'status', 'duration_ms', 'query_count')})
+    return summaries
+
+
+def _entries():
+    try:
+        entries = [e for e in os.scandir(settings.PROFILING_DIR) if e.name.endswith('.json')]
+    except FileNotFoundError:
+        return []
+    return sorted(entries, key=lambda e: e.stat().st_mtime, reverse=True)
+
+
+def _prune():
+    for entry in _entries()[settings.PROFILING_MAX_PROFILES:]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
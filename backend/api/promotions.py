@@ -0,0 +1,125 @@
+"""
+Precomputed set of currently active scheduled promotions.
+
+Evaluating ``starts_at <= now < ends_at`` for every product on every request
+is wasteful because the answer only changes at window boundaries. Instead we
+build a snapshot of the active set (id -> discount lookups) once, store it in
+the shared cache until the next boundary, and keep a short-lived copy in
+process memory so serializers can consult it per row for free.
+"""
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Min
+from django.utils import timezone
+
+CACHE_KEY = 'promotions:active'
+# How long a worker trusts its in-process copy before re-reading the shared cache.
+LOCAL_TTL = 5
+# Upper bound on the snapshot lifetime when no boundary is coming up.
+MAX_SNAPSHOT_AGE = 60 * 60
+
+_local = {'snapshot': None, 'checked_at': 0.0}
+
+
+class ActivePromotions:
+    def __init__(self, product_discounts=None, restaurant_discounts=None,
+                 hot_product_ids=None, featured_restaurant_ids=None, valid_until=None, built_at=None):
+        self.product_discounts = product_discounts or {}
+        self.restaurant_discounts = restaurant_discounts or {}
+        self.hot_product_ids = frozenset(hot_product_ids or ())
+        self.featured_restaurant_ids = frozenset(featured_restaurant_ids or ())
+        self.valid_until = valid_until
+        # Identifies this build; caches derived from the snapshot key on it.
+        self.built_at = built_at
+
+    @property
+    def product_ids(self):
+        return frozenset(self.product_discounts)
+
+    @property
+    def restaurant_ids(self):
+        return frozenset(self.restaurant_discounts)
+
+    def is_stale(self, now=None):
+        now = now or timezone.now()
+        return self.valid_until is not None and now >= self.valid_until
+
+
+def build_active_promotions(now=None):
+    """
+    Query the promotions whose window contains ``now`` and flatten them into
+    lookup tables. ``valid_until`` is the next start or end boundary, after
+    which the snapshot must be rebuilt.
+    """
+    from .models import Promotion
+
+    now = now or timezone.now()
+    active = Promotion.objects.filter(starts_at__lte=now, ends_at__gt=now)
+
+    product_discounts = {}
+    hot_product_ids = set()
+    product_links = Promotion.products.through.objects.filter(promotion__in=active).values_list(
+        'product_id', 'promotion__discount_percentage', 'promotion__mark_hot'
+    )
+    for product_id, discount, mark_hot in product_links:
+        product_discounts[product_id] = max(discount, product_discounts.get(product_id, Decimal(0)))
+        if mark_hot:
+            hot_product_ids.add(product_id)
+
+    restaurant_discounts = {}
+    featured_restaurant_ids = set()
+    restaurant_links = Promotion.restaurants.through.objects.filter(promotion__in=active).values_list(
+        'restaurant_id', 'promotion__discount_percentage', 'promotion__feature_campaign'
+    )
+    for restaurant_id, discount, feature_campaign in restaurant_links:
+        restaurant_discounts[restaurant_id] = max(discount, restaurant_discounts.get(restaurant_id, Decimal(0)))
+        if feature_campaign:
+            featured_restaurant_ids.add(restaurant_id)
+
+    next_end = active.aggregate(t=Min('ends_at'))['t']
+    next_start = Promotion.objects.filter(starts_at__gt=now).aggregate(t=Min('starts_at'))['t']
+    boundaries = [t for t in (next_end, next_start) if t is not None]
+    valid_until = min(boundaries) if boundaries else now + timedelta(seconds=MAX_SNAPSHOT_AGE)
+
+    return ActivePromotions(
+        product_discounts=product_discounts,
+        restaurant_discounts=restaurant_discounts,
+        hot_product_ids=hot_product_ids,
+        featured_restaurant_ids=featured_restaurant_ids,
+        valid_until=valid_until,
+        built_at=now,
+    )
+
+
+def refresh_active_promotions(now=None):
+    """Rebuild the snapshot and publish it to the shared cache."""
+    now = now or timezone.now()
+    snapshot = build_active_promotions(now)
+    timeout = max(1, int((snapshot.valid_until - now).total_seconds()))
+    cache.set(CACHE_KEY, snapshot, timeout)
+    _local['snapshot'] = snapshot
+    _local['checked_at'] = time.monotonic()
+    return snapshot
+
+
+def get_active_promotions():
+    now = timezone.now()
+    snapshot = _local['snapshot']
+    if snapshot is not None and not snapshot.is_stale(now) and time.monotonic() - _local['checked_at'] < LOCAL_TTL:
+        return snapshot
+
+    snapshot = cache.get(CACHE_KEY)
+    if snapshot is None or snapshot.is_stale(now):
+        return refresh_active_promotions(now)
+
+    _local['snapshot'] = snapshot
+    _local['checked_at'] = time.monotonic()
+    return snapshot
+
+
+def invalidate_active_promotions():
+    cache.delete(CACHE_KEY)
+    _local['snapshot'] = None
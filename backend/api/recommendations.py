@@ -0,0 +1,152 @@
+"""
+"Frequently ordered together" from order history.
+
+Orders are turned into a sparse order x product incidence matrix B; B.T @ B
+is then the product x product co-occurrence matrix C, with C[i, j] the number
+of orders containing both products and C[i, i] the orders containing i. Pairs
+are scored by cosine similarity, C[i, j] / sqrt(C[i, i] * C[j, j]), so staples
+that go with everything don't top every list, and the best RELATED_TOP_K per
+product are written to RelatedProduct for the API to read with one indexed
+lookup.
+
+C is kept in RECOMMENDATIONS_STATE together with the last order folded in, so
+a run only reads the orders placed since and rewrites the products whose scores
+those orders changed. A full run starts from scratch, which also forgets orders
+that were cancelled after being counted.
+"""
+import os
+from dataclasses import dataclass
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+
+from .models import ArchivedOrderItem, OrderItem, Product, RelatedProduct
+
+# Orders younger than this may still be committing; they are picked up next run.
+SETTLE_SECONDS = 5 * 60
+
+
+@dataclass
+class State:
+    counts: sparse.csr_matrix
+    last_order_id: int = 0
+
+
+def load_state():
+    path = settings.RECOMMENDATIONS_STATE
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as f:
+        counts = sparse.csr_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+        return State(counts, int(f['last_order_id']))
+
+
+def save_state(state):
+    path = settings.RECOMMENDATIONS_STATE
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez_compressed(
+            f, data=state.counts.data, indices=state.counts.indices, indptr=state.counts.indptr,
+            shape=np.array(state.counts.shape), last_order_id=state.last_order_id,
+        )
+    os.replace(tmp, path)
+
+
+def order_items(after_order_id):
+    """(order_ids, product_ids) arrays for settled, non-cancelled orders after `after_order_id`."""
+    cutoff = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    # Archived orders keep their ids, so they are only new to a full run.
+    sources = [
+        model.objects.filter(order_id__gt=after_order_id, order__created_at__lt=cutoff)
+        .exclude(order__status='cancelled')
+        .values_list('order_id', 'product_id')
+        for model in (OrderItem, ArchivedOrderItem)
+    ]
+    pairs = np.fromiter(
+        (value for rows in sources for row in rows.iterator(chunk_size=settings.STREAMING_CHUNK_SIZE * 10) for value in row),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def cooccurrence(order_ids, product_ids, n_products):
+    """Product x product counts of shared orders, with per-product order counts on the diagonal."""
+    orders, row = np.unique(order_ids, return_inverse=True)
+    incidence = sparse.csr_matrix(
+        (np.ones(len(row), dtype=np.int64), (row, product_ids)), shape=(len(orders), n_products)
+    )
+    incidence.sum_duplicates()
+    incidence.data[:] = 1  # a product twice in one order is still one order
+    return (incidence.T @ incidence).tocsr()
+
+
+def top_related(counts, products, k, min_orders):
+    """(product, related, rank, score, together) arrays: the best k neighbours of each of `products`."""
+    totals = counts.diagonal().astype(np.float64)
+    block = counts[products].tocoo()
+    source = products[block.row]
+    keep = (block.col != source) & (block.data >= min_orders)
+    source, related, together = source[keep], block.col[keep], block.data[keep]
+    score = together / np.sqrt(totals[source] * totals[related])
+
+    # Group by product, best score first; ties go to the lower id so reruns agree.
+    order = np.lexsort((related, -score, source))
+    source, related, together, score = source[order], related[order], together[order], score[order]
+    starts = np.flatnonzero(np.r_[True, source[1:] != source[:-1]])
+    rank = np.arange(len(source)) - np.repeat(starts, np.diff(np.r_[starts, len(source)]))
+    top = rank < k
+    return source[top], related[top], rank[top], score[top], together[top]
+
+
+def write_related(products, rows, replace_all=False, batch_size=500):
+    """Replace the RelatedProduct rows of `products` (ids), or of everything, with `rows` from top_related."""
+    existing = set(Product.objects.values_list('id', flat=True))
+    objs = [
+        RelatedProduct(product_id=p, related_id=r, rank=n, score=s, orders_together=t)
+        for p, r, n, s, t in zip(*(column.tolist() for column in rows))
+        if p in existing and r in existing
+    ]
+    ids = products.tolist()
+    with transaction.atomic():
+        if replace_all:
+            RelatedProduct.objects.all().delete()
+        for start in range(0, 0 if replace_all else len(ids), batch_size):
+            RelatedProduct.objects.filter(product_id__in=ids[start:start + batch_size]).delete()
+        RelatedProduct.objects.bulk_create(objs, batch_size=batch_size)
+    return len(objs)
+
+
+def build(full=False, k=None, min_orders=None):
+    """Fold new orders into the stored counts and rewrite the affected lists. Returns (orders, products, rows)."""
+    k = k or settings.RELATED_TOP_K
+    min_orders = min_orders or settings.RELATED_MIN_ORDERS
+    state = None if full else load_state()
+    if state is None:
+        state = State(sparse.csr_matrix((0, 0), dtype=np.int64))
+        full = True
+
+    order_ids, product_ids = order_items(state.last_order_id)
+    n_products = max(state.counts.shape[0], int(product_ids.max()) + 1 if len(product_ids) else 0)
+    if not len(order_ids) and not full:
+        return 0, 0, 0
+
+    counts = state.counts.copy()
+    counts.resize((n_products, n_products))
+    added = cooccurrence(order_ids, product_ids, n_products)
+    counts = (counts + added).tocsr()
+
+    if full:
+        affected = np.flatnonzero(counts.diagonal())
+    else:
+        # New orders change the touched products' totals, so every list that mentions them moves too.
+        touched = np.flatnonzero(added.diagonal())
+        affected = np.union1d(touched, counts[:, touched].tocoo().row)
+
+    written = write_related(affected, top_related(counts, affected, k, min_orders), replace_all=full)
+    save_state(State(counts, int(order_ids.max()) if len(order_ids) else state.last_order_id))
+    return len(np.unique(order_ids)), len(affected), written
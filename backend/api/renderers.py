@@ -0,0 +1,75 @@
+"""
+Response renderers.
+
+FastJSONRenderer encodes with orjson and produces the same JSON values as
+DRF's JSONRenderer: dicts, lists, strings, numbers and UUIDs are handled in C,
+and only the leftovers (datetimes, Decimal, lazy strings, querysets, ...) go
+through DRF's encoder one value at a time, so datetimes are formatted by DRF
+(precision, "Z" for UTC) whatever orjson would do. The bytes can still differ
+in two ways: floats may be spelled differently (1e16 rather than 1e+16, same
+value), and NaN and infinities, which DRF refuses to render (STRICT_JSON),
+come out as null. Requests asking for indented output (the browsable API,
+`; indent=` in Accept) still use DRF's renderer.
+
+MessagePackRenderer serves the same data as MessagePack to clients that send
+`Accept: application/msgpack` (or `?format=msgpack`).
+"""
+import decimal
+
+import msgpack
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_drf_encoder = JSONEncoder()
+
+# Datetimes go to _default, so their precision and UTC suffix follow DRF's encoder, not orjson's.
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    # Decimals are most of the fallback traffic; DRF renders them as floats.
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    return _drf_encoder.default(obj)
+
+
+def dumps(data):
+    """JSON with the same values as DRF's compact, non-ASCII-escaping output (see above)."""
+    try:
+        return orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+    except orjson.JSONEncodeError:
+        # e.g. integers beyond 64 bits, which stdlib json handles
+        return JSONRenderer().render(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context) or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+def _msgpack_default(obj):
+    # Anything msgpack has no native type for is sent as its JSON representation
+    # (datetimes as ISO strings, Decimals as floats, ...).
+    return orjson.loads(dumps(obj))
+
+
+def packb(data):
+    return msgpack.packb(data, default=_msgpack_default, use_bin_type=True, datetime=False)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return packb(data)
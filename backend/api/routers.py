@@ -0,0 +1,58 @@
+"""
+Primary/replica routing.
+
+Catalog and reel reads (the bulk of api.views traffic) go to a replica from
+REPLICA_DATABASES, picked once per request so all of its reads see the same
+point in time. Everything else, every write, and every read made after a
+write in the same request stays on the primary so clients never read their
+own writes from a lagging replica. ReplicaPinMiddleware pins whole unsafe
+requests (POST/PUT/PATCH/DELETE) to the primary up front and scopes the
+choice to a single request.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+REPLICA_MODELS = {'restaurant', 'category', 'product', 'reel', 'savedreel', 'promotion'}
+
+# Where catalog reads go in this request/task: a replica alias, or 'default'
+# once pinned to the primary. None until the first such read outside a request.
+_read_alias = ContextVar('db_read_alias', default=None)
+
+
+def _pick():
+    return random.choice(settings.REPLICA_DATABASES) if settings.REPLICA_DATABASES else 'default'
+
+
+def begin_request(pinned):
+    """Start a request with its own replica (or the primary); returns a token for end_request."""
+    return _read_alias.set('default' if pinned else _pick())
+
+
+def end_request(token):
+    # Also discards any pin set by a write during the request.
+    _read_alias.reset(token)
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'api' or model._meta.model_name not in REPLICA_MODELS:
+            return 'default'
+        alias = _read_alias.get()
+        if alias is None:
+            alias = _pick()
+            _read_alias.set(alias)
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Reads later in this request/task must see the write.
+        _read_alias.set('default')
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas mirror the primary, so objects from any of them may be related.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
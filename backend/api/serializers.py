@@ -1,7 +1,15 @@
 
+import os
+import re
+
+from django.conf import settings
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Category, Product, Order, OrderItem, Reel, SavedReel, Restaurant
+from django.db import transaction
+from .models import Category, Product, Order, OrderItem, ArchivedOrder, ArchivedOrderItem, Reel, ReelUpload, SavedReel, Restaurant, Promotion
+from .promotions import get_active_promotions
+from .pricing import UnknownProducts, quote
+from .trending import record_order
 
 User = get_user_model()
 
@@ -28,6 +36,17 @@ class RestaurantSerializer(serializers.ModelSerializer):
         model = Restaurant
         fields = '__all__'
 
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        promotions = get_active_promotions()
+        if instance.id in promotions.restaurant_discounts:
+            representation['discount_percentage'] = self.fields['discount_percentage'].to_representation(instance.effective_discount_percentage)
+        if instance.id in promotions.featured_restaurant_ids:
+            representation['is_featured_campaign'] = True
+        if hasattr(instance, 'distance_km'):
+            representation['distance_km'] = instance.distance_km
+        return representation
+
 class CategorySerializer(serializers.ModelSerializer):
     restaurant = serializers.PrimaryKeyRelatedField(queryset=Restaurant.objects.all(), required=False, allow_null=True)
     restaurant_data = RestaurantSerializer(source='restaurant', read_only=True)
@@ -48,8 +67,36 @@ class ProductSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         representation['discount_percentage'] = instance.effective_discount_percentage
+        promotions = get_active_promotions()
+        if instance.id in promotions.product_discounts:
+            representation['is_promoted'] = True
+        if instance.id in promotions.hot_product_ids:
+            representation['is_hot'] = True
         return representation
 
+class MenuProductSerializer(ProductSerializer):
+    # Nested under its restaurant in the menu bundle, so no restaurant_data per product.
+    class Meta(ProductSerializer.Meta):
+        fields = [f for f in ProductSerializer.Meta.fields if f != 'restaurant_data']
+
+class PromotionSerializer(serializers.ModelSerializer):
+    is_active = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Promotion
+        fields = ['id', 'name', 'starts_at', 'ends_at', 'discount_percentage', 'products', 'restaurants', 'mark_hot', 'feature_campaign', 'is_active', 'created_at']
+
+    def get_is_active(self, obj):
+        from django.utils import timezone
+        return obj.starts_at <= timezone.now() < obj.ends_at
+
+    def validate(self, data):
+        starts_at = data.get('starts_at', getattr(self.instance, 'starts_at', None))
+        ends_at = data.get('ends_at', getattr(self.instance, 'ends_at', None))
+        if starts_at and ends_at and ends_at <= starts_at:
+            raise serializers.ValidationError({'ends_at': 'Must be after starts_at'})
+        return data
+
 class OrderItemSerializer(serializers.ModelSerializer):
     product_name = serializers.ReadOnlyField(source='product.name')
     product_image = serializers.ImageField(source='product.image', read_only=True)
@@ -66,69 +113,97 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['user', 'total_amount', 'status', 'created_at']
 
-class CreateOrderSerializer(serializers.Serializer):
-    items = serializers.ListField(child=serializers.DictField(child=serializers.IntegerField()))
-    delivery_address = serializers.CharField(required=False, allow_blank=True)
+class ArchivedOrderItemSerializer(OrderItemSerializer):
+    class Meta(OrderItemSerializer.Meta):
+        model = ArchivedOrderItem
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ArchivedOrder
+        fields = '__all__'
+        read_only_fields = ['user', 'total_amount', 'status', 'created_at', 'archived_at']
+
+class CartItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+class CartQuoteSerializer(serializers.Serializer):
+    items = CartItemSerializer(many=True, allow_empty=False)
+    # Stripped, as in pricing.charges_delivery, so a padded address is priced like the plain one.
+    delivery_address = serializers.CharField(required=False, allow_blank=True, trim_whitespace=True)
+
+class QuoteLineSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    restaurant = serializers.IntegerField(allow_null=True)
+    quantity = serializers.IntegerField()
+    unit_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    discount_percentage = serializers.DecimalField(max_digits=5, decimal_places=2)
+    discounted_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    shipping_fee = serializers.DecimalField(max_digits=10, decimal_places=2)
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+class QuoteSerializer(serializers.Serializer):
+    """A pricing.quote() result, with money as strings like every other amount in the API."""
+    items = QuoteLineSerializer(many=True)
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2)
+    delivery_fee = serializers.DecimalField(max_digits=10, decimal_places=2)
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+class CreateOrderSerializer(CartQuoteSerializer):
     payment_method = serializers.CharField()
     phone_number = serializers.CharField(required=False, allow_blank=True)
+    # The quoted total the customer confirmed; the order is refused if the price has moved since.
+    total_amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
 
     def create(self, validated_data):
-        items_data = validated_data.pop('items')
-        phone_number = validated_data.pop('phone_number', None)
         user = self.context['request'].user
-        
-        # Calculate total
-        total = 0
-        order_items = []
-        
-        for item in items_data:
-            product = Product.objects.get(id=item['id'])
-            quantity = item['quantity']
-            # Use discounted price
-            price_per_unit = product.discounted_price
-            price = price_per_unit * quantity
-            total += price
-            order_items.append({
-                'product': product,
-                'quantity': quantity,
-                'price': price_per_unit
+
+        # Price every line from the database in one query; never trust cached prices for the charge.
+        try:
+            cart = quote(validated_data['items'], validated_data.get('delivery_address'), use_cache=False)
+        except UnknownProducts as exc:
+            raise serializers.ValidationError({'items': str(exc)})
+        total = cart['total']
+        expected = validated_data.get('total_amount')
+        if expected is not None and expected != total:
+            raise serializers.ValidationError({
+                'total_amount': [f'The total for this order is now KSh {total:.2f}. Please review it and try again.'],
             })
-            
-        # Add delivery fee if applicable
-        if validated_data.get('delivery_address') and validated_data.get('delivery_address') != 'Pickup':
-            total += 500 # 500 KES delivery fee
-            
-        # Create Order
-        order = Order.objects.create(
-            user=user,
-            total_amount=total,
-            **validated_data
-        )
-        
-        # Create Order Items
-        for item in order_items:
-            OrderItem.objects.create(
-                order=order,
-                product=item['product'],
-                quantity=item['quantity'],
-                price=item['price']
-            )
 
-        # Handle M-Pesa Payment
-        if validated_data.get('payment_method') == 'mpesa' and phone_number:
-            try:
-                from api.utils import IntaSendService
-                service = IntaSendService()
-                response = service.trigger_stk_push(
-                    phone_number=phone_number,
-                    amount=float(total),
-                    narrative=f"Order {order.id}"
-                )
-            except Exception as e:
-                print(f"Payment Error: {str(e)}")
-            
+        with transaction.atomic():
+            order = Order.objects.create(user=user, total_amount=total)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_id=line['id'], quantity=line['quantity'], price=line['discounted_price'])
+                for line in cart['items']
+            ])
+            # After commit, so the shared counter rows aren't locked for the rest of the order.
+            lines = [(line['id'], line['restaurant']) for line in cart['items']]
+            transaction.on_commit(lambda: record_order(lines), robust=True)
+
+            phone_number = validated_data.get('phone_number')
+            # Handle M-Pesa Payment once the order has committed, together with its
+            # idempotency record when the request has a key: an order rolled back
+            # after the prompt would prompt the customer again on retry.
+            if validated_data.get('payment_method') == 'mpesa' and phone_number:
+                transaction.on_commit(lambda: self.request_payment(order, phone_number))
+
         return order
 
+    def request_payment(self, order, phone_number):
+        try:
+            from api.utils import IntaSendService
+            service = IntaSendService()
+            service.trigger_stk_push(
+                phone_number=phone_number,
+                amount=float(order.total_amount),
+                narrative=f"Order {order.id}"
+            )
+        except Exception as e:
+            print(f"Payment Error: {str(e)}")
+
 class ReelSerializer(serializers.ModelSerializer):
     product_details = ProductSerializer(source='product', read_only=True)
     is_saved = serializers.SerializerMethodField()
@@ -141,11 +216,34 @@ class ReelSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'product_details', 'video', 'caption', 'is_highlight', 'views', 'created_at', 'is_saved', 'restaurant', 'restaurant_data']
 
     def get_is_saved(self, obj):
+        saved_reel_ids = self.context.get('saved_reel_ids')
+        if saved_reel_ids is not None:
+            return obj.id in saved_reel_ids
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return SavedReel.objects.filter(user=request.user, reel=obj).exists()
         return False
 
+class ReelUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ReelUpload
+        fields = ['id', 'product', 'restaurant', 'caption', 'is_highlight', 'filename', 'size', 'sha256', 'received', 'reel', 'created_at']
+        read_only_fields = ['received', 'reel', 'created_at']
+
+    def validate_filename(self, value):
+        return os.path.basename(value)
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.REEL_UPLOAD_MAX_BYTES:
+            raise serializers.ValidationError(f"Size must be between 1 and {settings.REEL_UPLOAD_MAX_BYTES} bytes")
+        return value
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if value and not re.fullmatch(r'[0-9a-f]{64}', value):
+            raise serializers.ValidationError("Must be 64 hex digits")
+        return value
+
 class SavedReelSerializer(serializers.ModelSerializer):
     reel_details = ReelSerializer(source='reel', read_only=True)
     
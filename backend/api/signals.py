@@ -0,0 +1,106 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .authentication import invalidate_cached_user
+from .menus import invalidate_menus
+from .models import Category, Product, Promotion, Restaurant
+from .pricing import invalidate_prices
+from . import media
+from .promotions import invalidate_active_promotions
+from .suggest import catalog_changed
+
+
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+def promotion_changed(sender, **kwargs):
+    invalidate_active_promotions()
+
+
+@receiver(m2m_changed, sender=Promotion.products.through)
+@receiver(m2m_changed, sender=Promotion.restaurants.through)
+def promotion_targets_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_active_promotions()
+
+
+@receiver(pre_save, sender=Product)
+def product_saving(sender, instance, **kwargs):
+    # A product moved to another restaurant leaves the old menu stale too.
+    instance._restaurant_before = (
+        sender.objects.filter(pk=instance.pk).values_list('restaurant_id', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, **kwargs):
+    invalidate_prices([instance.pk])
+    invalidate_menus([instance.restaurant_id, getattr(instance, '_restaurant_before', None)])
+    catalog_changed()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    # Shared categories (no restaurant) appear on the menu of everyone using them.
+    restaurant_ids = set(Product.objects.filter(category=instance).values_list('restaurant_id', flat=True))
+    invalidate_menus(restaurant_ids | {instance.restaurant_id})
+    catalog_changed()
+
+
+@receiver(post_save, sender=Restaurant)
+def restaurant_changed(sender, instance, **kwargs):
+    # A restaurant-wide discount changes the price of everything it sells.
+    invalidate_prices(instance.products.values_list('id', flat=True))
+    invalidate_menus([instance.pk])
+    catalog_changed()
+
+
+@receiver(post_delete, sender=Restaurant)
+def restaurant_deleted(sender, instance, **kwargs):
+    invalidate_menus([instance.pk])
+    catalog_changed()
+
+
+@receiver(pre_save, sender=get_user_model())
+def user_saving(sender, instance, **kwargs):
+    # set_password() was called: the user cached under the old password goes too.
+    instance._password_before = None
+    if instance.pk is not None and getattr(instance, '_password', None) is not None:
+        instance._password_before = sender._base_manager.filter(pk=instance.pk).values_list('password', flat=True).first()
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def user_changed(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk, instance.password, getattr(instance, '_password_before', None))
+
+
+def media_pre_save(sender, instance, using, update_fields=None, **kwargs):
+    fields = {f.name for f in media.file_fields(sender)}
+    if update_fields is not None and not fields.intersection(update_fields):
+        instance._media_before = None
+        return
+    instance._media_before = media.stored_references(instance, using)
+
+
+def media_post_save(sender, instance, using, **kwargs):
+    before = getattr(instance, '_media_before', None)
+    if before is None:
+        return
+    after = media.instance_references(instance)
+    media.acquire(after - before, using)
+    media.release(before - after, using)
+    instance._media_before = None
+
+
+def media_post_delete(sender, instance, using, **kwargs):
+    media.release(media.instance_references(instance), using)
+
+
+for model in media.tracked_models():
+    pre_save.connect(media_pre_save, sender=model, dispatch_uid=f'media_pre_save_{model._meta.label}')
+    post_save.connect(media_post_save, sender=model, dispatch_uid=f'media_post_save_{model._meta.label}')
+    post_delete.connect(media_post_delete, sender=model, dispatch_uid=f'media_post_delete_{model._meta.label}')
@@ -0,0 +1,117 @@
+"""
+Content-addressed media storage.
+
+Uploads are hashed while they stream to a temporary file and then stored once
+under their SHA-256 digest, blobs/ab/cd/<digest>.<ext>, whatever upload_to or
+filename they arrived with. Uploading the same bytes again costs a hash and no
+disk, and a stored blob never changes, so its URL can be cached forever. Which
+rows use a blob is tracked by api.media, which every stored blob is claimed
+with first.
+"""
+import errno
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+PREFIX = 'blobs/'
+TMP_DIR = PREFIX + 'tmp'
+MAX_EXTENSION_LENGTH = 10
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(PREFIX)
+
+
+def blob_name(digest, extension):
+    return f'{PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    CHUNK_SIZE = 1024 * 1024
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content in _save and is never taken by other data.
+        return name
+
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1].lower()
+        if len(extension) > MAX_EXTENSION_LENGTH:
+            extension = ''
+        if hasattr(content, 'temporary_file_path'):
+            return self._save_file(content.temporary_file_path(), extension)
+
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        digest = hashlib.sha256()
+        tmp_path = self._write_tmp(content.chunks(), digest)
+        try:
+            return self._store(tmp_path, digest.hexdigest(), extension)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _save_file(self, source, extension):
+        """Already on disk (large multipart uploads, finished chunked uploads): hash in place, then move."""
+        digest = hashlib.sha256()
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return self._store(source, digest.hexdigest(), extension)
+
+    def _write_tmp(self, chunks, digest=None):
+        """Write `chunks` to a new file under TMP_DIR, on the same filesystem as the blobs."""
+        tmp_dir = self.path(TMP_DIR)
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    if digest is not None:
+                        digest.update(chunk)
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    def _store(self, source, digest, extension):
+        from .media import claim  # api.media imports this module
+
+        name = blob_name(digest, extension)
+        path = self.path(name)
+        # Before looking at the file, so prune can't delete it once we've decided to reuse it.
+        claim(name, os.path.getsize(source))
+        if os.path.exists(path):
+            os.remove(source)
+            return name
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(source, self.file_permissions_mode)
+        try:
+            # Atomic, and identical bytes if another upload of the same content won the race.
+            os.replace(source, path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # The source is on another filesystem (e.g. the upload volume). Copy it next
+            # to the blobs first, so a crash mid-copy never leaves a truncated file under
+            # the digest name for later uploads of the same content to reuse.
+            with open(source, 'rb') as f:
+                tmp_path = self._write_tmp(iter(lambda: f.read(self.CHUNK_SIZE), b''))
+            try:
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp_path, self.file_permissions_mode)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            os.remove(source)
+        return name
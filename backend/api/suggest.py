@@ -0,0 +1,221 @@
+"""
+Typeahead suggestions for the search box.
+
+Product, category and restaurant names are indexed as a sorted array of
+(term, key) pairs, one per word suffix of the name ("chicken burger" is found
+by "chi" and by "bur"), so a prefix lookup is a bisect plus a short scan.
+Matches are ranked by order popularity: units sold for a product, summed over
+its products for a category or restaurant. A prefix matching more than
+SCAN_LIMIT terms ("c", "ch") would be slow to rank per request, so the top
+results of every such prefix are kept precomputed; any other prefix scans at
+most SCAN_LIMIT terms.
+
+An index is an immutable snapshot, published to the cache under its own
+version with a small key naming the current version. Each worker keeps the
+snapshot it last loaded and re-reads only the version key every LOCAL_TTL
+seconds, fetching a snapshot only when the version moves. Only a shared cache
+(Redis, REDIS_URL) makes one build serve every worker; with the default
+LocMemCache each worker builds and holds its own copy.
+
+Snapshots are built off the request path: by refresh_suggestions (cron), and
+in a background thread after a catalog change commits (api.signals). A catalog
+change is not applied to the snapshot entry by entry: the thread re-reads
+every name from the database and builds a new snapshot, reusing only the
+current one's popularity. When the snapshot expires (SUGGEST_INDEX_TTL) the
+next lookup schedules a full rebuild, popularity included, and keeps answering
+from the old one meanwhile; suggest() itself never builds.
+"""
+import heapq
+import logging
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'suggest:version'
+INDEX_KEY = 'suggest:index:{}'
+# Held while a full rebuild runs, so an expired snapshot is rebuilt by one worker
+BUILD_LOCK_KEY = 'suggest:building'
+LOCAL_TTL = 5
+SCAN_LIMIT = 200
+HEAD_SIZE = 20
+
+# (version, index) this worker answers from, and when the version key was last read
+_local = {'current': (None, None), 'checked_at': 0.0}
+_rebuild = {'lock': threading.Lock(), 'running': False, 'pending': None}
+WORD = re.compile(r'\w+')
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).casefold().strip()
+
+
+def terms(name):
+    """The name from each word onwards: 'Chicken Burger' -> ['chicken burger', 'burger']."""
+    name = normalize(name)
+    return [name[m.start():] for m in WORD.finditer(name)]
+
+
+class SuggestionIndex:
+    """Built once by build_index() and never modified afterwards."""
+
+    def __init__(self, built_at=None, sold=None):
+        self.entries = {}  # 'product:5' -> {'type', 'id', 'name', 'weight'}
+        self.terms = []    # sorted (term, key)
+        self.heads = {}    # heavy prefix -> keys, best first
+        self.built_at = built_at
+        self.sold = sold or {}  # product id -> units sold, reused by catalog rebuilds
+
+    def _rank(self, key):
+        entry = self.entries[key]
+        return (-entry['weight'], entry['name'], key)
+
+    def _range(self, prefix):
+        return bisect_left(self.terms, (prefix,)), bisect_left(self.terms, (prefix + '\U0010ffff',))
+
+    def _top(self, lo, hi, limit):
+        return heapq.nsmallest(limit, {key for _, key in self.terms[lo:hi]}, key=self._rank)
+
+    def _build_heads(self):
+        self.heads = {}
+        pending = {term[:1] for term, _ in self.terms}
+        while pending:
+            prefix = pending.pop()
+            lo, hi = self._range(prefix)
+            if hi - lo > SCAN_LIMIT:
+                self.heads[prefix] = self._top(lo, hi, HEAD_SIZE)
+                pending.update(term[:len(prefix) + 1] for term, _ in self.terms[lo:hi] if len(term) > len(prefix))
+
+    def search(self, query, limit):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        if prefix in self.heads and limit <= HEAD_SIZE:
+            keys = self.heads[prefix][:limit]
+        else:
+            keys = self._top(*self._range(prefix), limit)
+        return [{k: v for k, v in self.entries[key].items() if k != 'weight'} for key in keys]
+
+
+def popularity():
+    from .models import OrderItem
+    return dict(OrderItem.objects.values('product_id').annotate(n=Sum('quantity')).values_list('product_id', 'n'))
+
+
+def build_index(sold=None):
+    """A new snapshot of the catalog, ranked by `sold` (queried when not given)."""
+    from .models import Category, Product, Restaurant
+
+    built_at = timezone.now()
+    if sold is None:
+        sold = popularity()
+    category_weight, restaurant_weight = {}, {}
+    index = SuggestionIndex(built_at=built_at, sold=sold)
+    for pk, name, category_id, restaurant_id in Product.objects.values_list('id', 'name', 'category_id', 'restaurant_id'):
+        weight = sold.get(pk, 0)
+        category_weight[category_id] = category_weight.get(category_id, 0) + weight
+        restaurant_weight[restaurant_id] = restaurant_weight.get(restaurant_id, 0) + weight
+        index.entries[f'product:{pk}'] = {'type': 'product', 'id': pk, 'name': name, 'weight': weight}
+    for pk, name in Category.objects.values_list('id', 'name'):
+        index.entries[f'category:{pk}'] = {'type': 'category', 'id': pk, 'name': name, 'weight': category_weight.get(pk, 0)}
+    for pk, name in Restaurant.objects.values_list('id', 'name'):
+        index.entries[f'restaurant:{pk}'] = {'type': 'restaurant', 'id': pk, 'name': name, 'weight': restaurant_weight.get(pk, 0)}
+
+    index.terms = sorted((term, key) for key, entry in index.entries.items() for term in terms(entry['name']))
+    index._build_heads()
+    return index
+
+
+def publish(index):
+    """Make `index` the current snapshot unless one built later is already published."""
+    version = int(index.built_at.timestamp() * 1_000_000)
+    current = cache.get(VERSION_KEY)
+    if current is not None and current > version:
+        return False
+    cache.set(INDEX_KEY.format(version), index, settings.SUGGEST_INDEX_TTL)
+    cache.set(VERSION_KEY, version, settings.SUGGEST_INDEX_TTL)
+    if current is not None and current != version:
+        # Workers still on it keep their loaded copy until they see the new version.
+        cache.delete(INDEX_KEY.format(current))
+    _local['current'] = (version, index)
+    return True
+
+
+def refresh_index():
+    index = build_index()
+    publish(index)
+    return index
+
+
+def _rebuild_loop(full):
+    try:
+        while True:
+            try:
+                if not full:
+                    publish(build_index(_local['current'][1].sold if _local['current'][1] else None))
+                elif cache.add(BUILD_LOCK_KEY, 1, 300):
+                    try:
+                        refresh_index()
+                    finally:
+                        cache.delete(BUILD_LOCK_KEY)
+            except Exception:
+                logger.exception('Rebuilding the search suggestion index failed')
+            with _rebuild['lock']:
+                if _rebuild['pending'] is None:
+                    _rebuild['running'] = False
+                    return
+                full, _rebuild['pending'] = _rebuild['pending'], None
+    finally:
+        connections.close_all()  # this thread's connections only
+
+
+def schedule_rebuild(full=False):
+    """
+    Build and publish a new snapshot in a background thread. Requests arriving
+    while one runs are folded into a single further pass. `full` also re-reads
+    order popularity.
+    """
+    with _rebuild['lock']:
+        if _rebuild['running']:
+            _rebuild['pending'] = full or bool(_rebuild['pending'])
+            return
+        _rebuild['running'] = True
+    threading.Thread(target=_rebuild_loop, args=(full,), name='suggest-rebuild', daemon=True).start()
+
+
+def get_index():
+    """The snapshot this worker answers from; None until one has been built."""
+    version, index = _local['current']
+    now = time.monotonic()
+    if now - _local['checked_at'] < LOCAL_TTL:
+        return index
+    _local['checked_at'] = now
+    latest = cache.get(VERSION_KEY)
+    if latest is None:
+        schedule_rebuild(full=True)
+    elif latest != version:
+        loaded = cache.get(INDEX_KEY.format(latest))
+        if loaded is not None:
+            _local['current'] = (latest, loaded)
+            index = loaded
+    return index
+
+
+def suggest(query, limit=8):
+    index = get_index()
+    return index.search(query, limit) if index is not None else []
+
+
+def catalog_changed():
+    """A product, category or restaurant changed: rebuild the names once the change is committed."""
+    transaction.on_commit(schedule_rebuild)
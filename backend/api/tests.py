@@ -1,3 +1,1754 @@
-from django.test import TestCase
+import contextvars
+import gzip
+import hashlib
+import importlib.util
+import json
+import math
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+import zoneinfo
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import msgpack
+import numpy as np
+import requests
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import transaction
+from django.http.request import UnreadablePostError
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from matrix_backend import frontend, startup
+
+from . import (
+    archive, async_views, engagement, geo, ingest, media, metrics, pricing, profiling, promotions, recommendations, suggest,
+    trending, uploads,
+)
+from .authentication import CachedJWTAuthentication
+from .idempotency import request_hash
+from .middleware import ReplicaPinMiddleware
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, Category, IdempotencyKey, MediaBlob, Order, OrderItem, Product, Promotion, Reel,
+    ReelEngagement, ReelEvent, ReelUpload, RelatedProduct, Restaurant, RollupCursor, SavedReel, TrendingCounter,
+)
+from .pricing import UnknownProducts, quote
+from .renderers import FastJSONRenderer, MessagePackRenderer
+from .routers import ReadReplicaRouter
+from .serializers import CreateOrderSerializer, ProductSerializer, ReelSerializer, RestaurantSerializer
+from .throttling import ScopedSlidingWindowThrottle, parse_rate
+
+
+def offset(lat, lng, distance_km, bearing):
+    """A point roughly distance_km from (lat, lng) in the direction `bearing` (radians)."""
+    dlat = distance_km * math.cos(bearing) / 110.574
+    dlng = distance_km * math.sin(bearing) / (111.320 * math.cos(math.radians(lat)))
+    return lat + dlat, lng + dlng
+
+
+class PromotionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        promotions.invalidate_active_promotions()
+        self.now = timezone.now()
+        self.restaurant = Restaurant.objects.create(name='Mama', whatsapp_number='1', location='x')
+        self.product = Product.objects.create(name='Pilau', description='', price=Decimal('200.00'), category=Category.objects.create(name='Mains'))
+
+    def promotion(self, starts_in, ends_in, discount='10', products=(), restaurants=(), **fields):
+        promotion = Promotion.objects.create(
+            name='promo', starts_at=self.now + timedelta(hours=starts_in), ends_at=self.now + timedelta(hours=ends_in),
+            discount_percentage=Decimal(discount), **fields,
+        )
+        promotion.products.set(products)
+        promotion.restaurants.set(restaurants)
+        return promotion
+
+    def test_only_open_windows_are_active(self):
+        self.promotion(-1, 1, '10', products=[self.product], mark_hot=True)
+        self.promotion(-1, 1, '25', products=[self.product])
+        self.promotion(-1, 1, '15', restaurants=[self.restaurant], feature_campaign=True)
+        self.promotion(1, 2, '50', products=[self.product])
+        self.promotion(-2, -1, '50', restaurants=[self.restaurant])
+
+        snapshot = promotions.build_active_promotions(self.now)
+
+        self.assertEqual(snapshot.product_discounts, {self.product.id: Decimal('25')})
+        self.assertEqual(snapshot.restaurant_discounts, {self.restaurant.id: Decimal('15')})
+        self.assertEqual(snapshot.hot_product_ids, {self.product.id})
+        self.assertEqual(snapshot.featured_restaurant_ids, {self.restaurant.id})
+
+    def test_snapshot_expires_at_the_next_boundary(self):
+        self.promotion(-1, 3, products=[self.product])
+        upcoming = self.promotion(2, 4, products=[self.product])
+        self.assertEqual(promotions.build_active_promotions(self.now).valid_until, upcoming.starts_at)
+
+        Promotion.objects.all().delete()
+        empty = promotions.build_active_promotions(self.now)
+        self.assertEqual(empty.valid_until, self.now + timedelta(seconds=promotions.MAX_SNAPSHOT_AGE))
+
+    def test_stale_snapshot_is_rebuilt(self):
+        promotion = self.promotion(-1, 1, products=[self.product])
+        snapshot = promotions.get_active_promotions()
+        self.assertIn(self.product.id, snapshot.product_discounts)
+        self.assertTrue(snapshot.is_stale(promotion.ends_at))
+
+        # The window has since closed, so the published snapshot is past its valid_until.
+        Promotion.objects.filter(pk=promotion.pk).update(ends_at=self.now)
+        cache.set(promotions.CACHE_KEY, promotions.build_active_promotions(self.now - timedelta(minutes=1)))
+        promotions._local['checked_at'] = 0.0
+        self.assertNotIn(self.product.id, promotions.get_active_promotions().product_discounts)
+
+    def test_saving_a_promotion_applies_it_immediately(self):
+        self.assertEqual(promotions.get_active_promotions().product_discounts, {})
+        self.promotion(-1, 1, '20', products=[self.product])
+
+        self.assertEqual(Product.objects.get(pk=self.product.pk).discounted_price, Decimal('160.00'))
+        self.addCleanup(trending.flush_views)  # the detail view counts a view
+        product = APIClient().get(f'/api/products/{self.product.id}/').json()
+        self.assertEqual((product['discount_percentage'], product['is_promoted']), (20, True))
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        self.store = metrics.MetricsStore(self.directory, flush_interval=math.inf)
+
+    def write_worker(self, pid, requests):
+        """Leave the snapshot another worker would have written after `requests` GETs of product-list."""
+        store = metrics.MetricsStore(self.directory, flush_interval=math.inf)
+        for _ in range(requests):
+            store.record('product-list', 'GET', 200, 0.03, 2, 0.004, 300)
+        with open(os.path.join(self.directory, f'worker-{pid}.json'), 'w') as f:
+            json.dump(store.snapshot(), f)
+
+    def total(self):
+        counters, _ = self.store.collect()
+        return counters.get(('http_requests_total', ('product-list', 'GET', '200')), 0)
+
+    def test_exposition_format(self):
+        self.store.record('product-list', 'GET', 200, 0.03, 3, 0.002, 500)
+        self.store.record('product-list', 'GET', 200, 0.2, 3, 0.002, 500)
+        self.store.record('a"b', 'GET', 404, 0.001, None, None, None)
+
+        lines = metrics.render(*self.store.collect()).splitlines()
+
+        self.assertIn('# TYPE http_requests_total counter', lines)
+        self.assertIn('http_requests_total{route="product-list",method="GET",status="200"} 2', lines)
+        self.assertIn('http_requests_total{route="a\\"b",method="GET",status="404"} 1', lines)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', lines)
+        prefix = 'http_request_duration_seconds_bucket{route="product-list",method="GET",'
+        self.assertIn(prefix + 'le="0.025"} 0', lines)
+        self.assertIn(prefix + 'le="0.05"} 1', lines)
+        self.assertIn(prefix + 'le="0.25"} 2', lines)
+        self.assertIn(prefix + 'le="+Inf"} 2', lines)
+        self.assertIn('http_request_duration_seconds_count{route="product-list",method="GET"} 2', lines)
+        self.assertIn('http_request_db_queries_sum{route="product-list"} 6', lines)
+        self.assertFalse([line for line in lines if line.startswith('http_request_db_queries') and 'a\\"b' in line])
+
+    def test_scrape_sums_every_worker(self):
+        self.write_worker(1001, 2)
+        self.write_worker(1002, 3)
+        self.store.record('product-list', 'GET', 200, 0.03, 2, 0.004, 300)
+        self.assertEqual(self.total(), 6)
+        _, histograms = self.store.collect()
+        self.assertEqual(histograms[('http_request_db_queries', ('product-list',))][-1], 6)
+
+    def test_exited_workers_are_counted_once(self):
+        self.write_worker(1001, 2)
+        self.write_worker(1002, 3)
+        metrics.retire_worker(self.directory, 1001)
+        metrics.retire_worker(self.directory, 1001)
+
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'worker-1001.json')))
+        self.assertEqual(self.total(), 5)
+        # A new worker that gets the same pid starts from zero.
+        self.write_worker(1001, 1)
+        self.assertEqual(self.total(), 6)
+        metrics.retire_worker(self.directory, 1002)
+        self.assertEqual(self.total(), 6)
+
+    def test_reset_forgets_the_previous_run(self):
+        self.write_worker(1001, 2)
+        metrics.retire_worker(self.directory, 1001)
+        metrics.reset(self.directory)
+        self.assertEqual(self.total(), 0)
+
+    def test_requests_are_labelled_by_route_name(self):
+        key = ('http_requests_total', ('product-list', 'GET', '200'))
+        before = metrics.get_store().counters.get(key, 0)
+        APIClient().get('/api/products/')
+        self.assertEqual(metrics.get_store().counters.get(key, 0), before + 1)
+
+    def test_scrapes_need_the_token(self):
+        client = APIClient()
+        with override_settings(METRICS_TOKEN='s3cret', DEBUG=False):
+            self.assertEqual(client.get('/metrics').status_code, 403)
+            self.assertEqual(client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            response = client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+            self.assertIn(b'# TYPE http_requests_total counter', response.content)
+        with override_settings(METRICS_TOKEN=None, DEBUG=False):
+            self.assertEqual(client.get('/metrics').status_code, 403)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(PROFILING_DIR=tmp.name, PROFILING_SAMPLE_RATE=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.staff = User.objects.create_user(username='staff', password='x', is_staff=True)
+        self.customer = User.objects.create_user(username='customer', password='x')
+        category = Category.objects.create(name='Mains')
+        Product.objects.bulk_create([Product(name=f'p{i}', description='', price=1, category=category) for i in range(3)])
+
+    def get(self, user=None, **headers):
+        # A bearer token, as the apps send it: the middleware runs before DRF authenticates the view.
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {AccessToken.for_user(user)}'
+        return APIClient().get('/api/products/', **headers)
+
+    def test_staff_gets_a_stored_profile(self):
+        response = self.get(self.staff, HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        profile = client.get(f"/api/profiles/{response['X-Profile-Id']}/").json()
+        self.assertEqual((profile['method'], profile['path'], profile['status']), ('GET', '/api/products/', 200))
+        self.assertEqual(profile['query_count'], len(profile['queries']))
+        self.assertGreater(profile['query_count'], 0)
+        self.assertIn('cumulative', profile['profile'])
+        self.assertEqual([p['id'] for p in client.get('/api/profiles/').json()], [profile['id']])
+
+    def test_inline_profile_replaces_the_response(self):
+        profile = self.get(self.staff, HTTP_X_PROFILE='inline').json()
+        self.assertEqual(profile['status'], 200)
+        self.assertIn('duplicate_queries', profile)
+
+    def test_only_staff_can_ask_for_a_profile(self):
+        for user in (None, self.customer):
+            response = self.get(user, HTTP_X_PROFILE='inline')
+            self.assertEqual(len(response.json()), 3)
+            self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertEqual(profiling.recent_profiles(), [])
+
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        self.assertEqual(client.get('/api/profiles/').status_code, 403)
+
+    def test_sampled_requests_are_profiled_quietly(self):
+        with override_settings(PROFILING_SAMPLE_RATE=1):
+            response = self.get()
+        self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertEqual(len(profiling.recent_profiles()), 1)
+
+    def test_repeated_queries_are_grouped(self):
+        profiler = profiling.RequestProfiler(RequestFactory().get('/'))
+        profiler.queries = [
+            {'sql': 'SELECT 1', 'duration_ms': 1.0}, {'sql': 'SELECT 2', 'duration_ms': 1.0}, {'sql': 'SELECT 1', 'duration_ms': 2.5},
+        ]
+        self.assertEqual(profiler.duplicates(), [{'sql': 'SELECT 1', 'count': 2, 'total_ms': 3.5}])
+
+
+class AsyncCatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(trending.flush_views)  # detail views count a view
+        self.restaurant = Restaurant.objects.create(name='Mama', whatsapp_number='1', location='x', discount_percentage=Decimal('10'))
+        category = Category.objects.create(name='Mains')
+        self.product = Product.objects.create(
+            name='Pilau', description='', price=Decimal('250.00'), category=category, restaurant=self.restaurant, shipping_fee=Decimal('20.00'),
+        )
+        Product.objects.create(name='Chai', description='', price=Decimal('30.00'), category=category, is_hot=True)
+        self.reel = Reel.objects.create(product=self.product, restaurant=self.restaurant, video='reels/clip.mp4')
+        Reel.objects.create(product=self.product, video='reels/other.mp4', is_highlight=True)
+        self.user = User.objects.create_user(username='buyer', password='x')
+        SavedReel.objects.create(user=self.user, reel=self.reel)
+
+    def compare(self, view, path, *args, headers=None):
+        """Serve `path` from the async view and the DRF viewset; returns both responses once they agree."""
+        response = async_to_sync(view)(AsyncRequestFactory().get(path, headers=headers), *args)
+        expected = APIClient().get(path, headers=headers)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(json.loads(response.content), expected.json())
+        return response, expected
+
+    def test_lists_match_the_viewsets(self):
+        self.compare(async_views.product_list, '/api/products/')
+        self.compare(async_views.product_list, f'/api/products/?restaurant={self.restaurant.id}')
+        self.compare(async_views.product_list, '/api/products/?hot=1')
+        self.compare(async_views.restaurant_list, '/api/restaurants/')
+        self.compare(async_views.reel_list, '/api/reels/')
+
+    def test_details_match_the_viewsets(self):
+        self.compare(async_views.product_detail, f'/api/products/{self.product.id}/', self.product.id)
+        self.compare(async_views.restaurant_detail, f'/api/restaurants/{self.restaurant.id}/', self.restaurant.id)
+        self.compare(async_views.reel_detail, f'/api/reels/{self.reel.id}/', self.reel.id)
+        self.compare(async_views.product_detail, '/api/products/999999/', 999999)
+
+    def test_saved_reels_follow_the_token(self):
+        token = f'Bearer {AccessToken.for_user(self.user)}'
+        response, _ = self.compare(async_views.reel_list, '/api/reels/', headers={'Authorization': token})
+        self.assertEqual([r['is_saved'] for r in json.loads(response.content)], [False, True])
+
+    def test_bad_token_is_refused_like_the_viewsets(self):
+        response, expected = self.compare(async_views.product_list, '/api/products/', headers={'Authorization': 'Bearer not-a-token'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], expected['WWW-Authenticate'])
+
+    def test_other_authentication_errors_are_not_swallowed(self):
+        with mock.patch.object(CachedJWTAuthentication, 'authenticate', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                async_to_sync(async_views.reel_list)(AsyncRequestFactory().get('/api/reels/'))
+
+
+@override_settings(REPLICA_DATABASES=['replica_0', 'replica_1'])
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReadReplicaRouter()
+
+    def reads(self, model=Product):
+        return self.router.db_for_read(model)
+
+    def serve(self, method, view):
+        """Run `view` as the body of a request through ReplicaPinMiddleware; returns what it returned."""
+        seen = []
+        middleware = ReplicaPinMiddleware(lambda request: seen.append(view()))
+        middleware(RequestFactory().generic(method, '/'))
+        return seen[0]
+
+    def test_reads_of_a_request_stay_on_one_replica(self):
+        aliases = self.serve('GET', lambda: {self.reads(Product), self.reads(Reel), self.reads(Restaurant)})
+        self.assertEqual(len(aliases), 1)
+        self.assertIn(aliases.pop(), ['replica_0', 'replica_1'])
+
+    def test_write_pins_later_reads_to_the_primary(self):
+        def view():
+            before = self.reads()
+            self.assertEqual(self.router.db_for_write(Product), 'default')
+            return before, self.reads(), self.reads(Reel)
+
+        before, *after = self.serve('GET', view)
+        self.assertIn(before, ['replica_0', 'replica_1'])
+        self.assertEqual(after, ['default', 'default'])
+        # The pin ends with the request.
+        self.assertIn(self.serve('GET', self.reads), ['replica_0', 'replica_1'])
+
+    def test_unsafe_requests_read_from_the_primary(self):
+        for method in ('POST', 'PUT', 'PATCH', 'DELETE'):
+            self.assertEqual(self.serve(method, self.reads), 'default')
+
+    def test_other_models_always_use_the_primary(self):
+        self.assertEqual(self.serve('GET', lambda: self.reads(Order)), 'default')
+
+    def test_without_a_request_reads_fall_back_to_a_replica(self):
+        # A fresh context, as in a management command or thread that hasn't written yet.
+        alias = contextvars.Context().run(self.reads)
+        self.assertIn(alias, ['replica_0', 'replica_1'])
+        with override_settings(REPLICA_DATABASES=[]):
+            self.assertEqual(contextvars.Context().run(self.reads), 'default')
+
+
+class CachedUserTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='x')
+
+    def get(self, path, token=None):
+        token = token or AccessToken.for_user(self.user)
+        return APIClient().get(path, headers={'Authorization': f'Bearer {token}'})
+
+    def test_user_is_served_from_cache(self):
+        self.assertEqual(self.get('/api/auth/profile/').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get('/api/auth/profile/').json()['username'], 'buyer')
+
+    def test_deactivation_applies_to_the_next_request(self):
+        token = AccessToken.for_user(self.user)
+        self.assertEqual(self.get('/api/auth/profile/', token).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get('/api/auth/profile/', token).status_code, 401)
+
+    def test_staff_changes_apply_to_the_next_request(self):
+        self.assertEqual(self.get('/api/users/').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.get('/api/users/').status_code, 200)
+        self.user.is_staff = False
+        self.user.save(update_fields=['is_staff'])
+        self.assertEqual(self.get('/api/users/').status_code, 403)
+
+    def test_password_change_revokes_tokens_on_the_next_request(self):
+        with mock.patch.object(jwt_settings, 'CHECK_REVOKE_TOKEN', True):
+            old_token = AccessToken.for_user(self.user)
+            self.assertEqual(self.get('/api/auth/profile/', old_token).status_code, 200)
+
+            self.user.set_password('y')
+            self.user.save()
+
+            self.assertEqual(self.get('/api/auth/profile/', old_token).status_code, 401)
+            self.assertEqual(self.get('/api/auth/profile/', AccessToken.for_user(self.user)).status_code, 200)
+
+    def test_deleted_user_is_refused(self):
+        self.assertEqual(self.get('/api/auth/profile/').status_code, 200)
+        token = AccessToken.for_user(self.user)
+        self.user.delete()
+        self.assertEqual(self.get('/api/auth/profile/', token).status_code, 401)
+
+
+class SlidingWindowThrottleTests(TestCase):
+    RATES = {'order_create': '10/min', 'order_create_anon': '2/min'}
+
+    def setUp(self):
+        cache.clear()
+        self.view = SimpleNamespace(throttle_scope='order_create')
+        self.user = SimpleNamespace(is_authenticated=True, pk=1)
+
+    def hits(self, at, count, user=None):
+        """Send `count` requests at time `at`; returns how many were allowed and the last throttle."""
+        allowed, throttle = 0, None
+        for _ in range(count):
+            throttle = ScopedSlidingWindowThrottle()
+            throttle.timer = lambda: at
+            throttle.get_rate = lambda scope, request: self.RATES[scope if request.user.is_authenticated else f'{scope}_anon']
+            request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+            request.user = user or self.user
+            allowed += throttle.allow_request(request, self.view)
+        return allowed, throttle
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('10/min'), (10, 60))
+        self.assertEqual(parse_rate('5/s'), (5, 1))
+        self.assertEqual(parse_rate('100/day'), (100, 86400))
+
+    def test_limit_within_one_window(self):
+        allowed, throttle = self.hits(at=6000.0, count=11)
+        self.assertEqual(allowed, 10)
+        self.assertAlmostEqual(throttle.wait(), 60.0)
+
+    def test_previous_window_is_weighted_by_its_overlap(self):
+        self.hits(at=6000.0, count=10)
+        # Halfway through the next window the previous one still counts for 5.
+        allowed, throttle = self.hits(at=6090.0, count=6)
+        self.assertEqual(allowed, 5)
+        # The denied request counted too, so a retry is 7th: 10 * (1 - elapsed) + 7 <= 10
+        # once elapsed reaches 0.7, i.e. 12 seconds later.
+        self.assertAlmostEqual(throttle.wait(), 12.0)
+        allowed, _ = self.hits(at=6090.0 + throttle.wait() + 0.5, count=1)
+        self.assertEqual(allowed, 1)
+
+    def test_windows_older_than_the_previous_one_are_forgotten(self):
+        self.hits(at=6000.0, count=10)
+        allowed, _ = self.hits(at=6120.0, count=10)
+        self.assertEqual(allowed, 10)
+
+    def test_cache_calls_per_request_without_redis(self):
+        backend, calls = caches['default'], []
+
+        def spy(name):
+            real = getattr(backend, name)
+
+            def call(*args, **kwargs):
+                calls.append(name)
+                return real(*args, **kwargs)
+            return mock.patch.object(backend, name, call)
+
+        with spy('add'), spy('get'), spy('incr'), spy('set'):
+            self.hits(at=6000.0, count=1)
+            self.assertEqual(calls, ['incr', 'add', 'get'])
+            calls.clear()
+            self.hits(at=6001.0, count=1)
+            self.assertEqual(calls, ['incr', 'get'])
+
+    def test_users_and_anonymous_clients_are_counted_separately(self):
+        self.hits(at=6000.0, count=10)
+        anonymous = SimpleNamespace(is_authenticated=False, pk=None)
+        allowed, _ = self.hits(at=6000.0, count=3, user=anonymous)
+        self.assertEqual(allowed, 2)
+        allowed, _ = self.hits(at=6000.0, count=1, user=SimpleNamespace(is_authenticated=True, pk=2))
+        self.assertEqual(allowed, 1)
+
+
+class GeohashTests(TestCase):
+    def test_encode_matches_reference(self):
+        self.assertEqual(geo.encode(57.64911, 10.40744), 'u4pruydqq')
+        self.assertEqual(geo.encode(-1.2921, 36.8219, precision=5), 'kzf0t')
+
+    def test_cells_cover_the_radius(self):
+        for radius_km in (0.5, 2, 5, 20):
+            precision = geo.precision_for_radius(radius_km, -1.29)
+            lat_deg, lng_deg = geo.cell_size_degrees(precision)
+            self.assertGreaterEqual(lat_deg * 110.574, radius_km)
+            self.assertGreaterEqual(lng_deg * 111.320 * math.cos(math.radians(-1.29)), radius_km)
+
+    def test_neighbourhood_contains_every_point_in_the_radius(self):
+        rng = random.Random(7)
+        for _ in range(300):
+            lat, lng = rng.uniform(-60, 60), rng.uniform(-179, 179)
+            radius_km = rng.choice((0.5, 1, 3, 10))
+            precision = geo.precision_for_radius(radius_km, lat)
+            cells = set(geo.neighbourhood(lat, lng, precision))
+            self.assertLessEqual(len(cells), 9)
+            for _ in range(8):
+                point = offset(lat, lng, rng.uniform(0, radius_km), rng.uniform(0, 2 * math.pi))
+                if geo.haversine_km(lat, lng, *point) <= radius_km:
+                    self.assertIn(geo.encode(*point, precision), cells)
+
+    def test_neighbourhood_wraps_the_antimeridian(self):
+        cells = geo.neighbourhood(0.0, 179.999, 5)
+        self.assertIn(geo.encode(0.0, -179.999, 5), cells)
+
+    def test_nearby_filters_and_sorts_by_distance(self):
+        lat, lng = -1.2921, 36.8219
+        far = Restaurant.objects.create(name='far', whatsapp_number='1', location='x', latitude=lat + 0.5, longitude=lng)
+        near = Restaurant.objects.create(name='near', whatsapp_number='1', location='x', latitude=lat + 0.01, longitude=lng)
+        nearest = Restaurant.objects.create(name='nearest', whatsapp_number='1', location='x', latitude=lat, longitude=lng + 0.001)
+        Restaurant.objects.create(name='unplaced', whatsapp_number='1', location='x')
+
+        results = geo.nearby(Restaurant.objects.all(), lat, lng, radius_km=5)
+
+        self.assertEqual([r.id for r in results], [nearest.id, near.id])
+        self.assertNotIn(far.id, [r.id for r in results])
+        self.assertAlmostEqual(results[1].distance_km, 1.112, places=3)
+
+
+class PricingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.restaurant = Restaurant.objects.create(name='Mama', whatsapp_number='1', location='x', discount_percentage=Decimal('20'))
+        category = Category.objects.create(name='Mains')
+        self.discounted = Product.objects.create(
+            name='Biryani', description='', price=Decimal('100.00'), category=category, restaurant=self.restaurant,
+            is_promoted=True, discount_percentage=10, shipping_fee=Decimal('50.00'),
+        )
+        self.plain = Product.objects.create(name='Chai', description='', price=Decimal('30.00'), category=category)
+
+    def test_totals(self):
+        cart = quote([{'id': self.discounted.id, 'quantity': 2}, {'id': self.plain.id, 'quantity': 3}], 'Westlands')
+        # The restaurant's 20% beats the product's own 10%; delivery is charged once per order.
+        self.assertEqual(cart['items'][0]['discounted_price'], Decimal('80.00'))
+        self.assertEqual(cart['subtotal'], Decimal('250.00'))
+        self.assertEqual(cart['delivery_fee'], Decimal('500.00'))
+        self.assertEqual(cart['total'], Decimal('750.00'))
+
+    def test_shipping_fees_are_shown_but_not_charged(self):
+        cart = quote([{'id': self.discounted.id, 'quantity': 3}], 'Pickup')
+        self.assertEqual(cart['items'][0]['shipping_fee'], Decimal('50.00'))
+        self.assertEqual(cart['total'], Decimal('240.00'))
+
+    def test_pickup_has_no_delivery_fee(self):
+        for address in ('Pickup', ' Pickup ', '', '   ', None):
+            self.assertEqual(quote([{'id': self.plain.id, 'quantity': 1}], address)['total'], Decimal('30.00'))
+        self.assertEqual(quote([{'id': self.plain.id, 'quantity': 1}], ' Westlands ')['total'], Decimal('530.00'))
+
+    def test_unknown_products(self):
+        with self.assertRaises(UnknownProducts) as raised:
+            quote([{'id': self.plain.id, 'quantity': 1}, {'id': 999999, 'quantity': 1}])
+        self.assertEqual(raised.exception.ids, [999999])
+
+    def test_saved_prices_are_not_served_from_cache(self):
+        quote([{'id': self.plain.id, 'quantity': 1}])
+        self.plain.price = Decimal('35.00')
+        self.plain.save()
+        self.assertEqual(quote([{'id': self.plain.id, 'quantity': 1}])['total'], Decimal('35.00'))
+
+    def test_quote_amounts_are_decimal_strings(self):
+        body = {'items': [{'id': self.discounted.id, 'quantity': 2}], 'delivery_address': 'Westlands'}
+        data = APIClient().post('/api/cart/quote/', body, format='json').json()
+        self.assertEqual(
+            (data['subtotal'], data['delivery_fee'], data['total']), ('160.00', '500.00', '660.00'),
+        )
+        line = data['items'][0]
+        self.assertEqual(
+            (line['unit_price'], line['discount_percentage'], line['discounted_price'], line['shipping_fee'], line['line_total']),
+            ('100.00', '20.00', '80.00', '50.00', '160.00'),
+        )
+        # The same format as the product endpoints.
+        self.addCleanup(trending.flush_views)
+        self.assertEqual(line['unit_price'], APIClient().get(f'/api/products/{self.discounted.id}/').json()['price'])
+
+    def test_order_is_charged_the_quoted_total(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='buyer', password='x'))
+        body = {
+            'items': [{'id': self.discounted.id, 'quantity': 2}, {'id': self.plain.id, 'quantity': 1}],
+            'delivery_address': '  Westlands ', 'payment_method': 'whatsapp',
+        }
+
+        quoted = client.post('/api/cart/quote/', body, format='json')
+        self.assertEqual(quoted.status_code, 200)
+        # 2 x 80 + 30, plus delivery; the 50 shipping fee is not charged.
+        self.assertEqual(quoted.json()['total'], '690.00')
+
+        stale = client.post('/api/orders/', {**body, 'total_amount': '650.00'}, format='json')
+        self.assertEqual(stale.status_code, 400)
+        self.assertIn('690.00', stale.json()['total_amount'][0])
+        self.assertFalse(Order.objects.exists())
+
+        placed = client.post('/api/orders/', {**body, 'total_amount': quoted.json()['total']}, format='json')
+        self.assertEqual(placed.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual(order.total_amount, Decimal('690.00'))
+        self.assertEqual(sorted(order.items.values_list('quantity', 'price')), [(1, Decimal('30.00')), (2, Decimal('80.00'))])
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        product = Product.objects.create(name='Pilau', description='', price=Decimal('250.00'), category=Category.objects.create(name='Mains'))
+        self.body = {'items': [{'id': product.id, 'quantity': 1}], 'delivery_address': 'Pickup', 'payment_method': 'whatsapp'}
+
+    def post(self, key, body=None):
+        return self.client.post('/api/orders/', body or self.body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_first_response(self):
+        first = self.post('k1')
+        retry = self.post('k1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_with_another_body_is_rejected(self):
+        self.post('k1')
+        response = self.post('k1', {**self.body, 'delivery_address': 'Home'})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_request_in_flight_gets_409(self):
+        IdempotencyKey.objects.create(
+            user=self.user, key='k1', request_hash=request_hash(self.body),
+            locked_until=timezone.now() + timedelta(seconds=30),
+        )
+        self.assertEqual(self.post('k1').status_code, 409)
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_abandoned_request_is_taken_over_after_its_lease(self):
+        IdempotencyKey.objects.create(
+            user=self.user, key='k1', request_hash=request_hash(self.body),
+            locked_until=timezone.now() - timedelta(seconds=1),
+        )
+        response = self.post('k1')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get(key='k1').response_status, 201)
+
+    def test_failed_request_releases_its_key(self):
+        response = self.post('k1', {**self.body, 'items': [{'id': 999999, 'quantity': 1}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.post('k1').status_code, 201)
+
+    def test_payment_prompt_waits_for_the_stored_response(self):
+        stored = []
+        service = mock.Mock()
+        service.return_value.trigger_stk_push.side_effect = lambda **kwargs: stored.append(
+            IdempotencyKey.objects.get(key='k1').response_status
+        )
+        body = {**self.body, 'payment_method': 'mpesa', 'phone_number': '254700000000'}
+
+        with mock.patch('api.utils.IntaSendService', service):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.post('k1', body)
+                service.return_value.trigger_stk_push.assert_not_called()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.post('k1', body)
+
+        self.assertEqual(stored, [201])
+        service.return_value.trigger_stk_push.assert_called_once_with(
+            phone_number='254700000000', amount=250.0, narrative=f"Order {response.json()['id']}",
+        )
+
+    def test_no_payment_prompt_when_the_lease_is_lost(self):
+        create = CreateOrderSerializer.create
+
+        def taken_over(serializer, validated_data):
+            order = create(serializer, validated_data)
+            # Another request took the key over while this one was still running.
+            IdempotencyKey.objects.update(locked_until=timezone.now() + timedelta(minutes=5))
+            return order
+
+        body = {**self.body, 'payment_method': 'mpesa', 'phone_number': '254700000000'}
+        with mock.patch('api.utils.IntaSendService') as service, \
+                mock.patch.object(CreateOrderSerializer, 'create', taken_over), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.post('k1', body).status_code, 409)
+
+        service.return_value.trigger_stk_push.assert_not_called()
+        self.assertFalse(Order.objects.exists())
+
+    @skipUnless(importlib.util.find_spec('intasend'), 'intasend is not installed')
+    @override_settings(INTASEND_TIMEOUT=4)
+    def test_payment_gateway_calls_time_out(self):
+        from .utils import IntaSendService
+
+        with mock.patch('requests.request') as send:
+            send.return_value.status_code = 200
+            IntaSendService().trigger_stk_push(phone_number='254700000000', amount=250.0)
+        self.assertEqual(send.call_args.kwargs['timeout'], 4)
+
+    def test_keys_are_per_user(self):
+        self.post('k1')
+        other = User.objects.create_user(username='other', password='x')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.post('k1').status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+
+
+class RendererTests(TestCase):
+    def assertSameBytes(self, data):
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_matches_drf_byte_for_byte(self):
+        eat = zoneinfo.ZoneInfo('Africa/Nairobi')
+        self.assertSameBytes({
+            'price': Decimal('250.00'),
+            'ratio': Decimal('0.1234567890123456789'),
+            'utc': datetime(2026, 10, 19, 15, 4, 5, 123456, tzinfo=dt_timezone.utc),
+            'local': datetime(2026, 10, 19, 18, 4, 5, tzinfo=eat),
+            'naive': datetime(2026, 10, 19, 15, 4, 5),
+            'day': date(2026, 10, 19),
+            'time': time(9, 30, 0, 500),
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'name': 'Crème brûlée 🍮',
+            'numbers': [1, -2, 3.5, 2 ** 63 - 1, True, None],
+            1: 'non-string key',
+        })
+
+    def test_lazy_strings_at_any_depth(self):
+        self.assertSameBytes({
+            'detail': gettext_lazy('Not found.'),
+            'errors': [{'field': [gettext_lazy('This field is required.')]}],
+            'nested': {'deeper': (gettext_lazy('Invalid value.'),)},
+        })
+
+    def test_serialized_catalog_matches(self):
+        restaurant = Restaurant.objects.create(name='Mama', whatsapp_number='1', location='x', latitude=-1.29, longitude=36.82)
+        category = Category.objects.create(name='Mains', restaurant=restaurant)
+        products = [
+            Product.objects.create(name=f'p{i}', description='', price=Decimal('99.95') * i, category=category, restaurant=restaurant)
+            for i in range(1, 4)
+        ]
+        Reel.objects.create(product=products[0], restaurant=restaurant, video='reels/clip.mp4')
+        self.assertSameBytes(ProductSerializer(products, many=True).data)
+        self.assertSameBytes(ReelSerializer(Reel.objects.all(), many=True, context={'saved_reel_ids': set()}).data)
+        self.assertSameBytes(RestaurantSerializer(restaurant).data)
+
+    def test_values_beyond_orjson_fall_back(self):
+        self.assertSameBytes({'big': 2 ** 70})
+
+    def test_msgpack_carries_the_json_values(self):
+        data = {'price': Decimal('250.00'), 'at': datetime(2026, 10, 19, 15, 4, 5, tzinfo=dt_timezone.utc), 'tags': ['a', gettext_lazy('b')]}
+        self.assertEqual(msgpack.unpackb(MessagePackRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+
+    def test_content_negotiation(self):
+        Category.objects.create(name='Mains')
+        client = APIClient()
+        self.assertEqual(client.get('/api/categories/')['Content-Type'], 'application/json')
+        response = client.get('/api/categories/', headers={'Accept': 'application/msgpack'})
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), client.get('/api/categories/').json())
+
+
+@override_settings(STREAMING_CHUNK_SIZE=2)
+class StreamingExportTests(TestCase):
+    def setUp(self):
+        self.restaurant = Restaurant.objects.create(name='Mama', whatsapp_number='1', location='x')
+        category = Category.objects.create(name='Mains')
+        for i in range(5):
+            Product.objects.create(
+                name=f'p{i}', description='', price=Decimal('10.50') + i, category=category, restaurant=self.restaurant if i % 2 else None,
+            )
+        self.client = APIClient()
+
+    def stream(self, path, **params):
+        response = self.client.get(path, params)
+        self.assertTrue(response.streaming)
+        return response, list(response.streaming_content)
+
+    def test_json_export_matches_the_list(self):
+        response, parts = self.stream('/api/products/', stream='json')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="products.json"')
+        # One part per chunk of rows, then the closing bracket.
+        self.assertEqual(len(parts), 4)
+        self.assertEqual(json.loads(b''.join(parts)), self.client.get('/api/products/').json())
+
+    def test_jsonl_export_has_one_row_per_line(self):
+        response, parts = self.stream('/api/products/', stream='jsonl', restaurant=self.restaurant.id)
+        self.assertEqual(response['Content-Type'], 'application/jsonl')
+        rows = [json.loads(line) for line in b''.join(parts).splitlines()]
+        self.assertEqual(rows, self.client.get('/api/products/', {'restaurant': self.restaurant.id}).json())
+        self.assertEqual(len(rows), 2)
+
+    def test_empty_exports(self):
+        _, parts = self.stream('/api/products/', stream='json', search='nothing')
+        self.assertEqual(b''.join(parts), b'[]')
+        _, parts = self.stream('/api/products/', stream='jsonl', search='nothing')
+        self.assertEqual(b''.join(parts), b'')
+
+    def test_exports_keep_the_view_permissions(self):
+        buyer = User.objects.create_user(username='buyer', password='x')
+        other = User.objects.create_user(username='other', password='x')
+        for user in (buyer, buyer, other):
+            Order.objects.create(user=user, total_amount=1)
+        self.client.force_authenticate(buyer)
+
+        self.assertEqual(self.client.get('/api/users/', {'stream': 'json'}).status_code, 403)
+        _, parts = self.stream('/api/orders/', stream='jsonl')
+        self.assertEqual({json.loads(line)['user'] for line in b''.join(parts).splitlines()}, {buyer.id})
+
+    def test_asgi_pulls_chunks_from_a_worker_thread(self):
+        with override_settings(SERVER_MODE='asgi'):
+            response = self.client.get('/api/products/', {'stream': 'json'})
+
+        async def drain():
+            return [part async for part in response.streaming_content]
+
+        self.assertTrue(response.is_async)
+        self.assertEqual(json.loads(b''.join(async_to_sync(drain)())), self.client.get('/api/products/').json())
+
+
+class FrontendTests(TestCase):
+    def setUp(self):
+        self.static_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_dir)
+        self.shell_path = os.path.join(self.static_dir, 'index.html')
+        self.write_shell(b'<!doctype html><script src="/static/assets/index-AbCd12_-.js"></script>')
+        settings_override = override_settings(STATICFILES_DIRS=[self.static_dir], DEBUG=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        frontend._shell = None
+        self.addCleanup(setattr, frontend, '_shell', None)
+
+    def write_shell(self, body):
+        with open(self.shell_path, 'wb') as f:
+            f.write(body)
+
+    def test_client_routes_get_the_shell(self):
+        response = self.client.get('/orders/42')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, frontend.get_shell().body)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(self.client.post('/orders/42').status_code, 405)
+
+    def test_revalidation_returns_304(self):
+        etag = self.client.get('/').headers['ETag']
+        response = self.client.get('/menu', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_compressed_variants(self):
+        body = frontend.get_shell().body
+        response = self.client.get('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), body)
+        if frontend.brotli is not None:
+            response = self.client.get('/', headers={'Accept-Encoding': 'gzip, br'})
+            self.assertEqual(response['Content-Encoding'], 'br')
+            self.assertEqual(frontend.brotli.decompress(response.content), body)
+
+    def test_shell_is_read_once_outside_debug(self):
+        etag = self.client.get('/').headers['ETag']
+        self.write_shell(b'<!doctype html>rebuilt')
+        os.utime(self.shell_path, (0, 0))
+        self.assertEqual(self.client.get('/').headers['ETag'], etag)
+        with override_settings(DEBUG=True):
+            response = self.client.get('/')
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.content, b'<!doctype html>rebuilt')
+
+    def test_missing_build_is_404(self):
+        os.remove(self.shell_path)
+        self.assertEqual(self.client.get('/').status_code, 404)
+
+    def test_vite_assets_keep_their_names(self):
+        storage = frontend.HashedStaticFilesStorage(location=self.static_dir)
+        content = ContentFile(b'body{}')
+        self.assertEqual(storage.hashed_name('assets/index-AbCd12_-.css', content), 'assets/index-AbCd12_-.css')
+        self.assertRegex(storage.hashed_name('admin/site.css', content), r'^admin/site\.[0-9a-f]{12}\.css$')
+
+    def test_only_hashed_names_are_immutable(self):
+        immutable = re.compile(settings.WHITENOISE_IMMUTABLE_FILE_TEST)
+        for url in ('/static/assets/index-AbCd12_-.js', '/static/admin/site.0123456789ab.css'):
+            self.assertTrue(immutable.search(url), url)
+        for url in ('/static/index.html', '/static/assets/logo.svg', '/static/admin/site.css'):
+            self.assertFalse(immutable.search(url), url)
+
+
+class MediaBlobTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, MEDIA_BLOB_GRACE_SECONDS=3600)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.category = Category.objects.create(name='Mains')
+
+    def product(self, name, content):
+        return Product.objects.create(
+            name=name, description='', price=1, category=self.category, image=ContentFile(content, name=f'{name}.png'),
+        )
+
+    def refcount(self, name):
+        return MediaBlob.objects.get(name=name).refcount
+
+    def blob_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(dirpath, f), default_storage.path(''))
+            for dirpath, _, files in os.walk(default_storage.path('blobs')) for f in files
+        )
+
+    def prune(self):
+        # Everything is past its grace period.
+        with override_settings(MEDIA_BLOB_GRACE_SECONDS=-60):
+            call_command('prune_media_blobs', stdout=StringIO())
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.product('first', b'same bytes')
+        second = self.product('second', b'same bytes')
+        category = Category.objects.create(name='Drinks', image=ContentFile(b'same bytes', name='drinks.PNG'))
+
+        name = first.image.name
+        self.assertRegex(name, r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual({second.image.name, category.image.name}, {name})
+        self.assertEqual(self.blob_files(), [name])
+        self.assertEqual(self.refcount(name), 3)
+        self.assertEqual(MediaBlob.objects.get(name=name).size, len(b'same bytes'))
+
+    def test_replacing_and_deleting_release_references(self):
+        first = self.product('first', b'old')
+        second = self.product('second', b'old')
+        old = first.image.name
+
+        first.image = ContentFile(b'new', name='first.png')
+        first.save()
+        self.assertEqual(self.refcount(old), 1)
+        self.assertEqual(self.refcount(first.image.name), 1)
+
+        # Saves that leave the file fields alone don't touch the counts.
+        second.name = 'renamed'
+        second.save(update_fields=['name'])
+        second.save()
+        self.assertEqual(self.refcount(old), 1)
+
+        second.delete()
+        self.assertEqual(self.refcount(old), 0)
+        first.image = None
+        first.save()
+        self.assertEqual(MediaBlob.objects.filter(refcount__gt=0).count(), 0)
+
+    def test_prune_keeps_referenced_blobs(self):
+        kept = self.product('kept', b'kept').image.name
+        dropped = self.product('dropped', b'dropped')
+        unreferenced = dropped.image.name
+        dropped.delete()
+
+        self.prune()
+        self.assertEqual(self.blob_files(), [kept])
+        self.assertFalse(MediaBlob.objects.filter(name=unreferenced).exists())
+        self.assertEqual(self.refcount(kept), 1)
+
+    def test_prune_waits_out_the_grace_period(self):
+        product = self.product('product', b'bytes')
+        name = product.image.name
+        product.delete()
+        call_command('prune_media_blobs', stdout=StringIO())
+        self.assertEqual(self.blob_files(), [name])
+
+    def test_prune_adopts_orphaned_files(self):
+        name = default_storage.save('orphan.png', ContentFile(b'orphan'))
+        MediaBlob.objects.filter(name=name).delete()
+        os.utime(default_storage.path(name), (0, 0))
+        self.prune()
+        self.assertEqual(self.blob_files(), [])
+
+    def test_rolled_back_save_leaves_counts_alone(self):
+        product = self.product('product', b'before')
+        before = product.image.name
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            product.image = ContentFile(b'after', name='product.png')
+            product.save()
+            after = product.image.name
+            self.assertEqual(self.refcount(after), 1)
+            raise RuntimeError
+
+        self.assertEqual(self.refcount(before), 1)
+        self.assertFalse(MediaBlob.objects.filter(name=after).exists())
+        # The file written for the rolled-back save has no row; prune adopts and removes it.
+        os.utime(default_storage.path(after), (0, 0))
+        self.prune()
+        self.assertEqual(self.blob_files(), [before])
+
+    def test_rebuild_refcounts(self):
+        name = self.product('first', b'bytes').image.name
+        self.product('second', b'bytes')
+        MediaBlob.objects.filter(name=name).update(refcount=7)
+        media.rebuild_refcounts()
+        self.assertEqual(self.refcount(name), 2)
+
+
+class ReelUploadTests(TestCase):
+    VIDEO = bytes(range(256)) * 40
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings_override = override_settings(MEDIA_ROOT=os.path.join(root, 'media'), REEL_UPLOAD_DIR=os.path.join(root, 'parts'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(username='creator', password='x')
+        category = Category.objects.create(name='Mains')
+        self.product = Product.objects.create(name='Pilau', description='', price=1, category=category)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def start(self, **fields):
+        data = {'product': self.product.id, 'filename': '../clip.mp4', 'size': len(self.VIDEO), **fields}
+        response = self.client.post('/api/reel-uploads/', data, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return ReelUpload.objects.get(pk=response.json()['id'])
+
+    def put(self, upload, offset, body):
+        return self.client.generic(
+            'PUT', f'/api/reel-uploads/{upload.pk}/', body, content_type='application/offset+octet-stream',
+            headers={'Upload-Offset': str(offset)},
+        )
+
+    def finalize(self, upload):
+        return self.client.post(f'/api/reel-uploads/{upload.pk}/finalize/')
+
+    def test_chunks_then_finalize(self):
+        upload = self.start(sha256=hashlib.sha256(self.VIDEO).hexdigest().upper())
+        self.assertEqual(upload.filename, 'clip.mp4')
+        for offset in range(0, len(self.VIDEO), 4000):
+            response = self.put(upload, offset, self.VIDEO[offset:offset + 4000])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(int(response['Upload-Offset']), min(offset + 4000, len(self.VIDEO)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.finalize(upload)
+        self.assertEqual(response.status_code, 201)
+        reel = Reel.objects.get(pk=response.json()['id'])
+        with reel.video.open('rb') as f:
+            self.assertEqual(f.read(), self.VIDEO)
+        self.assertEqual(self.finalize(upload).json()['id'], reel.id)
+        self.assertEqual(os.listdir(settings.REEL_UPLOAD_DIR), [])
+        self.assertEqual(self.put(upload, len(self.VIDEO), b'x').status_code, 409)
+
+    def test_wrong_offset_is_a_conflict(self):
+        upload = self.start()
+        self.put(upload, 0, self.VIDEO[:100])
+        for offset in (0, 50, 200):
+            response = self.put(upload, offset, self.VIDEO[offset:offset + 100])
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response['Upload-Offset'], '100')
+            self.assertEqual(response.json()['received'], 100)
+        upload.refresh_from_db()
+        self.assertEqual(upload.received, 100)
+        self.assertEqual(self.put(upload, 'x', b'').status_code, 400)
+
+    def test_resume_after_a_dropped_connection(self):
+        upload = self.start()
+
+        class Dropped:
+            sent = False
+
+            def read(self, n):
+                if self.sent:
+                    raise UnreadablePostError('connection reset')
+                self.sent = True
+                return ReelUploadTests.VIDEO[:1000]
+
+        self.assertEqual(uploads.append_chunk(upload.pk, 0, Dropped(), 4000).received, 1000)
+        # Bytes an earlier attempt wrote but never recorded are overwritten.
+        with open(uploads.part_path(upload), 'ab') as f:
+            f.write(b'garbage')
+
+        response = self.client.get(f'/api/reel-uploads/{upload.pk}/')
+        self.assertEqual(response['Upload-Offset'], '1000')
+        self.assertEqual(self.put(upload, 1000, self.VIDEO[1000:]).status_code, 200)
+        with open(uploads.part_path(upload), 'rb') as f:
+            self.assertEqual(f.read(), self.VIDEO)
+        self.assertEqual(self.finalize(upload).status_code, 201)
+
+    def test_concurrent_appends_at_one_offset(self):
+        upload = self.start()
+        outcome = {}
+
+        class Racing:
+            """Reads like a slow client, and lets a retry of the same chunk land meanwhile."""
+            def __init__(self):
+                self.body = BytesIO(ReelUploadTests.VIDEO[:1000])
+
+            def read(self, n):
+                if not outcome:
+                    # No lock is held while the body arrives, so the retry isn't blocked.
+                    outcome['retry'] = uploads.append_chunk(upload.pk, 0, BytesIO(ReelUploadTests.VIDEO[:600]), 600)
+                return self.body.read(n)
+
+        with self.assertRaises(uploads.OffsetMismatch) as raised:
+            uploads.append_chunk(upload.pk, 0, Racing(), 1000)
+        self.assertEqual(raised.exception.expected, 600)
+        self.assertEqual(outcome['retry'].received, 600)
+        upload.refresh_from_db()
+        self.assertEqual(upload.received, 600)
+        with open(uploads.part_path(upload), 'rb') as f:
+            self.assertEqual(f.read(), self.VIDEO[:600])
+        # Only the part file is left; the loser's chunk file is gone.
+        self.assertEqual(os.listdir(settings.REEL_UPLOAD_DIR), [f'{upload.pk}.part'])
+
+    def test_failed_copy_rolls_the_offset_back(self):
+        upload = self.start()
+        with mock.patch('api.uploads.shutil.copyfileobj', side_effect=OSError('disk full')), self.assertRaises(OSError):
+            uploads.append_chunk(upload.pk, 0, BytesIO(self.VIDEO[:100]), 100)
+        upload.refresh_from_db()
+        self.assertEqual(upload.received, 0)
+        self.assertEqual(self.put(upload, 0, self.VIDEO[:100]).status_code, 200)
+
+    def test_finalize_checks_size_and_hash(self):
+        upload = self.start(sha256=hashlib.sha256(self.VIDEO).hexdigest())
+        self.put(upload, 0, self.VIDEO[:-1])
+        response = self.finalize(upload)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['received'], len(self.VIDEO) - 1)
+
+        # Extra bytes past the declared size are not taken.
+        self.put(upload, len(self.VIDEO) - 1, b'!tail')
+        response = self.finalize(upload)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['sha256'], hashlib.sha256(self.VIDEO[:-1] + b'!').hexdigest())
+        self.assertFalse(Reel.objects.exists())
+
+        data = {'product': self.product.id, 'filename': 'clip.mp4', 'size': 1, 'sha256': 'xyz'}
+        self.assertEqual(self.client.post('/api/reel-uploads/', data, format='json').status_code, 400)
+
+    def test_abort_removes_leftovers(self):
+        upload = self.start()
+        open(os.path.join(settings.REEL_UPLOAD_DIR, f'{upload.pk}.crashed.chunk'), 'wb').close()
+        self.assertEqual(self.client.delete(f'/api/reel-uploads/{upload.pk}/').status_code, 204)
+        self.assertEqual(os.listdir(settings.REEL_UPLOAD_DIR), [])
+
+
+class FakeDownload:
+    def __init__(self, body, status_code=200, content_type='image/jpeg'):
+        self.body = body
+        self.status_code = status_code
+        self.headers = {'Content-Type': content_type}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code} error', response=self)
+
+    def iter_content(self, size):
+        for start in range(0, len(self.body), size):
+            yield self.body[start:start + size]
+
+
+# The downloads run on worker threads with their own connections, so the rows must be committed.
+class IngestTests(TransactionTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(root, 'media'), INGEST_DIR=os.path.join(root, 'ingest'), INGEST_RETRIES=1,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.category = Category.objects.create(name='Mains')
+
+    def product(self, url):
+        return Product.objects.create(name='p', description='', price=1, category=self.category, image=url)
+
+    def test_each_url_is_downloaded_once_and_concurrently(self):
+        urls = [f'https://cdn.example.com/{i}.jpg' for i in range(3)]
+        products = [self.product(url) for url in urls + urls[:1]]
+        restaurant = Restaurant.objects.create(name='r', whatsapp_number='1', location='x', logo=urls[0])
+        in_flight = threading.Barrier(3, timeout=5)
+        calls = []
+
+        def get(url, headers, stream, timeout):
+            calls.append(url)
+            # Only returns once all three downloads are running at the same time.
+            in_flight.wait()
+            return FakeDownload(url.encode())
+
+        by_url = ingest.find_remote()
+        self.assertEqual(sorted(by_url), urls)
+        self.assertEqual(len(by_url[urls[0]]), 3)
+        with mock.patch('requests.get', side_effect=get):
+            results, attached = ingest.ingest(by_url, concurrency=3, batch_size=2)
+
+        self.assertEqual(sorted(calls), urls)
+        self.assertEqual([r.error for r in results], [None] * 3)
+        self.assertEqual(attached, 5)
+        for product, url in zip(products, urls + urls[:1]):
+            product.refresh_from_db()
+            with product.image.open('rb') as f:
+                self.assertEqual(f.read(), url.encode())
+        restaurant.refresh_from_db()
+        self.assertEqual(restaurant.logo.name, products[0].image.name)
+        self.assertEqual(MediaBlob.objects.get(name=products[0].image.name).refcount, 3)
+        self.assertEqual(ingest.find_remote(), {})
+
+    def test_interrupted_download_resumes_with_range(self):
+        url = 'https://cdn.example.com/clip'
+        self.product(url)
+        body = b'0123456789' * 1000
+        responses = [requests.ConnectionError('reset'), FakeDownload(body[4000:], status_code=206, content_type='video/mp4')]
+
+        def get(url, headers, stream, timeout):
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                with open(ingest._part_path(url), 'wb') as f:
+                    f.write(body[:4000])
+                raise response
+            self.assertEqual(headers, {'Range': 'bytes=4000-'})
+            return response
+
+        with mock.patch('requests.get', side_effect=get):
+            (result,), attached = ingest.ingest(ingest.find_remote())
+        self.assertEqual(attached, 1)
+        self.assertTrue(result.name.endswith('.mp4'))
+        with default_storage.open(result.name, 'rb') as f:
+            self.assertEqual(f.read(), body)
+
+    def test_failures_leave_the_row_alone(self):
+        missing = self.product('https://cdn.example.com/missing.jpg')
+        huge = self.product('https://cdn.example.com/huge.jpg')
+        responses = {missing.image.name: FakeDownload(b'', status_code=404), huge.image.name: FakeDownload(b'x' * 100)}
+
+        with override_settings(INGEST_MAX_BYTES=50), mock.patch('requests.get', side_effect=lambda url, **kw: responses[url]):
+            results, attached = ingest.ingest(ingest.find_remote())
+
+        self.assertEqual(attached, 0)
+        self.assertEqual(sorted(bool(r.error) for r in results), [True, True])
+        self.assertEqual(len(ingest.find_remote()), 2)
+        self.assertEqual(os.listdir(settings.INGEST_DIR), [])
+
+    def test_rows_changed_during_the_download_are_skipped(self):
+        url = 'https://cdn.example.com/a.jpg'
+        product = self.product(url)
+
+        def get(url, **kwargs):
+            Product.objects.filter(pk=product.pk).update(image='products/manual.jpg')
+            return FakeDownload(b'bytes')
+
+        with mock.patch('requests.get', side_effect=get):
+            (result,), attached = ingest.ingest(ingest.find_remote())
+        self.assertEqual(attached, 0)
+        product.refresh_from_db()
+        self.assertEqual(product.image.name, 'products/manual.jpg')
+        self.assertEqual(MediaBlob.objects.get(name=result.name).refcount, 0)
+
+    def test_staff_endpoint(self):
+        self.product('https://cdn.example.com/a.jpg')
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='buyer', password='x'))
+        self.assertEqual(client.post('/api/media/ingest/').status_code, 403)
+
+        client.force_authenticate(User.objects.create_user(username='admin', password='x', is_staff=True))
+        with mock.patch('requests.get', return_value=FakeDownload(b'bytes')):
+            response = client.post('/api/media/ingest/', {'limit': 'all'}, format='json')
+            self.assertEqual(response.status_code, 400)
+            response = client.post('/api/media/ingest/', {'models': ['product']}, format='json')
+        self.assertEqual(response.json()['attached'], 1)
+        self.assertEqual(response.json()['failed'], [])
+        self.assertFalse(response.json()['remaining'])
+
+
+class MenuBundleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        promotions.invalidate_active_promotions()
+        self.restaurant = Restaurant.objects.create(name='Mama', whatsapp_number='1', location='x')
+        self.mains = Category.objects.create(name='Mains', restaurant=self.restaurant)
+        self.drinks = Category.objects.create(name='Drinks')
+        self.empty = Category.objects.create(name='Desserts', restaurant=self.restaurant)
+        self.pilau = Product.objects.create(name='Pilau', description='', price=Decimal('200.00'), category=self.mains, restaurant=self.restaurant)
+        Product.objects.create(name='Chapati', description='', price=Decimal('30.00'), category=self.mains, restaurant=self.restaurant)
+        self.soda = Product.objects.create(name='Soda', description='', price=Decimal('50.00'), category=self.drinks, restaurant=self.restaurant)
+        Product.objects.create(name='Elsewhere', description='', price=Decimal('1.00'), category=self.drinks)
+        self.client = APIClient()
+        self.url = f'/api/restaurants/{self.restaurant.id}/menu/'
+
+    def menu(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def products(self, menu):
+        return {p['id']: p for category in menu['categories'] for p in category['products']}
+
+    def test_matches_the_per_resource_endpoints(self):
+        with self.assertNumQueries(3):
+            menu = self.menu()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.menu(), menu)
+
+        self.assertEqual(menu['restaurant'], self.client.get(f'/api/restaurants/{self.restaurant.id}/').json())
+        listed = self.client.get('/api/products/', {'restaurant': self.restaurant.id}).json()
+        for product in listed:
+            del product['restaurant_data']
+        self.assertEqual(self.products(menu), {p['id']: p for p in listed})
+        self.assertEqual(menu['product_count'], 3)
+
+        categories = {c['id']: c for c in self.client.get('/api/categories/').json()}
+        self.assertEqual([c['id'] for c in menu['categories']], [self.mains.id, self.drinks.id, self.empty.id])
+        for category in menu['categories']:
+            self.assertEqual({k: category[k] for k in ('name', 'image')}, {k: categories[category['id']][k] for k in ('name', 'image')})
+            self.assertEqual(category['product_count'], len(category['products']))
+        self.assertEqual(self.client.get('/api/restaurants/0/menu/').status_code, 404)
+
+    def test_product_changes_invalidate(self):
+        self.menu()
+        self.pilau.price = Decimal('250.00')
+        self.pilau.save()
+        self.assertEqual(self.products(self.menu())[self.pilau.id]['price'], '250.00')
+
+        # Moving a product away changes the menu it left.
+        self.soda.restaurant = None
+        self.soda.save()
+        self.assertNotIn(self.soda.id, self.products(self.menu()))
+        self.pilau.delete()
+        self.assertEqual(self.menu()['product_count'], 1)
+
+    def test_category_changes_invalidate(self):
+        self.menu()
+        # Shared with other restaurants, but still on this menu.
+        self.drinks.name = 'Cold drinks'
+        self.drinks.save()
+        self.assertIn('Cold drinks', [c['name'] for c in self.menu()['categories']])
+        self.empty.delete()
+        self.assertNotIn(self.empty.id, [c['id'] for c in self.menu()['categories']])
+
+    def test_restaurant_changes_invalidate(self):
+        self.menu()
+        self.restaurant.discount_percentage = Decimal('10.00')
+        self.restaurant.save()
+        menu = self.menu()
+        self.assertEqual(menu['restaurant']['discount_percentage'], '10.00')
+        self.assertEqual(self.products(menu)[self.pilau.id]['discounted_price'], 180.0)
+
+    def test_promotion_changes_invalidate(self):
+        self.menu()
+        generation = pricing.current_generation()
+        later = timezone.now() + timedelta(seconds=1)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            promotion = Promotion.objects.create(
+                name='promo', starts_at=later - timedelta(hours=1), ends_at=later + timedelta(hours=1), discount_percentage=Decimal('25'),
+            )
+            promotion.products.set([self.soda])
+            self.assertNotEqual(pricing.current_generation(), generation)
+            soda = self.products(self.menu())[self.soda.id]
+        self.assertTrue(soda['is_promoted'])
+        self.assertEqual(soda['discount_percentage'], 25)
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        suggest._local.update(current=(None, None), checked_at=0.0)
+        self.restaurant = Restaurant.objects.create(name='Urban Grill', whatsapp_number='1', location='x')
+        self.category = Category.objects.create(name='Fast food')
+        self.products = {
+            name: Product.objects.create(name=name, description='', price=1, category=self.category, restaurant=self.restaurant)
+            for name in ('Chicken Burger', 'Beef Burger', 'Burrito', 'Bursa', 'Crème Brûlée')
+        }
+        self.sold = {self.products['Chicken Burger'].id: 5, self.products['Beef Burger'].id: 9, self.products['Crème Brûlée'].id: 1}
+
+    def names(self, index, query, limit=8):
+        return [entry['name'] for entry in index.search(query, limit)]
+
+    def test_ranked_by_units_sold_then_name(self):
+        index = suggest.build_index(self.sold)
+        self.assertEqual(self.names(index, 'bur'), ['Beef Burger', 'Chicken Burger', 'Burrito', 'Bursa'])
+        self.assertEqual(self.names(index, 'bur', limit=2), ['Beef Burger', 'Chicken Burger'])
+
+    def test_matches_any_word_ignoring_case_and_accents(self):
+        index = suggest.build_index(self.sold)
+        self.assertEqual(self.names(index, 'BURGER'), ['Beef Burger', 'Chicken Burger'])
+        self.assertEqual(self.names(index, 'creme bru'), ['Crème Brûlée'])
+        self.assertEqual(self.names(index, 'xyz'), [])
+        self.assertEqual(self.names(index, '  '), [])
+
+    def test_categories_and_restaurants_weigh_their_products(self):
+        index = suggest.build_index(self.sold)
+        results = {entry['type']: entry for entry in index.search('urban', 8) + index.search('fast', 8)}
+        self.assertEqual(results['restaurant']['id'], self.restaurant.id)
+        self.assertEqual(results['category']['id'], self.category.id)
+        self.assertEqual(index.entries[f'restaurant:{self.restaurant.id}']['weight'], 15)
+
+    def test_popular_prefixes_use_precomputed_heads(self):
+        pizzas = Product.objects.bulk_create([
+            Product(name=f'Pizza {i:03}', description='', price=1, category=self.category) for i in range(suggest.SCAN_LIMIT + 50)
+        ])
+        index = suggest.build_index({p.id: i for i, p in enumerate(pizzas)})
+        self.assertIn('pi', index.heads)
+        expected = [f'Pizza {i:03}' for i in range(suggest.SCAN_LIMIT + 49, suggest.SCAN_LIMIT + 44, -1)]
+        self.assertEqual(self.names(index, 'pi', limit=5), expected)
+        self.assertEqual([index.entries[key]['name'] for key in index._top(*index._range('pi'), 5)], expected)
+
+    def test_suggest_answers_from_the_published_snapshot(self):
+        self.assertTrue(suggest.publish(suggest.build_index(self.sold)))
+        suggest._local.update(current=(None, None), checked_at=0.0)
+        self.assertEqual(suggest.suggest('beef')[0]['name'], 'Beef Burger')
+
+    def test_older_snapshot_never_replaces_a_newer_one(self):
+        older = suggest.build_index(self.sold)
+        newer = suggest.build_index({})
+        self.assertTrue(suggest.publish(newer))
+        self.assertFalse(suggest.publish(older))
+        suggest._local.update(current=(None, None), checked_at=0.0)
+        self.assertEqual(suggest.get_index().built_at, newer.built_at)
+
+
+class CooccurrenceTests(TestCase):
+    # Orders 1-5: {1, 2}, {1, 2}, {1, 3}, {1, 2, 2}, {3, 4}
+    ORDERS = np.array([1, 1, 2, 2, 3, 3, 4, 4, 4, 5, 5])
+    PRODUCTS = np.array([1, 2, 1, 2, 1, 3, 1, 2, 2, 3, 4])
+
+    def related(self, products, k=5, min_orders=1):
+        counts = recommendations.cooccurrence(self.ORDERS, self.PRODUCTS, 5)
+        source, related, rank, score, together = recommendations.top_related(counts, np.array(products), k, min_orders)
+        return [(int(p), int(r), int(n), round(float(s), 3), int(t)) for p, r, n, s, t in zip(source, related, rank, score, together)]
+
+    def test_counts_orders_not_units(self):
+        counts = recommendations.cooccurrence(self.ORDERS, self.PRODUCTS, 5).toarray()
+        self.assertEqual(counts.diagonal().tolist(), [0, 4, 3, 2, 1])
+        self.assertEqual(counts[1, 2], 3)
+        self.assertEqual(counts[2, 1], 3)
+        self.assertEqual(counts[3, 4], 1)
+
+    def test_ranked_by_cosine_similarity(self):
+        self.assertEqual(self.related([1, 3]), [
+            (1, 2, 0, round(3 / math.sqrt(12), 3), 3),
+            (1, 3, 1, round(1 / math.sqrt(8), 3), 1),
+            (3, 4, 0, round(1 / math.sqrt(2), 3), 1),
+            (3, 1, 1, round(1 / math.sqrt(8), 3), 1),
+        ])
+
+    def test_top_k_and_minimum_orders(self):
+        self.assertEqual([row[:2] for row in self.related([1, 3], k=1)], [(1, 2), (3, 4)])
+        self.assertEqual([row[:2] for row in self.related([1, 3], min_orders=2)], [(1, 2)])
+
+    def test_build_serves_related_products(self):
+        category = Category.objects.create(name='Mains')
+        products = [Product.objects.create(name=f'p{i}', description='', price=1, category=category) for i in range(3)]
+        user = User.objects.create_user(username='buyer', password='x')
+        for basket in ([0, 1], [0, 1], [0, 2], [0, 1]):
+            order = Order.objects.create(user=user, total_amount=1)
+            OrderItem.objects.bulk_create([OrderItem(order=order, product=products[i], quantity=1, price=1) for i in basket])
+        Order.objects.update(created_at=timezone.now() - timedelta(hours=1))
+
+        with tempfile.TemporaryDirectory() as tmp, override_settings(RECOMMENDATIONS_STATE=os.path.join(tmp, 'state.npz')):
+            recommendations.build(full=True, k=5, min_orders=1)
+
+        self.assertEqual(RelatedProduct.objects.filter(product=products[0]).count(), 2)
+        response = APIClient().get(f'/api/products/{products[0].id}/related/')
+        self.assertEqual([p['id'] for p in response.json()], [products[1].id, products[2].id])
+        self.assertEqual(APIClient().get('/api/products/999999/related/').status_code, 404)
+
+
+@override_settings(TRENDING_WINDOW_HOURS=72, TRENDING_HALF_LIFE_HOURS=12, TRENDING_ORDER_WEIGHT=10, TRENDING_VIEW_WEIGHT=1)
+class TrendingTests(TestCase):
+    def setUp(self):
+        self.now = trending.bucket_start(timezone.now())
+        category = Category.objects.create(name='Mains')
+        self.fresh, self.older, self.expired = (
+            Product.objects.create(name=name, description='', price=1, category=category) for name in ('fresh', 'older', 'expired')
+        )
+
+    def count(self, product, hours_ago, orders=0, views=0):
+        TrendingCounter.objects.create(
+            scope='product', object_id=product.id, bucket=self.now - timedelta(hours=hours_ago), orders=orders, views=views,
+        )
+
+    def test_buckets_are_hour_aligned(self):
+        when = self.now + timedelta(minutes=59, seconds=59)
+        self.assertEqual(trending.bucket_start(when), self.now)
+
+    def test_activity_halves_every_half_life(self):
+        self.count(self.fresh, 0, orders=1, views=2)
+        self.count(self.older, 12, orders=1)
+        self.count(self.older, 24, views=4)
+        self.count(self.expired, 80, orders=50)
+
+        scores = trending.scores(self.now)
+
+        self.assertAlmostEqual(scores[('product', self.fresh.id)], 12.0)
+        self.assertAlmostEqual(scores[('product', self.older.id)], 10 / 2 + 4 / 4)
+        self.assertNotIn(('product', self.expired.id), scores)
+
+    def test_refresh_writes_scores_and_drops_old_buckets(self):
+        Product.objects.filter(pk=self.expired.pk).update(trending_score=99)
+        self.count(self.fresh, 0, orders=1)
+        self.count(self.expired, 80, orders=50)
+
+        trending.refresh(self.now)
+
+        self.assertAlmostEqual(Product.objects.get(pk=self.fresh.pk).trending_score, 10.0)
+        self.assertEqual(Product.objects.get(pk=self.expired.pk).trending_score, 0)
+        self.assertFalse(TrendingCounter.objects.filter(object_id=self.expired.id).exists())
+
+    def test_views_are_buffered_until_flushed(self):
+        for _ in range(3):
+            trending.record_view(self.fresh.id, when=self.now)
+        self.assertFalse(TrendingCounter.objects.exists())
+
+        self.assertEqual(trending.flush_views(), 3)
+        self.assertEqual(TrendingCounter.objects.get(object_id=self.fresh.id, bucket=self.now).views, 3)
+
+    def test_orders_count_each_product_and_restaurant_once(self):
+        restaurant = Restaurant.objects.create(name='Mama', whatsapp_number='1', location='x')
+        trending.record_order([(self.fresh.id, restaurant.id), (self.fresh.id, restaurant.id), (self.older.id, None)], when=self.now)
+        counters = {(c.scope, c.object_id): c.orders for c in TrendingCounter.objects.all()}
+        self.assertEqual(counters, {('product', self.fresh.id): 1, ('product', self.older.id): 1, ('restaurant', restaurant.id): 1})
+
+
+class EngagementRollupTests(TestCase):
+    def setUp(self):
+        product = Product.objects.create(name='p', description='', price=1, category=Category.objects.create(name='Mains'))
+        self.reel = Reel.objects.create(product=product, video='reels/clip.mp4')
+        self.now = timezone.now()
+        self.hour = self.now.replace(minute=0, second=0, microsecond=0)
+
+    def event(self, kind=ReelEvent.VIEW, inserted_ago=timedelta(minutes=5), **fields):
+        event = ReelEvent.objects.create(reel=self.reel, kind=kind, created_at=self.hour, **fields)
+        ReelEvent.objects.filter(pk=event.pk).update(inserted_at=self.now - inserted_ago)
+        return event
+
+    def rollup(self, delay=timedelta()):
+        return engagement.rollup(now=self.now + delay)
+
+    def hourly(self):
+        return ReelEngagement.objects.get(reel=self.reel, period='hour', bucket=self.hour)
+
+    def test_counts_settled_events_per_hour_and_day(self):
+        self.event()
+        self.event()
+        self.event(kind=ReelEvent.SAVE)
+
+        self.assertEqual(self.rollup(), 3)
+
+        self.assertEqual((self.hourly().views, self.hourly().saves), (2, 1))
+        daily = ReelEngagement.objects.get(reel=self.reel, period='day')
+        self.assertEqual((daily.views, daily.saves), (2, 1))
+        self.assertEqual(RollupCursor.objects.get(name=engagement.CURSOR).last_id, ReelEvent.objects.latest('id').id)
+
+    def test_cursor_never_passes_recent_inserts(self):
+        first = self.event()
+        late = first.id + 1  # still uncommitted when the first rollup runs
+        self.event(id=late + 1, inserted_ago=timedelta(seconds=1))
+
+        self.assertEqual(self.rollup(), 1)
+        self.assertEqual(RollupCursor.objects.get(name=engagement.CURSOR).last_id, first.id)
+
+        self.event(id=late, inserted_ago=timedelta(seconds=0))
+        self.assertEqual(self.rollup(timedelta(seconds=engagement.COMMIT_LAG_SECONDS + 1)), 2)
+        self.assertEqual(self.hourly().views, 3)
+
+    def test_rerun_adds_nothing(self):
+        self.event()
+        self.rollup()
+        self.assertEqual(self.rollup(), 0)
+        self.assertEqual(self.hourly().views, 1)
+
+    def test_buffered_events_reach_the_table_on_flush(self):
+        engagement.record(self.reel.id, ReelEvent.ORDER_CLICK)
+        self.assertFalse(ReelEvent.objects.exists())
+        self.assertEqual(engagement.flush(), 1)
+        self.assertEqual(ReelEvent.objects.get().kind, ReelEvent.ORDER_CLICK)
+
+
+@override_settings(ORDER_ARCHIVE_AFTER_DAYS=90)
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='x')
+        self.product = Product.objects.create(name='p', description='', price=5, category=Category.objects.create(name='Mains'))
+        self.old_delivered = self.order('delivered', days_ago=100)
+        self.old_pending = self.order('pending', days_ago=100)
+        self.recent_delivered = self.order('delivered', days_ago=5)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def order(self, status, days_ago):
+        order = Order.objects.create(user=self.user, total_amount=10, status=status)
+        OrderItem.objects.create(order=order, product=self.product, quantity=2, price=5)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return order
+
+    def test_moves_only_old_closed_orders_with_their_items(self):
+        self.assertEqual(archive.archive(batch_size=1), 1)
+
+        self.assertEqual(set(Order.objects.values_list('id', flat=True)), {self.old_pending.id, self.recent_delivered.id})
+        archived = ArchivedOrder.objects.get()
+        self.assertEqual((archived.id, archived.status, archived.user_id), (self.old_delivered.id, 'delivered', self.user.id))
+        self.assertEqual(ArchivedOrderItem.objects.get().order_id, self.old_delivered.id)
+        self.assertFalse(OrderItem.objects.filter(order_id=self.old_delivered.id).exists())
+        self.assertEqual(archive.archive(), 0)
+
+    def test_reopened_order_is_left_in_place(self):
+        Order.objects.filter(pk=self.old_delivered.pk).update(status='preparing')
+        self.assertEqual(archive.archive_batch([self.old_delivered.id]), 0)
+        self.assertFalse(ArchivedOrder.objects.exists())
+
+    def test_list_reads_the_hot_table_and_the_archive_on_demand(self):
+        archive.archive()
+
+        recent = self.client.get('/api/orders/').json()
+        archived = self.client.get('/api/orders/', {'archive': 'only'}).json()
+
+        self.assertEqual([o['id'] for o in recent], [self.recent_delivered.id, self.old_pending.id])
+        self.assertEqual([o['id'] for o in archived], [self.old_delivered.id])
+        self.assertEqual(archived[0]['items'][0]['quantity'], 2)
+
+    def test_paging_is_opt_in(self):
+        with self.assertNumQueries(3):
+            self.assertIsInstance(self.client.get('/api/orders/').json(), list)
+
+        page = self.client.get('/api/orders/', {'page_size': 1}).json()
+        self.assertEqual(len(page['results']), 1)
+        following = self.client.get(page['next']).json()
+        self.assertEqual(len(following['results']), 1)
+        self.assertNotEqual(following['results'][0]['id'], page['results'][0]['id'])
+        self.assertIn('page_size=1', following['next'])
+
+        archive.archive()
+        page = self.client.get('/api/orders/', {'archive': 'only', 'page_size': 5}).json()
+        self.assertEqual([o['id'] for o in page['results']], [self.old_delivered.id])
+        self.assertIsNone(page['next'])
+
+    def test_stats_cover_both_tables(self):
+        archive.archive()
+        Order.objects.create(user=User.objects.create_user(username='other', password='x'), total_amount=Decimal('99.50'))
+
+        stats = self.client.get('/api/orders/stats/').json()
+        self.assertEqual(stats['count'], 3)
+        self.assertEqual(stats['revenue'], '30.00')
+        self.assertEqual(stats['by_status'], {'delivered': 2, 'pending': 1})
+        day = lambda days_ago: timezone.localdate(timezone.now() - timedelta(days=days_ago)).isoformat()
+        self.assertEqual(stats['revenue_by_day'], [
+            {'date': day(100), 'orders': 2, 'revenue': '20.00'},
+            {'date': day(5), 'orders': 1, 'revenue': '10.00'},
+        ])
+
+        self.client.force_authenticate(User.objects.create_user(username='admin', password='x', is_staff=True))
+        with override_settings(ORDER_STATS_DAYS=1):
+            stats = self.client.get('/api/orders/stats/').json()
+        self.assertEqual((stats['count'], stats['revenue']), (4, '129.50'))
+        self.assertEqual([d['date'] for d in stats['revenue_by_day']], [day(0)])
+
+    def test_receipt_is_found_in_either_table(self):
+        archive.archive()
+        response = self.client.get(f'/api/orders/{self.old_delivered.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'delivered')
+        other = User.objects.create_user(username='other', password='x')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(f'/api/orders/{self.old_delivered.id}/').status_code, 404)
+
+
+class ServerStartupTests(SimpleTestCase):
+    def load_gunicorn_conf(self, **env):
+        path = os.path.join(settings.BASE_DIR, 'gunicorn.conf.py')
+        spec = importlib.util.spec_from_file_location('gunicorn_conf', path)
+        conf = importlib.util.module_from_spec(spec)
+        with mock.patch.dict(os.environ):
+            # Defaults unless the test sets them
+            for name in ('SERVER_MODE', 'GUNICORN_PRELOAD'):
+                os.environ.pop(name, None)
+            os.environ.update(env)
+            spec.loader.exec_module(conf)
+        return conf
+
+    def test_gunicorn_preloads_by_default(self):
+        conf = self.load_gunicorn_conf()
+        self.assertTrue(conf.preload_app)
+        self.assertEqual(conf.wsgi_app, 'matrix_backend.wsgi:application')
+        self.assertFalse(self.load_gunicorn_conf(GUNICORN_PRELOAD='False').preload_app)
+
+        conf = self.load_gunicorn_conf(SERVER_MODE='asgi')
+        self.assertEqual((conf.wsgi_app, conf.worker_class), ('matrix_backend.asgi:application', 'uvicorn_worker.UvicornWorker'))
+
+    def test_gunicorn_hooks(self):
+        conf = self.load_gunicorn_conf()
+        server, worker = mock.Mock(), mock.Mock(pid=4242)
+        with mock.patch('gc.freeze') as freeze:
+            conf.pre_fork(server, worker)
+        freeze.assert_called_once_with()
+
+        with mock.patch('api.metrics.reset') as reset, mock.patch('api.metrics.retire_worker') as retire_worker:
+            conf.on_starting(server)
+            conf.child_exit(server, worker)
+        reset.assert_called_once_with(settings.METRICS_DIR)
+        retire_worker.assert_called_once_with(settings.METRICS_DIR, 4242)
+
+    def test_warm_up_loads_the_urlconf_and_the_shell(self):
+        static_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_dir)
+        with open(os.path.join(static_dir, 'index.html'), 'wb') as f:
+            f.write(b'<!doctype html>')
+        self.addCleanup(setattr, frontend, '_shell', None)
+
+        with override_settings(STATICFILES_DIRS=[static_dir]), mock.patch('django.db.connections.close_all') as close_all:
+            frontend._shell = None
+            startup.warm_up()
+        self.assertEqual(frontend._shell.body, b'<!doctype html>')
+        close_all.assert_called_once_with()
+
+        # Deployments without a frontend build still start.
+        with override_settings(STATICFILES_DIRS=[]), mock.patch('django.db.connections.close_all'):
+            frontend._shell = None
+            startup.warm_up()
+        self.assertIsNone(frontend._shell)
+
+    def test_app_factories_warm_up_unless_disabled(self):
+        with mock.patch.object(startup, 'warm_up') as warm_up, mock.patch.dict(os.environ):
+            os.environ.pop('APP_WARM_UP', None)
+            startup.get_wsgi_application()
+            startup.get_asgi_application()
+            self.assertEqual(warm_up.call_count, 2)
+            with mock.patch.dict(os.environ, {'APP_WARM_UP': 'False'}):
+                startup.get_wsgi_application()
+            self.assertEqual(warm_up.call_count, 2)
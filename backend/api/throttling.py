@@ -0,0 +1,97 @@
+"""
+Sliding-window rate limiting shared across gunicorn workers.
+
+Counts live in the Django cache in two fixed windows (current and previous);
+the request rate is estimated by weighting the previous window by how much of
+it still overlaps the sliding window. With Redis (REDIS_URL) the increment,
+expiry and read of the previous window go out as one pipelined round trip;
+other cache backends take two (three on the first request of a window).
+"""
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+def parse_rate(rate):
+    """'10/min' -> (10, 60)"""
+    num, period = rate.split('/')
+    return int(num), {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+
+
+def _hit(key, window, duration):
+    """Count this request in `window`; returns (current_count, previous_count)."""
+    current_key = f'{key}:{window}'
+    previous_key = f'{key}:{window - 1}'
+
+    cache = caches['default']
+    if isinstance(cache, RedisCache):
+        client = cache._cache.get_client(current_key, write=True)
+        pipe = client.pipeline(transaction=False)
+        pipe.incr(cache.make_and_validate_key(current_key))
+        pipe.expire(cache.make_and_validate_key(current_key), duration * 2)
+        pipe.get(cache.make_and_validate_key(previous_key))
+        current, _, previous = pipe.execute()
+        return int(current), int(previous or 0)
+
+    # Other backends have no pipeline: an incr and a get, plus an add on the
+    # first request of each window.
+    try:
+        current = cache.incr(current_key)
+    except ValueError:  # no count yet in this window
+        if cache.add(current_key, 1, duration * 2):
+            current = 1
+        else:  # another worker started it first
+            current = cache.incr(current_key)
+    return current, cache.get(previous_key, 0)
+
+
+class ScopedSlidingWindowThrottle(BaseThrottle):
+    """
+    Throttles views that set ``throttle_scope``. Rates come from
+    DEFAULT_THROTTLE_RATES; an ``<scope>_anon`` entry, if present, applies to
+    anonymous clients (keyed by IP) while ``<scope>`` applies per user.
+    """
+    timer = time.time
+
+    def get_rate(self, scope, request):
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        if not request.user.is_authenticated and f'{scope}_anon' in rates:
+            return rates[f'{scope}_anon']
+        return rates.get(scope)
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if not scope:
+            return True
+        rate = self.get_rate(scope, request)
+        if rate is None:
+            return True
+
+        self.num_requests, self.duration = parse_rate(rate)
+        if request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+
+        now = self.timer()
+        window = int(now // self.duration)
+        current, previous = _hit(f'throttle:{scope}:{ident}', window, self.duration)
+        elapsed = (now % self.duration) / self.duration
+        estimated = previous * (1 - elapsed) + current
+        if estimated <= self.num_requests:
+            return True
+
+        # Wait until the previous window's share has decayed enough to fit the retry
+        # (which counts too), or the window rolls over.
+        if previous and current < self.num_requests:
+            needed = 1 - (self.num_requests - current - 1) / previous
+            self.wait_seconds = max(0.0, (needed - elapsed) * self.duration)
+        else:
+            self.wait_seconds = self.duration * (1 - elapsed)
+        return False
+
+    def wait(self):
+        return getattr(self, 'wait_seconds', None)
@@ -0,0 +1,160 @@
+"""
+Trending products and restaurants.
+
+Orders and product views are counted into hourly TrendingCounter buckets,
+one row per product or restaurant per bucket. An order is counted once it has
+committed, with a single-row UPDATE per count. Views are far more frequent, so
+each worker adds them up in memory and writes one UPDATE per changed counter
+once TRENDING_VIEW_BATCH_SIZE counters have changed or the oldest count is
+TRENDING_VIEW_FLUSH_SECONDS old (and at exit). refresh_trending (cron, every few minutes) folds
+the buckets of the last TRENDING_WINDOW_HOURS into an exponentially decayed
+score, halving a bucket's weight every TRENDING_HALF_LIFE_HOURS, writes it to
+the indexed trending_score columns and drops buckets that have left the
+window. ?trending=1 is then an ORDER BY on that index.
+"""
+import atexit
+import logging
+import math
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Product, Restaurant, TrendingCounter
+
+logger = logging.getLogger(__name__)
+
+BUCKET_SECONDS = 3600
+
+
+def bucket_start(when):
+    epoch = int(when.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % BUCKET_SECONDS, tz=when.tzinfo)
+
+
+def _increment(scope, object_id, bucket, **counts):
+    counters = TrendingCounter.objects.filter(scope=scope, object_id=object_id, bucket=bucket)
+    changes = {name: F(name) + n for name, n in counts.items()}
+    if counters.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            TrendingCounter.objects.create(scope=scope, object_id=object_id, bucket=bucket, **counts)
+    except IntegrityError:
+        # Bucket created concurrently by another order or view
+        counters.update(**changes)
+
+
+def record_order(lines, when=None):
+    """Count one order of [(product_id, restaurant_id), ...]: once per product and once per restaurant."""
+    bucket = bucket_start(when or timezone.now())
+    products = sorted({product_id for product_id, _ in lines})
+    restaurants = sorted({restaurant_id for _, restaurant_id in lines if restaurant_id})
+    # Fixed order so concurrent orders lock shared rows in the same sequence.
+    for product_id in products:
+        _increment('product', product_id, bucket, orders=1)
+    for restaurant_id in restaurants:
+        _increment('restaurant', restaurant_id, bucket, orders=1)
+
+
+class ViewBuffer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.timer = None
+
+    def add(self, keys):
+        with self.lock:
+            self.counts.update(keys)
+            due = len(self.counts) >= settings.TRENDING_VIEW_BATCH_SIZE
+            if not due and self.timer is None:
+                # Also written when no further view arrives to trigger it.
+                self.timer = threading.Timer(settings.TRENDING_VIEW_FLUSH_SECONDS, self._flush_in_background)
+                self.timer.daemon = True
+                self.timer.start()
+        if due:
+            self.flush()
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if not counts:
+            return 0
+        try:
+            # Sorted so concurrent flushes lock shared rows in the same sequence.
+            with transaction.atomic():
+                for (scope, object_id, bucket), views in sorted(counts.items()):
+                    _increment(scope, object_id, bucket, views=views)
+        except Exception:
+            # Trending must never fail the request that triggered the flush.
+            logger.exception('Dropped %d trending views', sum(counts.values()))
+            return 0
+        return sum(counts.values())
+
+
+_views = ViewBuffer()
+atexit.register(_views.flush)
+
+
+def record_view(product_id, restaurant_id=None, when=None):
+    bucket = bucket_start(when or timezone.now())
+    keys = [('product', product_id, bucket)]
+    if restaurant_id:
+        keys.append(('restaurant', restaurant_id, bucket))
+    _views.add(keys)
+
+
+def flush_views():
+    """Write the views this worker has counted so far; returns how many."""
+    return _views.flush()
+
+
+def scores(now=None):
+    """{(scope, object_id): decayed score} over the window."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(hours=settings.TRENDING_WINDOW_HOURS)
+    decay = math.log(2) / (settings.TRENDING_HALF_LIFE_HOURS * 3600)
+    totals = Counter()
+    rows = TrendingCounter.objects.filter(bucket__gte=cutoff).values_list('scope', 'object_id', 'bucket', 'orders', 'views')
+    for scope, object_id, bucket, orders, views in rows.iterator():
+        age = max(0.0, (now - bucket).total_seconds())
+        activity = orders * settings.TRENDING_ORDER_WEIGHT + views * settings.TRENDING_VIEW_WEIGHT
+        totals[(scope, object_id)] += activity * math.exp(-decay * age)
+    return totals
+
+
+def _write(model, new_scores, batch_size=500):
+    # Everything that was trending and no longer is goes back to zero.
+    stale = set(model.objects.filter(trending_score__gt=0).values_list('id', flat=True)) - set(new_scores)
+    for start in range(0, len(stale), batch_size):
+        model.objects.filter(id__in=sorted(stale)[start:start + batch_size]).update(trending_score=0)
+    objs = [model(id=pk, trending_score=score) for pk, score in new_scores.items()]
+    model.objects.bulk_update(objs, ['trending_score'], batch_size=batch_size)
+
+
+def refresh(now=None):
+    """Recompute trending scores and prune old buckets. Returns (products, restaurants) now trending."""
+    now = now or timezone.now()
+    by_scope = defaultdict(dict)
+    for (scope, object_id), score in scores(now).items():
+        by_scope[scope][object_id] = round(score, 6)
+
+    # Counters of deleted products or restaurants simply match no row.
+    with transaction.atomic():
+        _write(Product, by_scope['product'])
+        _write(Restaurant, by_scope['restaurant'])
+    TrendingCounter.objects.filter(bucket__lt=now - timedelta(hours=settings.TRENDING_WINDOW_HOURS)).delete()
+    return len(by_scope['product']), len(by_scope['restaurant'])
@@ -0,0 +1,187 @@
+"""
+Resumable, chunked reel uploads.
+
+1. POST /api/reel-uploads/ with the reel's fields plus `filename` and `size`
+   creates a session and an empty part file under REEL_UPLOAD_DIR.
+   An optional `sha256` of the whole file is checked at finalize.
+2. PUT /api/reel-uploads/<id>/ with `Upload-Offset: <bytes received so far>`
+   and a raw chunk as the body appends it. The body is copied from the socket
+   in small blocks, never held in memory, and no database lock is held while
+   it arrives. A wrong offset gets 409 with the right one in Upload-Offset;
+   after a dropped connection, GET the session to learn where to resume.
+3. POST /api/reel-uploads/<id>/finalize/ once every byte has arrived stores the
+   file in media storage and creates the Reel in one transaction. The part
+   file is only removed once that commits, so a rolled-back finalize can be
+   retried. Repeating it returns the same reel.
+
+Sessions that are never finalized are removed by purge_reel_uploads.
+"""
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.http.request import UnreadablePostError
+from django.utils import timezone
+
+from .models import Reel, ReelUpload
+
+BLOCK_SIZE = 64 * 1024
+
+
+class OffsetMismatch(Exception):
+    def __init__(self, expected):
+        super().__init__(f'Expected Upload-Offset {expected}')
+        self.expected = expected
+
+
+class ChecksumMismatch(Exception):
+    def __init__(self, expected, actual):
+        super().__init__(f'Expected SHA-256 {expected}, received {actual}')
+        self.expected = expected
+        self.actual = actual
+
+
+class _PartFile(File):
+    # Lets the storage move the finished part into place instead of copying it.
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def part_path(upload):
+    return os.path.join(settings.REEL_UPLOAD_DIR, f'{upload.pk}.part')
+
+
+def start(upload):
+    os.makedirs(settings.REEL_UPLOAD_DIR, exist_ok=True)
+    open(part_path(upload), 'wb').close()
+
+
+def append_chunk(upload_id, offset, stream, length):
+    """
+    Append up to `length` bytes from `stream` at `offset`, which must equal the
+    bytes already received. Returns the session with its new offset. Whatever
+    arrived before a dropped connection is kept, so the client resumes after it.
+
+    No lock is held while the body comes off the socket: it goes to a chunk file
+    of its own, and only the final UPDATE ... WHERE received=<offset> that claims
+    the offset locks the row, for as long as it takes to copy the chunk into
+    the part file on local disk. Of two requests racing for one offset (a retry
+    and the original), the first to get there wins and the other gets a mismatch.
+    """
+    upload = ReelUpload.objects.get(pk=upload_id)
+    if offset != upload.received:
+        raise OffsetMismatch(upload.received)
+
+    fd, chunk_path = tempfile.mkstemp(prefix=f'{upload.pk}.', suffix='.chunk', dir=settings.REEL_UPLOAD_DIR)
+    try:
+        with os.fdopen(fd, 'w+b') as chunk:
+            remaining = min(length, upload.size - offset)
+            try:
+                while remaining > 0:
+                    block = stream.read(min(BLOCK_SIZE, remaining))
+                    if not block:
+                        break
+                    chunk.write(block)
+                    remaining -= len(block)
+            except (UnreadablePostError, OSError):
+                pass
+            received = offset + chunk.tell()
+
+            with transaction.atomic():
+                claimed = ReelUpload.objects.filter(pk=upload.pk, received=offset, reel__isnull=True).update(received=received)
+                if not claimed:
+                    raise OffsetMismatch(ReelUpload.objects.values_list('received', flat=True).get(pk=upload.pk))
+                # The row stays locked until the bytes are in place; a failure here rolls the offset back.
+                chunk.seek(0)
+                with open(part_path(upload), 'r+b') as f:
+                    f.seek(offset)
+                    # Drop bytes from an earlier attempt that were written but never recorded.
+                    f.truncate()
+                    shutil.copyfileobj(chunk, f, BLOCK_SIZE)
+                    f.flush()
+                    os.fsync(f.fileno())
+    finally:
+        _remove(chunk_path)
+    upload.received = received
+    return upload
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _handoff(path):
+    """A second name for the part file for the storage to consume, leaving `path` in place."""
+    handoff = f'{path}.finalizing'
+    if os.path.exists(handoff):
+        os.remove(handoff)
+    try:
+        os.link(path, handoff)
+    except OSError:
+        shutil.copyfile(path, handoff)
+    return handoff
+
+
+def _remove(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def finalize(upload_id):
+    """
+    The Reel for a fully received upload, creating it on the first call. If the
+    client declared a sha256 the part file must match it; it is hashed before
+    the row is locked, since a complete upload no longer changes.
+    """
+    upload = ReelUpload.objects.get(pk=upload_id)
+    if upload.reel_id is None and upload.sha256:
+        actual = file_digest(part_path(upload))
+        if actual != upload.sha256:
+            raise ChecksumMismatch(upload.sha256, actual)
+
+    with transaction.atomic():
+        upload = ReelUpload.objects.select_for_update().get(pk=upload_id)
+        if upload.reel_id is not None:
+            return upload.reel
+        path = part_path(upload)
+        handoff = _handoff(path)
+        try:
+            with open(handoff, 'rb') as f:
+                reel = Reel(
+                    product_id=upload.product_id,
+                    restaurant_id=upload.restaurant_id,
+                    caption=upload.caption,
+                    is_highlight=upload.is_highlight,
+                )
+                reel.video.save(upload.filename, _PartFile(f, name=upload.filename), save=False)
+                reel.save()
+        finally:
+            # Consumed by the storage unless it failed first
+            _remove(handoff)
+        upload.reel = reel
+        upload.save(update_fields=['reel'])
+        transaction.on_commit(lambda: _remove(path))
+    return reel
+
+
+def abort(upload):
+    _remove(part_path(upload))
+    # Chunk files a crashed append left behind
+    for path in glob.glob(os.path.join(settings.REEL_UPLOAD_DIR, f'{upload.pk}.*.chunk')):
+        _remove(path)
+    upload.delete()
+
+
+def expired():
+    cutoff = timezone.now() - timedelta(seconds=settings.REEL_UPLOAD_TTL)
+    return ReelUpload.objects.filter(reel__isnull=True, created_at__lt=cutoff)
@@ -1,4 +1,5 @@
 
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import (
@@ -8,7 +9,9 @@ from rest_framework_simplejwt.views import (
 from .views import (
     CategoryViewSet, ProductViewSet, OrderViewSet, 
     RegisterView, UserProfileView, GoogleLoginView, UserViewSet,
-    ReelViewSet, RestaurantViewSet
+    ReelViewSet, RestaurantViewSet, PromotionViewSet,
+    ProfileListView, ProfileDetailView, CartQuoteView, ReelUploadViewSet,
+    MediaIngestView, SearchSuggestView
 )
 
 router = DefaultRouter()
@@ -18,6 +21,8 @@ router.register(r'products', ProductViewSet)
 router.register(r'orders', OrderViewSet, basename='order')
 router.register(r'users', UserViewSet)
 router.register(r'reels', ReelViewSet)
+router.register(r'promotions', PromotionViewSet)
+router.register(r'reel-uploads', ReelUploadViewSet, basename='reel-upload')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -26,4 +31,21 @@ urlpatterns = [
     path('auth/google/', GoogleLoginView.as_view(), name='google_login'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/profile/', UserProfileView.as_view(), name='profile'),
+    path('cart/quote/', CartQuoteView.as_view(), name='cart_quote'),
+    path('search/suggest/', SearchSuggestView.as_view(), name='search_suggest'),
+    path('media/ingest/', MediaIngestView.as_view(), name='media_ingest'),
+    path('profiles/', ProfileListView.as_view(), name='request_profiles'),
+    path('profiles/<str:profile_id>/', ProfileDetailView.as_view(), name='request_profile'),
 ]
+
+if settings.ASYNC_CATALOG:
+    # ASGI mode: serve the hot catalog reads from async views, ahead of the router
+    from . import async_views
+    urlpatterns = [
+        path('restaurants/', async_views.restaurant_list, name='restaurant-list'),
+        path('restaurants/<pk>/', async_views.restaurant_detail, name='restaurant-detail'),
+        path('products/', async_views.product_list, name='product-list'),
+        path('products/<pk>/', async_views.product_detail, name='product-detail'),
+        path('reels/', async_views.reel_list, name='reel-list'),
+        path('reels/<pk>/', async_views.reel_detail, name='reel-detail'),
+    ] + urlpatterns
@@ -1,14 +1,35 @@
 
-from intasend import APIService
+from functools import partial
+
 from django.conf import settings
 
+
+def _send_request(client, request_type, service_endpoint, payload, noauth=False):
+    """intasend's APIBase.send_request, with a timeout: the SDK sets none, so a stalled gateway would hang the worker."""
+    import requests
+    from intasend.client import get_service_url
+    from intasend.exceptions import IntaSendBadRequest, IntaSendNotAllowed, IntaSendServerError, IntaSendUnauthorized
+
+    resp = requests.request(
+        request_type, get_service_url(service_endpoint, client.test), json=payload,
+        headers=client.get_headers(noauth), timeout=settings.INTASEND_TIMEOUT,
+    )
+    errors = {400: IntaSendBadRequest, 403: IntaSendNotAllowed, 500: IntaSendServerError, 401: IntaSendUnauthorized}
+    if resp.status_code in errors:
+        raise errors[resp.status_code](resp.text)
+    return resp.json()
+
+
 class IntaSendService:
     def __init__(self):
+        # Imported on first payment rather than at worker start
+        from intasend import APIService
         self.service = APIService(
             token=settings.INTASEND_SECRET_KEY,
             publishable_key=settings.INTASEND_PUBLISHABLE_KEY,
             test=settings.INTASEND_TEST_MODE
         )
+        self.service.collect.send_request = partial(_send_request, self.service.collect)
 
     def trigger_stk_push(self, phone_number, amount, narrative="Food Order Payment"):
         """
@@ -1,19 +1,103 @@
 
-from rest_framework import viewsets, permissions, status, generics
+import hmac
+from collections import Counter
+from decimal import Decimal
+
+from rest_framework import viewsets, permissions, status, generics, serializers, mixins
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import Category, Product, Order, Reel, SavedReel, Restaurant
+from datetime import timedelta
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Category, Product, Order, ArchivedOrder, Reel, ReelUpload, SavedReel, Restaurant, Promotion, RelatedProduct, ReelEvent
 from .serializers import (
     CategorySerializer, ProductSerializer, OrderSerializer, 
     RegisterSerializer, UserSerializer, CreateOrderSerializer,
-    ReelSerializer, SavedReelSerializer, RestaurantSerializer
+    ReelSerializer, SavedReelSerializer, RestaurantSerializer,
+    PromotionSerializer, ArchivedOrderSerializer, CartQuoteSerializer, QuoteSerializer,
+    ReelUploadSerializer,
 )
+from .promotions import get_active_promotions
+from .geo import nearby
+from .menus import get_menu
+from .trending import record_view
+from . import engagement, uploads
+from .idempotency import idempotent
+from .metrics import get_store, render as render_metrics
+from .pricing import CENTS, UnknownProducts, quote
+from .profiling import load_profile, recent_profiles
+from .streaming import StreamingListMixin
+from .suggest import suggest
 
 from rest_framework_simplejwt.tokens import RefreshToken
 
 User = get_user_model()
 
+# Query-param filtering shared by the viewsets and the async catalog views (api.async_views)
+
+def filter_restaurants(queryset, params):
+    featured = params.get('featured')
+    if featured:
+        promotions = get_active_promotions()
+        queryset = queryset.filter(Q(is_featured_campaign=True) | Q(id__in=promotions.featured_restaurant_ids))
+    if params.get('trending'):
+        queryset = queryset.filter(trending_score__gt=0).order_by('-trending_score', 'id')
+    return queryset
+
+def parse_near(params):
+    """?near=lat,lng&radius=km -> (lat, lng, radius_km), or None when not requested."""
+    near = params.get('near')
+    if not near:
+        return None
+    try:
+        lat, lng = (float(v) for v in near.split(','))
+        radius = float(params.get('radius', 5))
+    except ValueError:
+        raise serializers.ValidationError({'near': 'Expected near=lat,lng and a numeric radius in km'})
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180) or not 0 < radius <= 100:
+        raise serializers.ValidationError({'near': 'Coordinates out of range or radius not in (0, 100] km'})
+    return lat, lng, radius
+
+def filter_products(queryset, params):
+    category = params.get('category')
+    restaurant = params.get('restaurant')
+    search = params.get('search')
+    promoted = params.get('promoted')
+    hot = params.get('hot')
+    trending = params.get('trending')
+    
+    if category:
+        queryset = queryset.filter(category_id=category)
+    if restaurant:
+        queryset = queryset.filter(restaurant_id=restaurant)
+    if search:
+        queryset = queryset.filter(name__icontains=search)
+    if promoted:
+        # Scheduled promotions come from the precomputed active set, not a per-row time check
+        promotions = get_active_promotions()
+        queryset = queryset.filter(
+            Q(is_promoted=True) | Q(id__in=promotions.product_ids) | Q(restaurant_id__in=promotions.restaurant_ids)
+        )
+    if hot:
+        promotions = get_active_promotions()
+        queryset = queryset.filter(Q(is_hot=True) | Q(id__in=promotions.hot_product_ids))
+    if trending:
+        queryset = queryset.filter(trending_score__gt=0).order_by('-trending_score', 'id')
+    return queryset
+
+def filter_reels(queryset, params):
+    restaurant = params.get('restaurant')
+    if restaurant:
+        queryset = queryset.filter(restaurant_id=restaurant)
+    return queryset
+
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (permissions.AllowAny,)
@@ -39,8 +123,8 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     def get_object(self):
         return self.request.user
 
-class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+class UserViewSet(StreamingListMixin, viewsets.ModelViewSet):
+    queryset = User.objects.order_by('id')
     serializer_class = UserSerializer
     permission_classes = (permissions.IsAdminUser,)
 
@@ -49,6 +133,23 @@ class RestaurantViewSet(viewsets.ModelViewSet):
     serializer_class = RestaurantSerializer
     permission_classes = (permissions.AllowAny,) # Update based on requirements, potentially IsAdminUser for write operations
 
+    def get_queryset(self):
+        return filter_restaurants(Restaurant.objects.all(), self.request.query_params)
+
+    def list(self, request, *args, **kwargs):
+        near = parse_near(request.query_params)
+        if near is None:
+            return super().list(request, *args, **kwargs)
+        restaurants = nearby(self.filter_queryset(self.get_queryset()), *near)
+        return Response(self.get_serializer(restaurants, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def menu(self, request, pk=None):
+        try:
+            return Response(get_menu(int(pk)))
+        except (ValueError, Restaurant.DoesNotExist):
+            return Response({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
+
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
@@ -61,36 +162,124 @@ class CategoryViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(restaurant_id=restaurant)
         return queryset
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(StreamingListMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = (permissions.AllowAny,)
     
     def get_queryset(self):
-        queryset = Product.objects.all()
-        category = self.request.query_params.get('category')
-        restaurant = self.request.query_params.get('restaurant')
-        search = self.request.query_params.get('search')
-        
-        if category:
-            queryset = queryset.filter(category_id=category)
-        if restaurant:
-            queryset = queryset.filter(restaurant_id=restaurant)
-        if search:
-            queryset = queryset.filter(name__icontains=search)
-        return queryset
+        return filter_products(Product.objects.select_related('restaurant').order_by('id'), self.request.query_params)
 
-class OrderViewSet(viewsets.ModelViewSet):
+    def retrieve(self, request, *args, **kwargs):
+        product = self.get_object()
+        record_view(product.id, product.restaurant_id)
+        return Response(self.get_serializer(product).data)
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        # 404 for an unknown or malformed id rather than an empty list or a 500.
+        product = self.get_object()
+        entries = RelatedProduct.objects.filter(product_id=product.id).select_related('related__restaurant')
+        return Response(self.get_serializer([entry.related for entry in entries], many=True).data)
+
+class PromotionViewSet(viewsets.ModelViewSet):
+    queryset = Promotion.objects.all()
+    serializer_class = PromotionSerializer
+    permission_classes = (permissions.IsAdminUser,)
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
+    def active(self, request):
+        promotions = get_active_promotions()
+        return Response({
+            'product_discounts': {str(k): v for k, v in promotions.product_discounts.items()},
+            'restaurant_discounts': {str(k): v for k, v in promotions.restaurant_discounts.items()},
+            'hot_product_ids': sorted(promotions.hot_product_ids),
+            'featured_restaurant_ids': sorted(promotions.featured_restaurant_ids),
+            'valid_until': promotions.valid_until,
+        })
+
+class OrderPagination(CursorPagination):
+    # Newest first; a cursor stays cheap however deep the client pages.
+    ordering = ('-created_at', '-id')
+    page_size = settings.ORDER_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Opt-in, so clients of the plain list keep getting a plain list.
+        if 'cursor' not in request.query_params and self.page_size_query_param not in request.query_params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+def order_stats(querysets, days):
+    """Count, revenue and status counts over `querysets`, plus revenue for the last `days` days that had orders."""
+    count, revenue, by_status, by_day = 0, Decimal('0'), Counter(), {}
+    for queryset in querysets:
+        queryset = queryset.order_by()
+        totals = queryset.aggregate(n=Count('id'), revenue=Sum('total_amount'))
+        count += totals['n']
+        revenue += totals['revenue'] or 0
+        by_status.update(dict(queryset.values_list('status').annotate(n=Count('id'))))
+        rows = queryset.annotate(day=TruncDate('created_at')).values('day').annotate(n=Count('id'), revenue=Sum('total_amount'))
+        for row in rows.order_by('-day')[:days]:
+            orders, total = by_day.get(row['day'], (0, Decimal('0')))
+            by_day[row['day']] = (orders + row['n'], total + row['revenue'])
+    return {
+        'count': count,
+        'revenue': str(revenue.quantize(CENTS)),
+        'by_status': dict(by_status),
+        'revenue_by_day': [
+            {'date': day.isoformat(), 'orders': orders, 'revenue': str(total.quantize(CENTS))}
+            for day, (orders, total) in sorted(by_day.items())[-days:]
+        ],
+    }
+
+
+class OrderViewSet(StreamingListMixin, viewsets.ModelViewSet):
     permission_classes = (permissions.IsAuthenticated,)
     serializer_class = OrderSerializer
+    pagination_class = OrderPagination
+
+    def get_throttles(self):
+        if self.action == 'create':
+            self.throttle_scope = 'order_create'
+        return super().get_throttles()
 
     def get_queryset(self):
+        # Recent orders by default; ?archive=only pages through the archive (api.archive) instead.
+        model = ArchivedOrder if self.request.query_params.get('archive') == 'only' else Order
+        return self.scoped(model)
+
+    def scoped(self, model):
         user = self.request.user
+        queryset = model.objects.prefetch_related('items__product').order_by('-created_at', '-id')
         if user.is_staff or user.is_superuser:
-            return Order.objects.all().order_by('-created_at')
-        return Order.objects.filter(user=user).order_by('-created_at')
+            return queryset
+        return queryset.filter(user=user)
+
+    def get_serializer_class(self):
+        if self.request.query_params.get('archive') == 'only':
+            return ArchivedOrderSerializer
+        return super().get_serializer_class()
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            order = get_object_or_404(self.scoped(ArchivedOrder), pk=kwargs['pk'])
+            return Response(ArchivedOrderSerializer(order, context=self.get_serializer_context()).data)
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """Dashboard totals over recent and archived orders, aggregated in the database."""
+        return Response(order_stats([self.scoped(Order), self.scoped(ArchivedOrder)], settings.ORDER_STATS_DAYS))
 
     def create(self, request, *args, **kwargs):
+        # Retries carrying the same Idempotency-Key get the first response back.
+        return idempotent(request, lambda: self._create_order(request))
+
+    def _create_order(self, request):
         serializer = CreateOrderSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         order = serializer.save()
@@ -101,6 +290,7 @@ class ReelViewSet(viewsets.ModelViewSet):
     queryset = Reel.objects.all().order_by('-is_highlight', '-created_at')
     serializer_class = ReelSerializer
     permission_classes = (permissions.AllowAny,) # Allow viewing by anyone, adjust if needed (e.g., ReadOnly for public)
+    throttle_scope = None  # set per action, see view()
 
     def get_parsers(self):
         if hasattr(self, 'action') and self.action in ['create', 'update', 'partial_update']:
@@ -109,19 +299,39 @@ class ReelViewSet(viewsets.ModelViewSet):
         return super().get_parsers()
 
     def get_queryset(self):
-        queryset = Reel.objects.all().order_by('-is_highlight', '-created_at')
-        restaurant = self.request.query_params.get('restaurant')
-        if restaurant:
-             queryset = queryset.filter(restaurant_id=restaurant)
-        return queryset
+        return filter_reels(Reel.objects.all().order_by('-is_highlight', '-created_at'), self.request.query_params)
 
-    @action(detail=True, methods=['post'], permission_classes=[permissions.AllowAny]) # Ideally IsAuthenticated
+    @action(detail=True, methods=['post'], permission_classes=[permissions.AllowAny], throttle_scope='reel_view') # Ideally IsAuthenticated
     def view(self, request, pk=None):
         reel = self.get_object()
         reel.views += 1
-        reel.save()
+        reel.save(update_fields=['views'])
+        record_view(reel.product_id, reel.restaurant_id or reel.product.restaurant_id)
+        engagement.record(reel.id, ReelEvent.VIEW, request.user)
         return Response({'views': reel.views})
 
+    @action(detail=True, methods=['post'], permission_classes=[permissions.AllowAny], throttle_scope='reel_view')
+    def order_click(self, request, pk=None):
+        reel = self.get_object()
+        engagement.record(reel.id, ReelEvent.ORDER_CLICK, request.user)
+        return Response({'product': reel.product_id})
+
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAdminUser], url_path='engagement')
+    def engagement_series(self, request, pk=None):
+        reel = self.get_object()
+        period = request.query_params.get('period', 'day')
+        if period not in ('hour', 'day'):
+            return Response({'error': 'period must be hour or day'}, status=status.HTTP_400_BAD_REQUEST)
+        until = parse_datetime(request.query_params.get('until', '')) or timezone.now()
+        since = parse_datetime(request.query_params.get('since', '')) or until - timedelta(days=2 if period == 'hour' else 30)
+        return Response({
+            'reel': reel.id,
+            'period': period,
+            'since': since,
+            'until': until,
+            'series': engagement.series(reel.id, period, since, until),
+        })
+
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def toggle_save(self, request, pk=None):
         reel = self.get_object()
@@ -131,11 +341,12 @@ class ReelViewSet(viewsets.ModelViewSet):
         
         if not created:
             saved_item.delete()
+            engagement.record(reel.id, ReelEvent.UNSAVE, user)
             return Response({'status': 'unsaved'})
         
+        engagement.record(reel.id, ReelEvent.SAVE, user)
         return Response({'status': 'saved'})
 
-import requests
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
@@ -147,46 +358,45 @@ logger = logging.getLogger(__name__)
 
 class GoogleLoginView(APIView):
     permission_classes = (permissions.AllowAny,)
+    throttle_scope = 'google_login'
 
     def post(self, request):
+        import requests  # only this view calls out over HTTP
+
         token = request.data.get('token')
         if not token:
             return Response({'error': 'Token is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        print(f"Received token: {token[:20]}...")
-
         user_data = None
         
+        # Nothing logged here may contain the token: requests puts the URL, token
+        # included, in its exception messages, so only their type is logged.
         # 1. Try as Access Token (UserInfo Endpoint)
         try:
-            print("Trying UserInfo endpoint...")
             response = requests.get(
                 'https://www.googleapis.com/oauth2/v3/userinfo',
                 params={'access_token': token}
             )
             if response.status_code == 200:
                 user_data = response.json()
-                print("UserInfo success")
             else:
-                print(f"UserInfo failed: {response.status_code} {response.text}")
+                logger.info('Google userinfo rejected the token (%s)', response.status_code)
         except Exception as e:
-            print(f"UserInfo exception: {e}")
+            logger.warning('Google userinfo request failed: %s', type(e).__name__)
 
         # 2. If failed, try as ID Token (TokenInfo Endpoint)
         if not user_data:
             try:
-                print("Trying TokenInfo endpoint...")
                 response = requests.get(
                     'https://oauth2.googleapis.com/tokeninfo',
                     params={'id_token': token}
                 )
                 if response.status_code == 200:
                     user_data = response.json()
-                    print("TokenInfo success")
                 else:
-                    print(f"TokenInfo failed: {response.status_code} {response.text}")
+                    logger.info('Google tokeninfo rejected the token (%s)', response.status_code)
             except Exception as e:
-                print(f"TokenInfo exception: {e}")
+                logger.warning('Google tokeninfo request failed: %s', type(e).__name__)
 
         if not user_data:
             return Response({'error': 'Invalid token. Could not verify with Google.'}, status=status.HTTP_400_BAD_REQUEST)
@@ -197,9 +407,7 @@ class GoogleLoginView(APIView):
 
         try:
             user = User.objects.get(email=email)
-            print(f"Found existing user: {email}")
         except User.DoesNotExist:
-            print(f"Creating new user: {email}")
             first_name = user_data.get('given_name', '')
             last_name = user_data.get('family_name', '')
             user = User.objects.create_user(
@@ -209,6 +417,7 @@ class GoogleLoginView(APIView):
                 last_name=last_name,
                 password=User.objects.make_random_password()
             )
+            logger.info('Created user %s from a Google sign-in', user.pk)
 
         refresh = RefreshToken.for_user(user)
         
@@ -217,3 +426,131 @@ class GoogleLoginView(APIView):
             'refresh': str(refresh),
             'access': str(refresh.access_token),
         })
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    counters, histograms = get_store().collect()
+    return HttpResponse(render_metrics(counters, histograms), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+class ProfileListView(APIView):
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return Response(recent_profiles())
+
+
+class ProfileDetailView(APIView):
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request, profile_id):
+        profile = load_profile(profile_id)
+        if profile is None:
+            return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(profile)
+
+class CartQuoteView(APIView):
+    """Price a whole cart in one round trip, using the same rules as order creation."""
+    permission_classes = (permissions.AllowAny,)
+
+    def post(self, request):
+        serializer = CartQuoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            cart = quote(serializer.validated_data['items'], serializer.validated_data.get('delivery_address'))
+        except UnknownProducts as exc:
+            return Response({'items': str(exc), 'unknown_ids': exc.ids}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(QuoteSerializer(cart).data)
+
+class ReelUploadViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """Resumable chunked reel uploads; see api.uploads for the protocol."""
+    serializer_class = ReelUploadSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get_queryset(self):
+        return ReelUpload.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        uploads.start(serializer.save(user=self.request.user))
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        response['Upload-Offset'] = response.data['received']
+        return response
+
+    def update(self, request, *args, **kwargs):
+        upload = self.get_object()
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return Response({'error': 'Upload-Offset and Content-Length headers are required'}, status=status.HTTP_400_BAD_REQUEST)
+        if length > settings.REEL_UPLOAD_CHUNK_MAX_BYTES:
+            return Response({'error': f'Chunks must be at most {settings.REEL_UPLOAD_CHUNK_MAX_BYTES} bytes'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        if upload.reel_id is not None:
+            return Response({'error': 'Upload already finalized'}, status=status.HTTP_409_CONFLICT)
+        try:
+            # The raw body, read straight from the socket; request.data would buffer it.
+            upload = uploads.append_chunk(upload.pk, offset, request._request, length)
+        except uploads.OffsetMismatch as exc:
+            response = Response({'error': str(exc), 'received': exc.expected}, status=status.HTTP_409_CONFLICT)
+            response['Upload-Offset'] = exc.expected
+            return response
+        response = Response(self.get_serializer(upload).data)
+        response['Upload-Offset'] = upload.received
+        return response
+
+    def perform_destroy(self, instance):
+        uploads.abort(instance)
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        upload = self.get_object()
+        if upload.received != upload.size:
+            return Response(
+                {'error': f'Received {upload.received} of {upload.size} bytes', 'received': upload.received},
+                status=status.HTTP_409_CONFLICT,
+            )
+        try:
+            reel = uploads.finalize(upload.pk)
+        except uploads.ChecksumMismatch as exc:
+            # The bytes on disk are wrong somewhere; the client starts over with a new session.
+            return Response({'error': str(exc), 'sha256': exc.actual}, status=status.HTTP_409_CONFLICT)
+        return Response(ReelSerializer(reel, context={'request': request}).data, status=status.HTTP_201_CREATED)
+
+
+class MediaIngestView(APIView):
+    """Staff: pull remote image/video URLs into local storage (see api.ingest)."""
+    permission_classes = (permissions.IsAdminUser,)
+
+    def post(self, request):
+        from .ingest import find_remote, ingest
+
+        models = request.data.get('models') or None
+        try:
+            limit = min(int(request.data.get('limit', settings.INGEST_REQUEST_LIMIT)), settings.INGEST_REQUEST_LIMIT)
+        except (TypeError, ValueError):
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        by_url = find_remote(models, limit)
+        results, attached = ingest(by_url)
+        return Response({
+            'downloaded': [{'url': r.url, 'name': r.name, 'fields': len(r.targets)} for r in results if r.name],
+            'failed': [{'url': r.url, 'error': r.error} for r in results if r.error],
+            'attached': attached,
+            'remaining': bool(find_remote(models, 1)),
+        })
+
+
+class SearchSuggestView(APIView):
+    permission_classes = (permissions.AllowAny,)
+
+    def get(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 8)), 20))
+        except ValueError:
+            limit = 8
+        return Response(suggest(request.query_params.get('q', ''), limit))
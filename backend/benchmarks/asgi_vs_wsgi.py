@@ -0,0 +1,192 @@
+"""
+Compare the sync WSGI deployment with the ASGI one (uvicorn workers + async
+catalog views) under many concurrent connections.
+
+Both servers are started with gunicorn.conf.py exactly as in production, pointed
+at the benchmark SQLite database. For each concurrency level an asyncio client
+holds that many keep-alive connections open against the catalog endpoints, and
+we record throughput, latency percentiles and worker RSS growth per connection.
+
+    python benchmarks/asgi_vs_wsgi.py --scale 10 --workers 2 --concurrency 10 50 200 --output asgi.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from loadtest import BACKEND_DIR, percentile, seed, setup_django, git_revision
+
+PATHS = ['/api/restaurants/', '/api/products/', '/api/reels/']
+
+
+def rss_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def worker_pids(master_pid):
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                if int(f.read().rsplit(')', 1)[1].split()[1]) == master_pid:
+                    pids.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return pids
+
+
+def workers_rss_kb(master_pid):
+    return sum(rss_kb(pid) for pid in worker_pids(master_pid))
+
+
+def start_gunicorn(mode, port, workers, db_path, **extra_env):
+    env = dict(os.environ, SERVER_MODE=mode, SQLITE_PATH=db_path, DEBUG='False',
+               GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_WORKERS=str(workers), **extra_env)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            asyncio.run(fetch_once('127.0.0.1', port, '/api/restaurants/'))
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            key, value = line.split(':', 1)
+            headers[key.strip().lower()] = value.strip()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    else:
+        await reader.read()
+    return status, headers.get('connection', '').lower() == 'close' or 'content-length' not in headers
+
+
+async def fetch_once(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n'.encode())
+    await writer.drain()
+    await read_response(reader)
+    writer.close()
+
+
+async def connection_loop(host, port, deadline, latencies, errors, index):
+    reader = writer = None
+    i = index
+    while time.monotonic() < deadline:
+        path = PATHS[i % len(PATHS)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: keep-alive\r\n\r\n'.encode())
+            await writer.drain()
+            status, closed = await read_response(reader)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if status >= 400:
+                errors.append(status)
+            if closed:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, IndexError, ValueError):
+            errors.append(0)
+            writer = None
+            await asyncio.sleep(0.05)
+    if writer is not None:
+        writer.close()
+
+
+async def run_level(port, concurrency, duration, master_pid):
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    peak = {'rss': 0}
+
+    async def sample_memory():
+        while time.monotonic() < deadline:
+            peak['rss'] = max(peak['rss'], workers_rss_kb(master_pid))
+            await asyncio.sleep(0.25)
+
+    started = time.monotonic()
+    await asyncio.gather(
+        sample_memory(),
+        *(connection_loop('127.0.0.1', port, deadline, latencies, errors, i) for i in range(concurrency)),
+    )
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 50) or 0, 2),
+        'p95_ms': round(percentile(latencies, 95) or 0, 2),
+        'p99_ms': round(percentile(latencies, 99) or 0, 2),
+        'peak_rss_kb': peak['rss'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', default=os.path.join(BACKEND_DIR, 'benchmarks', 'bench.sqlite3'))
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--output', default='bench-asgi.json')
+    args = parser.parse_args()
+
+    setup_django(args.db, use_settings_db=False)
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    seed(args.scale, args.seed)
+
+    report = {'revision': git_revision(), 'config': vars(args), 'modes': {}}
+    for mode in ('wsgi', 'asgi'):
+        process = start_gunicorn(mode, args.port, args.workers, args.db)
+        try:
+            idle_rss = workers_rss_kb(process.pid)
+            levels = {}
+            for concurrency in args.concurrency:
+                stats = asyncio.run(run_level(args.port, concurrency, args.duration, process.pid))
+                stats['rss_per_connection_kb'] = round(max(0, stats['peak_rss_kb'] - idle_rss) / concurrency, 1)
+                levels[str(concurrency)] = stats
+                print(f"{mode} c={concurrency:<5} rps={stats['throughput_rps']:>8} p50={stats['p50_ms']:>8}ms "
+                      f"p99={stats['p99_ms']:>9}ms rss/conn={stats['rss_per_connection_kb']}KB errors={stats['errors']}")
+            report['modes'][mode] = {'idle_rss_kb': idle_rss, 'levels': levels}
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=30)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Wrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""
+Measure how long a worker takes to become useful, and what it costs in memory.
+
+Process mode starts fresh interpreters against the benchmark SQLite database and
+times `import matrix_backend.wsgi` followed by the first and second request to
+each catalog endpoint through the real WSGI application, with the startup
+warm-up on and off (APP_WARM_UP). The slowest imports, from `-X importtime`,
+are listed alongside.
+
+Gunicorn mode starts gunicorn.conf.py with the app preloaded in the master and
+without (GUNICORN_PRELOAD) and records the time to the first response, the
+latency of the first requests the workers serve, and each worker's RSS, PSS and
+shared memory from /proc/<pid>/smaps_rollup.
+
+    python benchmarks/coldstart.py --scale 2 --runs 5 --workers 4 --output coldstart.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from loadtest import BACKEND_DIR, percentile, seed, setup_django, git_revision
+from asgi_vs_wsgi import PATHS, fetch_once, start_gunicorn, worker_pids
+
+# Runs in the fresh interpreter; prints one JSON line of timings in ms.
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from matrix_backend.wsgi import application
+imported = time.perf_counter()
+from wsgiref.util import setup_testing_defaults
+
+def get(path):
+    environ = {'PATH_INFO': path, 'HTTP_HOST': 'localhost'}
+    setup_testing_defaults(environ)
+    status = []
+    t = time.perf_counter()
+    body = b''.join(application(environ, lambda s, h, e=None: status.append(s)))
+    elapsed = (time.perf_counter() - t) * 1000
+    assert status[0].startswith('200'), (path, status[0], body[:200])
+    return elapsed
+
+paths = json.loads(sys.argv[1])
+first = {path: get(path) for path in paths}
+second = {path: get(path) for path in paths}
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_ms': first,
+    'second_ms': second,
+    'ready_ms': (time.perf_counter() - started) * 1000 - sum(second.values()),
+    'modules': len(sys.modules),
+}))
+"""
+
+
+def probe_env(db_path, warm_up):
+    return dict(os.environ, SQLITE_PATH=db_path, DEBUG='False', APP_WARM_UP=str(warm_up),
+                DJANGO_SETTINGS_MODULE='matrix_backend.settings')
+
+
+def run_probe(db_path, warm_up):
+    out = subprocess.run(
+        [sys.executable, '-c', PROBE, json.dumps(PATHS)],
+        cwd=BACKEND_DIR, env=probe_env(db_path, warm_up), capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(db_path, top):
+    """Import time of matrix_backend.wsgi per top-level package, from -X importtime."""
+    out = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import matrix_backend.wsgi'],
+        cwd=BACKEND_DIR, env=probe_env(db_path, True), capture_output=True, text=True, check=True,
+    )
+    totals = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        # Self time, so each module is counted once however deep it was pulled in.
+        own, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        totals[package] = totals.get(package, 0) + int(own)
+    ranked = sorted(totals.items(), key=lambda item: -item[1])[:top]
+    return [{'package': package, 'self_ms': round(us / 1000, 1)} for package, us in ranked]
+
+
+def process_mode(db_path, runs):
+    results = {}
+    for warm_up in (True, False):
+        samples = [run_probe(db_path, warm_up) for _ in range(runs)]
+
+        def median(values):
+            return round(percentile(sorted(values), 50), 2)
+
+        summary = {
+            'import_ms': median([s['import_ms'] for s in samples]),
+            'ready_ms': median([s['ready_ms'] for s in samples]),
+            'modules': samples[-1]['modules'],
+            'first_request_ms': {p: median([s['first_ms'][p] for s in samples]) for p in PATHS},
+            'second_request_ms': {p: median([s['second_ms'][p] for s in samples]) for p in PATHS},
+        }
+        label = 'warm_up' if warm_up else 'no_warm_up'
+        results[label] = summary
+        firsts = ' '.join(f"{p.split('/')[2]}={summary['first_request_ms'][p]}" for p in PATHS)
+        print(f"{label:<11} import={summary['import_ms']}ms ready={summary['ready_ms']}ms first: {firsts} (ms)")
+    return results
+
+
+def memory_kb(pid):
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1])
+    except OSError:
+        return None
+    return {
+        'rss_kb': fields.get('Rss', 0),
+        'pss_kb': fields.get('Pss', 0),
+        'shared_kb': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+    }
+
+
+def gunicorn_mode(db_path, workers, port, requests_after_boot):
+    results = {}
+    for preload in (True, False):
+        started = time.monotonic()
+        process = start_gunicorn('wsgi', port, workers, db_path, GUNICORN_PRELOAD=str(preload))
+        try:
+            boot_s = time.monotonic() - started
+            # Until every worker has served something, some of these pay its cold start.
+            latencies = []
+            for i in range(requests_after_boot):
+                t = time.perf_counter()
+                asyncio.run(fetch_once('127.0.0.1', port, PATHS[i % len(PATHS)]))
+                latencies.append((time.perf_counter() - t) * 1000)
+            pids = worker_pids(process.pid)
+            per_worker = [m for m in (memory_kb(pid) for pid in pids) if m]
+            master = memory_kb(process.pid)
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=30)
+
+        summary = {
+            'first_response_s': round(boot_s, 3),
+            'first_requests_p50_ms': round(percentile(sorted(latencies), 50), 2),
+            'first_requests_max_ms': round(max(latencies), 2),
+            'workers': len(per_worker),
+            'master': master,
+            'worker_rss_kb': round(sum(m['rss_kb'] for m in per_worker) / len(per_worker)),
+            'worker_pss_kb': round(sum(m['pss_kb'] for m in per_worker) / len(per_worker)),
+            'worker_shared_kb': round(sum(m['shared_kb'] for m in per_worker) / len(per_worker)),
+            'total_pss_kb': sum(m['pss_kb'] for m in per_worker) + (master['pss_kb'] if master else 0),
+        }
+        label = 'preload' if preload else 'no_preload'
+        results[label] = summary
+        print(f"{label:<11} first response={summary['first_response_s']}s "
+              f"first {requests_after_boot} reqs p50={summary['first_requests_p50_ms']}ms max={summary['first_requests_max_ms']}ms "
+              f"worker rss={summary['worker_rss_kb']}KB pss={summary['worker_pss_kb']}KB "
+              f"shared={summary['worker_shared_kb']}KB total pss={summary['total_pss_kb']}KB")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=2)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests-after-boot', type=int, default=30)
+    parser.add_argument('--top-imports', type=int, default=15)
+    parser.add_argument('--skip-gunicorn', action='store_true')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', default=os.path.join(BACKEND_DIR, 'benchmarks', 'bench.sqlite3'))
+    parser.add_argument('--port', type=int, default=8767)
+    parser.add_argument('--output', default='bench-coldstart.json')
+    args = parser.parse_args()
+
+    setup_django(args.db, use_settings_db=False)
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    seed(args.scale, args.seed)
+
+    report = {'revision': git_revision(), 'config': vars(args)}
+    report['process'] = process_mode(args.db, args.runs)
+    report['slowest_imports'] = slowest_imports(args.db, args.top_imports)
+    for entry in report['slowest_imports']:
+        print(f"  {entry['package']:<30} {entry['self_ms']:>8}ms")
+    if not args.skip_gunicorn:
+        report['gunicorn'] = gunicorn_mode(args.db, args.workers, args.port, args.requests_after_boot)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Wrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+"""
+Load-testing benchmark for the public API.
+
+Boots the Django app on a threaded local server backed by its own SQLite file
+(or the configured database with --use-settings-db), seeds it at the requested
+scale, then replays the mobile app's traffic mix with concurrent virtual users.
+Per-endpoint p50/p95/p99 latency, throughput and queries per request are written
+as JSON so runs can be compared between commits.
+
+    python benchmarks/loadtest.py --scale 10 --users 16 --duration 30 --output bench.json
+    python benchmarks/loadtest.py --compare bench-main.json bench.json
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Weighted mix of what the mobile app actually does, per screen.
+TRAFFIC_MIX = [
+    ('home', 35),
+    ('search', 15),
+    ('menu', 15),
+    ('reels', 25),
+    ('checkout', 10),
+]
+
+SEARCH_TERMS = ['pi', 'bur', 'chi', 'ch', 'ma', 'juice', 'a', 'nyama', 'pil']
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def setup_django(db_path, use_settings_db):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'matrix_backend.settings')
+    os.environ.setdefault('DEBUG', 'False')
+    from django.conf import settings
+    if not use_settings_db:
+        settings.DATABASES['default'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': db_path,
+            'OPTIONS': {'timeout': 30},
+        }
+    import django
+    django.setup()
+
+
+def seed(scale, seed_value):
+    """Generate `scale` restaurants with a proportional catalog, orders and reels."""
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from api.models import Restaurant
+
+    if Restaurant.objects.count() < scale:
+        call_command(
+            'generate_dataset', restaurants=scale, products=20, users=scale * 20, orders=scale * 200,
+            reels=scale * 3, saved_reels=scale * 20, seed=seed_value, verbosity=0,
+        )
+    if not User.objects.filter(username='bench').exists():
+        User.objects.create_user('bench', 'bench@example.com', 'bench-password')
+
+
+def start_server(host, port):
+    """Serve the WSGI app from a background thread, reporting query counts per response."""
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+    from django.db import connection
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    django_app = WSGIHandler()
+
+    def app(environ, start_response):
+        counter = {'queries': 0}
+
+        def count(execute, sql, params, many, context):
+            counter['queries'] += 1
+            return execute(sql, params, many, context)
+
+        def counting_start_response(status, headers, exc_info=None):
+            headers.append(('X-Bench-Queries', str(counter['queries'])))
+            return start_response(status, headers, exc_info)
+
+        with connection.execute_wrapper(count):
+            return django_app(environ, counting_start_response)
+
+    server = ThreadedWSGIServer((host, port), QuietHandler, allow_reuse_address=True)
+    server.daemon_threads = True
+    server.set_app(app)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def access_token():
+    from django.contrib.auth.models import User
+    from rest_framework_simplejwt.tokens import RefreshToken
+    return str(RefreshToken.for_user(User.objects.get(username='bench')).access_token)
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, base_url, token, catalog, deadline, results, lock, seed_value):
+        super().__init__(daemon=True)
+        import requests
+        self.session = requests.Session()
+        self.base_url = base_url
+        self.token = token
+        self.catalog = catalog
+        self.deadline = deadline
+        self.results = results
+        self.lock = lock
+        self.rng = random.Random(seed_value)
+
+    def request(self, label, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=30, **kwargs)
+            status, size = response.status_code, len(response.content)
+            queries = response.headers.get('X-Bench-Queries')
+        except Exception:
+            status, size, queries = 0, 0, None
+        elapsed = (time.perf_counter() - started) * 1000
+        with self.lock:
+            self.results.append((label, elapsed, status, size, int(queries) if queries is not None else None))
+        return status
+
+    def home(self):
+        self.request('GET /restaurants/', 'GET', '/api/restaurants/')
+        self.request('GET /products/', 'GET', '/api/products/')
+
+    def search(self):
+        term = self.rng.choice(SEARCH_TERMS)
+        self.request('GET /products/?search=', 'GET', f'/api/products/?search={term}')
+
+    def menu(self):
+        restaurant = self.rng.choice(self.catalog['restaurants'])
+        self.request('GET /categories/?restaurant=', 'GET', f'/api/categories/?restaurant={restaurant}')
+        self.request('GET /products/?restaurant=', 'GET', f'/api/products/?restaurant={restaurant}')
+
+    def reels(self):
+        self.request('GET /reels/', 'GET', '/api/reels/')
+        for reel in self.rng.sample(self.catalog['reels'], min(3, len(self.catalog['reels']))):
+            self.request('POST /reels/{id}/view/', 'POST', f'/api/reels/{reel}/view/')
+
+    def checkout(self):
+        items = [{'id': pid, 'quantity': self.rng.randint(1, 3)}
+                 for pid in self.rng.sample(self.catalog['products'], self.rng.randint(1, 4))]
+        self.request('POST /orders/', 'POST', '/api/orders/', json={
+            'items': items, 'delivery_address': 'Benchmark St', 'payment_method': 'cash',
+        }, headers={'Authorization': f'Bearer {self.token}'})
+
+    def run(self):
+        scenarios = [name for name, _ in TRAFFIC_MIX]
+        weights = [weight for _, weight in TRAFFIC_MIX]
+        while time.monotonic() < self.deadline:
+            getattr(self, self.rng.choices(scenarios, weights)[0])()
+
+
+def summarize(results, duration):
+    endpoints = {}
+    for label, elapsed, status, size, queries in results:
+        endpoints.setdefault(label, []).append((elapsed, status, size, queries))
+
+    report = {}
+    for label, samples in sorted(endpoints.items()):
+        latencies = sorted(s[0] for s in samples)
+        queries = [s[3] for s in samples if s[3] is not None]
+        report[label] = {
+            'requests': len(samples),
+            'errors': sum(1 for s in samples if not 200 <= s[1] < 400),
+            'throughput_rps': round(len(samples) / duration, 2),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'mean_bytes': int(sum(s[2] for s in samples) / len(samples)),
+            'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        }
+    return report
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(baseline_path, current_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)['endpoints']
+    with open(current_path) as f:
+        current = json.load(f)['endpoints']
+
+    print(f"{'endpoint':32} {'p50':>18} {'p95':>18} {'rps':>18} {'queries':>14}")
+    for label in sorted(set(baseline) | set(current)):
+        old, new = baseline.get(label, {}), current.get(label, {})
+
+        def cell(key):
+            a, b = old.get(key), new.get(key)
+            if a is None or b is None:
+                return f'{a} -> {b}'
+            change = ((b - a) / a * 100) if a else 0
+            return f'{a}->{b} ({change:+.0f}%)'
+
+        print(f"{label:32} {cell('p50_ms'):>18} {cell('p95_ms'):>18} {cell('throughput_rps'):>18} {cell('queries_per_request'):>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=10, help='Number of restaurants to seed (catalog grows proportionally)')
+    parser.add_argument('--users', type=int, default=8, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds to run the traffic mix')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', default=os.path.join(BACKEND_DIR, 'benchmarks', 'bench.sqlite3'))
+    parser.add_argument('--use-settings-db', action='store_true', help='Use DATABASES from settings instead of --db')
+    parser.add_argument('--url', help='Benchmark an already running server instead of booting one')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', default='bench.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help='Compare two reports and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    setup_django(args.db, args.use_settings_db)
+    from django.core.management import call_command
+    from api.models import Restaurant, Product, Reel
+
+    call_command('migrate', verbosity=0)
+    seed(args.scale, args.seed)
+
+    catalog = {
+        'restaurants': list(Restaurant.objects.values_list('id', flat=True)),
+        'products': list(Product.objects.values_list('id', flat=True)),
+        'reels': list(Reel.objects.values_list('id', flat=True)),
+    }
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        server = start_server('127.0.0.1', args.port)
+        base_url = f'http://127.0.0.1:{args.port}'
+
+    results, lock = [], threading.Lock()
+    token = access_token()
+    deadline = time.monotonic() + args.duration
+    started = time.monotonic()
+    users = [VirtualUser(base_url, token, catalog, deadline, results, lock, args.seed + i) for i in range(args.users)]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.monotonic() - started
+
+    if server:
+        server.shutdown()
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+        'config': {
+            'scale': args.scale, 'users': args.users, 'duration': args.duration, 'seed': args.seed,
+            'database': 'settings' if args.use_settings_db else 'sqlite', 'url': args.url,
+        },
+        'total_requests': len(results),
+        'throughput_rps': round(len(results) / elapsed, 2),
+        'endpoints': summarize(results, elapsed),
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for label, stats in report['endpoints'].items():
+        print(f"{label:32} p50={stats['p50_ms']:>8}ms p95={stats['p95_ms']:>8}ms p99={stats['p99_ms']:>8}ms "
+              f"rps={stats['throughput_rps']:>7} q/req={stats['queries_per_request']} errors={stats['errors']}")
+    print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Compare response renderers on the product and reel list payloads.
+
+Seeds the benchmark database, serializes the full product and reel lists once,
+then times DRF's stdlib JSONRenderer, the orjson-backed FastJSONRenderer and
+MessagePackRenderer on that data. That the fast JSON output is byte-identical
+to DRF's is checked by api.tests.RendererTests.
+
+    python benchmarks/renderers.py --scale 20 --repeat 50 --output bench-renderers.json
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from loadtest import BACKEND_DIR, git_revision, seed, setup_django
+
+
+def time_render(render, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = render(data)
+        timings.append((time.perf_counter() - started) * 1000)
+    return body, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', default=os.path.join(BACKEND_DIR, 'benchmarks', 'bench.sqlite3'))
+    parser.add_argument('--output', default='bench-renderers.json')
+    args = parser.parse_args()
+
+    setup_django(args.db, use_settings_db=False)
+    from django.core.management import call_command
+    from rest_framework.renderers import JSONRenderer
+    from api.models import Product, Reel
+    from api.renderers import FastJSONRenderer, MessagePackRenderer
+    from api.serializers import ProductSerializer, ReelSerializer
+
+    call_command('migrate', verbosity=0)
+    seed(args.scale, args.seed)
+
+    payloads = {
+        'products': ProductSerializer(Product.objects.select_related('restaurant'), many=True).data,
+        'reels': ReelSerializer(
+            Reel.objects.select_related('restaurant', 'product__restaurant'), many=True, context={'saved_reel_ids': set()},
+        ).data,
+    }
+    renderers = {
+        'drf_json': JSONRenderer(),
+        'fast_json': FastJSONRenderer(),
+        'msgpack': MessagePackRenderer(),
+    }
+
+    report = {'revision': git_revision(), 'config': vars(args), 'payloads': {}}
+    for name, data in payloads.items():
+        results = {}
+        for renderer_name, renderer in renderers.items():
+            body, timings = time_render(renderer.render, data, args.repeat)
+            results[renderer_name] = {
+                'bytes': len(body),
+                'mean_ms': round(statistics.mean(timings), 3),
+                'p50_ms': round(statistics.median(timings), 3),
+                'min_ms': round(min(timings), 3),
+            }
+        baseline = results['drf_json']['mean_ms']
+        for renderer_name, stats in results.items():
+            stats['speedup'] = round(baseline / stats['mean_ms'], 2) if stats['mean_ms'] else None
+            print(f"{name:<9} {renderer_name:<10} {stats['bytes']:>10} bytes  mean={stats['mean_ms']:>8}ms  "
+                  f"p50={stats['p50_ms']:>8}ms  x{stats['speedup']}")
+        report['payloads'][name] = {'rows': len(data), 'renderers': results}
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Wrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+#!/bin/sh
+set -e
+
+# STATIC_ROOT is a volume shared with nginx that outlives the image, so refresh
+# it (and the manifest the hashed static storage reads) on every start.
+python manage.py collectstatic --noinput
+
+exec "$@"
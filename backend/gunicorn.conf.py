@@ -0,0 +1,41 @@
+# Gunicorn settings shared by Dockerfile and docker-compose.yml.
+# SERVER_MODE=asgi runs uvicorn workers against matrix_backend.asgi (async catalog views).
+import gc
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', '1'))
+
+if os.environ.get('SERVER_MODE', 'wsgi') == 'asgi':
+    wsgi_app = 'matrix_backend.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'matrix_backend.wsgi:application'
+
+# Build the app once in the master (see matrix_backend/startup.py) and fork
+# workers from it, sharing its memory copy-on-write. Code changes then need a
+# full restart rather than a HUP.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the GC's reach, so collections in the
+    # workers don't write to (and so copy) the shared pages.
+    gc.freeze()
+
+
+def _metrics_dir():
+    from matrix_backend.settings import METRICS_DIR
+    return METRICS_DIR
+
+
+def on_starting(server):
+    # Snapshots left by a previous run (api.metrics) must not count towards this one.
+    from api.metrics import reset
+    reset(_metrics_dir())
+
+
+def child_exit(server, worker):
+    # Keep its counts, but free its pid's file for the next worker that gets the pid.
+    from api.metrics import retire_worker
+    retire_worker(_metrics_dir(), worker.pid)
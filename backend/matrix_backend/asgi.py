@@ -7,10 +7,6 @@ For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
 
-import os
-
-from django.core.asgi import get_asgi_application
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'matrix_backend.settings')
+from .startup import get_asgi_application
 
 application = get_asgi_application()
@@ -0,0 +1,87 @@
+"""
+Serving the admin-web build.
+
+Static files are collected with Django's manifest hashing, except the Vite
+bundle under assets/, which Vite has already named by content hash; renaming
+it again would break the references in index.html. WhiteNoise precompresses
+everything (brotli and gzip) at collectstatic time and serves both kinds of
+hashed name as immutable (WHITENOISE_IMMUTABLE_FILE_TEST).
+
+The SPA shell (index.html) is read once per process and kept in memory with
+its compressed variants and an ETag, so client-side routes never go through
+the template engine and revalidation costs a 304.
+"""
+import gzip
+import hashlib
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_safe
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Vite output: assets/<name>-<8 char base64url hash>.<ext>
+VITE_ASSET = re.compile(r'^assets/.+-[A-Za-z0-9_-]{8}\.\w+$')
+
+
+class HashedStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    def hashed_name(self, name, content=None, filename=None):
+        if VITE_ASSET.match(name):
+            return name
+        return super().hashed_name(name, content, filename)
+
+
+class Shell:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.body = f.read()
+        self.mtime = os.path.getmtime(path)
+        self.etag = '"%s"' % hashlib.sha256(self.body).hexdigest()[:32]
+        self.encoded = {'gzip': gzip.compress(self.body, 9)}
+        if brotli is not None:
+            self.encoded['br'] = brotli.compress(self.body)
+
+    def variant(self, accept_encoding):
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encoded and encoding in accept_encoding:
+                return encoding, self.encoded[encoding]
+        return None, self.body
+
+
+_shell = None
+
+
+def get_shell():
+    global _shell
+    path = finders.find(settings.SPA_SHELL)
+    if path is None:
+        raise Http404('Frontend build not found')
+    # Production reads the file once; in DEBUG a rebuild is picked up on the next request.
+    if _shell is None or (settings.DEBUG and os.path.getmtime(path) != _shell.mtime):
+        _shell = Shell(path)
+    return _shell
+
+
+@require_safe
+def spa_shell(request):
+    shell = get_shell()
+    if shell.etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        encoding, body = shell.variant(request.headers.get('Accept-Encoding', ''))
+        response = HttpResponse(body, content_type='text/html; charset=utf-8')
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = shell.etag
+    # Always revalidate so a deploy is picked up immediately; the assets it points to are immutable.
+    response['Cache-Control'] = 'no-cache'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
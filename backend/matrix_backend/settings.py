@@ -1,5 +1,6 @@
 
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.ReplicaPinMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Add Whitenoise
@@ -52,14 +55,25 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ProfilingMiddleware',
 ]
 
+# Server mode: 'wsgi' (gunicorn sync workers) or 'asgi' (gunicorn + uvicorn workers, see gunicorn.conf.py)
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+# Serve restaurant/product/reel reads from async views (api.async_views); on by default under ASGI
+ASYNC_CATALOG = os.environ.get('ASYNC_CATALOG', str(SERVER_MODE == 'asgi')) == 'True'
+
+if SERVER_MODE == 'asgi':
+    # WhiteNoise is WSGI-only and would force every request through a sync thread;
+    # matrix_backend/asgi.py serves static files instead (nginx serves them in compose).
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
 ROOT_URLCONF = 'matrix_backend.urls'
 
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [os.path.join(BASE_DIR, 'static')],  # Look in static for index.html if we serve frontend from there
+        'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -81,7 +95,7 @@ WSGI_APPLICATION = 'matrix_backend.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
     }
 }
 
@@ -93,6 +107,52 @@ if os.environ.get('DB_ENGINE') == 'postgresql':
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD', 'dhadhan_@2020'),
         'HOST': os.environ.get('POSTGRES_HOST', 'db'),
         'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        # Keep connections open between requests and ping them before reuse
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+    }
+
+    if os.environ.get('DB_POOL') == 'True':
+        # psycopg 3 connection pool per worker (persistent connections must be off).
+        # CONN_HEALTH_CHECKS above makes Django pass the pool's check_connection.
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+                'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+                'timeout': 10,
+            },
+        }
+
+# Read replicas: catalog and reel reads are routed here by api.routers.ReadReplicaRouter.
+# POSTGRES_REPLICA_HOSTS=host1,host2 clones the default settings per host;
+# SQLITE_REPLICA_PATHS=a.sqlite3,b.sqlite3 does the same for local testing.
+REPLICA_DATABASES = []
+
+replica_hosts = [h for h in os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(',') if h]
+replica_paths = [p for p in os.environ.get('SQLITE_REPLICA_PATHS', '').split(',') if p]
+for i, location in enumerate(replica_hosts or replica_paths):
+    alias = f'replica_{i}'
+    key = 'HOST' if replica_hosts else 'NAME'
+    DATABASES[alias] = {**DATABASES['default'], key: location, 'TEST': {'MIRROR': 'default'}}
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['api.routers.ReadReplicaRouter']
+
+
+# Cache
+# Per-process by default; set REDIS_URL so all gunicorn workers share one cache.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL'),
     }
 
 
@@ -133,12 +193,44 @@ USE_TZ = True
 STATIC_URL = '/static/'  # content: ensure leading slash
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
-# Use CompressedStorage instead of Manifest to avoid hashing conflicts with Vite
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
+# Manifest-hashed and precompressed; Vite's already-hashed assets/ keep their names (see matrix_backend.frontend)
+STORAGES = {
+    # Uploads are stored once per distinct content under their digest (api.storage)
+    'default': {
+        'BACKEND': 'api.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'matrix_backend.frontend.HashedStaticFilesStorage',
+    },
+}
+# Far-future, immutable caching for content-hashed names: Vite's name-<hash8>.ext and Django's name.<hex12>.ext
+WHITENOISE_IMMUTABLE_FILE_TEST = r'^/static/(assets/.+-[A-Za-z0-9_-]{8}|.+\.[0-9a-f]{12})\.\w+$'
+# admin-web entry point, served for every unmatched path
+SPA_SHELL = 'index.html'
 
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# How long an unreferenced blob is kept before prune_media_blobs may delete it
+MEDIA_BLOB_GRACE_SECONDS = int(os.environ.get('MEDIA_BLOB_GRACE_SECONDS', '3600'))
+
+# Resumable reel uploads (api.uploads). Part files live outside MEDIA_ROOT so they are never served.
+REEL_UPLOAD_DIR = os.environ.get('REEL_UPLOAD_DIR', os.path.join(BASE_DIR, 'reel_uploads'))
+REEL_UPLOAD_MAX_BYTES = int(os.environ.get('REEL_UPLOAD_MAX_BYTES', str(1024 * 1024 * 1024)))
+# Keep below nginx's client_max_body_size
+REEL_UPLOAD_CHUNK_MAX_BYTES = int(os.environ.get('REEL_UPLOAD_CHUNK_MAX_BYTES', str(8 * 1024 * 1024)))
+REEL_UPLOAD_TTL = int(os.environ.get('REEL_UPLOAD_TTL', str(24 * 3600)))
+
+# Remote media ingestion (api.ingest, ingest_media command, /api/media/ingest/)
+INGEST_DIR = os.environ.get('INGEST_DIR', os.path.join(BASE_DIR, 'ingest_downloads'))
+INGEST_CONCURRENCY = int(os.environ.get('INGEST_CONCURRENCY', '8'))
+INGEST_CONNECT_TIMEOUT = float(os.environ.get('INGEST_CONNECT_TIMEOUT', '5'))
+INGEST_READ_TIMEOUT = float(os.environ.get('INGEST_READ_TIMEOUT', '30'))
+INGEST_RETRIES = int(os.environ.get('INGEST_RETRIES', '2'))
+INGEST_MAX_BYTES = int(os.environ.get('INGEST_MAX_BYTES', str(500 * 1024 * 1024)))
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', '200'))
+# The endpoint downloads within the request, so it takes a bounded bite per call; the command has no cap
+INGEST_REQUEST_LIMIT = int(os.environ.get('INGEST_REQUEST_LIMIT', '25'))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -148,10 +240,91 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ),
+    # orjson-backed JSON by default; MessagePack for clients that ask for application/msgpack
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'api.renderers.MessagePackRenderer',
+    ),
+    # Applies only to views that set throttle_scope; counters are shared through the cache
+    'DEFAULT_THROTTLE_CLASSES': (
+        'api.throttling.ScopedSlidingWindowThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'reel_view': os.environ.get('THROTTLE_REEL_VIEW', '120/min'),
+        'reel_view_anon': os.environ.get('THROTTLE_REEL_VIEW_ANON', '60/min'),
+        'google_login': os.environ.get('THROTTLE_GOOGLE_LOGIN', '10/min'),
+        'order_create': os.environ.get('THROTTLE_ORDER_CREATE', '10/min'),
+    },
+    # nginx sits in front of gunicorn and appends the client IP to X-Forwarded-For
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', '1')),
 }
 
+# How long an authenticated user may be served from cache (api.authentication).
+# Saves and deletes drop the entry at once, but only from the cache of the
+# process that made them: with the default per-process LocMemCache every other
+# worker keeps serving the stale user (still active, old is_staff, ...) for up
+# to this many seconds. Set REDIS_URL to share one cache and make changes
+# immediate everywhere.
+AUTH_USER_CACHE_TTL = int(os.environ.get('AUTH_USER_CACHE_TTL', '30'))
+
+# Lifetime of cached cart prices (api.pricing). Product, restaurant and promotion
+# changes move or drop the entries, so this only bounds staleness across workers
+# when using the per-process cache.
+PRICE_CACHE_TTL = int(os.environ.get('PRICE_CACHE_TTL', '300'))
+
+# Lifetime of cached restaurant menu bundles (api.menus); invalidated the same way.
+MENU_CACHE_TTL = int(os.environ.get('MENU_CACHE_TTL', '300'))
+
+# Search suggestions (api.suggest): catalog edits rebuild the index in the
+# background once committed; a snapshot older than this is replaced by a full
+# rebuild that also picks up changes in order popularity.
+SUGGEST_INDEX_TTL = int(os.environ.get('SUGGEST_INDEX_TTL', '600'))
+
+# Trending scores (api.trending, refresh_trending): an order counts as much as
+# TRENDING_ORDER_WEIGHT views; activity loses half its weight every half-life.
+TRENDING_WINDOW_HOURS = int(os.environ.get('TRENDING_WINDOW_HOURS', '72'))
+TRENDING_HALF_LIFE_HOURS = float(os.environ.get('TRENDING_HALF_LIFE_HOURS', '12'))
+TRENDING_ORDER_WEIGHT = float(os.environ.get('TRENDING_ORDER_WEIGHT', '10'))
+TRENDING_VIEW_WEIGHT = float(os.environ.get('TRENDING_VIEW_WEIGHT', '1'))
+# Views are counted in memory per worker and written once this many counters
+# have changed or the oldest count is this many seconds old.
+TRENDING_VIEW_BATCH_SIZE = int(os.environ.get('TRENDING_VIEW_BATCH_SIZE', '500'))
+TRENDING_VIEW_FLUSH_SECONDS = float(os.environ.get('TRENDING_VIEW_FLUSH_SECONDS', '10'))
+
+# Order archival (api.archive, archive_orders): delivered and cancelled orders
+# older than this move to the archive tables.
+ORDER_ARCHIVE_AFTER_DAYS = int(os.environ.get('ORDER_ARCHIVE_AFTER_DAYS', '90'))
+ORDER_ARCHIVE_BATCH_SIZE = int(os.environ.get('ORDER_ARCHIVE_BATCH_SIZE', '500'))
+# Orders per page of GET /api/orders/ when the client opts into cursor paging with
+# ?page_size= (up to 100) or ?cursor=; without either the list is unpaginated.
+ORDER_PAGE_SIZE = int(os.environ.get('ORDER_PAGE_SIZE', '20'))
+# Days with orders in the revenue chart of GET /api/orders/stats/
+ORDER_STATS_DAYS = int(os.environ.get('ORDER_STATS_DAYS', '7'))
+
+# Reel engagement analytics (api.engagement, rollup_reel_engagement)
+ENGAGEMENT_BATCH_SIZE = int(os.environ.get('ENGAGEMENT_BATCH_SIZE', '500'))
+ENGAGEMENT_FLUSH_SECONDS = float(os.environ.get('ENGAGEMENT_FLUSH_SECONDS', '10'))
+ENGAGEMENT_ROLLUP_CHUNK = int(os.environ.get('ENGAGEMENT_ROLLUP_CHUNK', '100000'))
+ENGAGEMENT_RAW_RETENTION_DAYS = int(os.environ.get('ENGAGEMENT_RAW_RETENTION_DAYS', '30'))
+ENGAGEMENT_HOURLY_RETENTION_DAYS = int(os.environ.get('ENGAGEMENT_HOURLY_RETENTION_DAYS', '90'))
+
+# "Frequently ordered together" (api.recommendations, build_related_products)
+RELATED_TOP_K = int(os.environ.get('RELATED_TOP_K', '10'))
+RELATED_MIN_ORDERS = int(os.environ.get('RELATED_MIN_ORDERS', '2'))
+RECOMMENDATIONS_STATE = os.environ.get('RECOMMENDATIONS_STATE', os.path.join(BASE_DIR, 'recommendations', 'cooccurrence.npz'))
+
+# Rows fetched and serialized per step of a ?stream=json|jsonl export (api.streaming)
+STREAMING_CHUNK_SIZE = int(os.environ.get('STREAMING_CHUNK_SIZE', '500'))
+
+# How long an Idempotency-Key on order creation is remembered (api.idempotency).
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', str(24 * 3600)))
+# How long a request holds its key before a retry may take it over, e.g. after
+# the worker running it died. Longer than order creation ever takes.
+IDEMPOTENCY_LEASE_SECONDS = int(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', '30'))
+
 # JWT Configuration
 from datetime import timedelta
 SIMPLE_JWT = {
@@ -160,10 +333,27 @@ SIMPLE_JWT = {
 }
 
 # CORS Configuration
+from corsheaders.defaults import default_headers
 CORS_ALLOW_ALL_ORIGINS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 CSRF_TRUSTED_ORIGINS = ['https://abi.sominnovations.xyz', 'http://abi.sominnovations.xyz', 'http://206.189.58.214']
 
 # IntaSend Configuration
 INTASEND_PUBLISHABLE_KEY = os.environ.get('INTASEND_PUBLISHABLE_KEY', 'ISPubKey_test_aaf769df-c75f-4e9c-9548-95ba870dbba8')
 INTASEND_SECRET_KEY = os.environ.get('INTASEND_SECRET_KEY', 'ISSecretKey_test_b49d2f64-d541-4408-83fd-0d59ab6853b8')
 INTASEND_TEST_MODE = os.environ.get('INTASEND_TEST_MODE', 'True') == 'True'
+# Seconds to wait for the IntaSend API (connect and each read) before giving up on a call.
+INTASEND_TIMEOUT = float(os.environ.get('INTASEND_TIMEOUT', '10'))
+
+# Prometheus metrics
+# Each worker snapshots its counters into METRICS_DIR; /metrics sums them.
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'dhadhan-metrics'))
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '5'))
+# Scrapes must send "Authorization: Bearer <token>"; without a token /metrics is only served when DEBUG.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Request profiling (staff send "X-Profile: 1" or "X-Profile: inline")
+PROFILING_DIR = os.environ.get('PROFILING_DIR', os.path.join(tempfile.gettempdir(), 'dhadhan-profiles'))
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_MAX_PROFILES = int(os.environ.get('PROFILING_MAX_PROFILES', '200'))
+PROFILING_TOP_FUNCTIONS = 40
@@ -0,0 +1,56 @@
+"""
+Building the application for gunicorn.
+
+gunicorn.conf.py preloads the app: it is built once in the master and the
+workers are forked from it, sharing its memory copy-on-write, so a new or
+restarted worker starts serving immediately instead of importing Django, DRF
+and the project again. To make that cover the first request too, the factory
+also loads the URLconf (which imports every view and serializer module) and
+the SPA shell before the fork, then closes any database connection opened on
+the way so no worker inherits a socket.
+
+APP_WARM_UP=False skips the warm-up, leaving those imports to the first request
+in each worker (benchmarks/coldstart.py compares the two).
+"""
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'matrix_backend.settings')
+
+
+def warm_up():
+    from django.db import connections
+    from django.http import Http404
+    from django.urls import get_resolver
+
+    # Populating the resolver imports every view module the URLconf names.
+    get_resolver().reverse_dict
+    try:
+        from .frontend import get_shell
+        get_shell()
+    except Http404:  # no frontend build in this deployment
+        pass
+    connections.close_all()
+
+
+def _should_warm_up():
+    return os.environ.get('APP_WARM_UP', 'True') == 'True'
+
+
+def get_wsgi_application():
+    from django.core.wsgi import get_wsgi_application as django_wsgi_application
+
+    application = django_wsgi_application()
+    if _should_warm_up():
+        warm_up()
+    return application
+
+
+def get_asgi_application():
+    from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+    from django.core.asgi import get_asgi_application as django_asgi_application
+
+    application = django_asgi_application()
+    if _should_warm_up():
+        warm_up()
+    # WhiteNoise only wraps WSGI, so static files are served here in ASGI mode.
+    return ASGIStaticFilesHandler(application)
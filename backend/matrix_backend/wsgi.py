@@ -7,10 +7,6 @@ For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/wsgi/
 """
 
-import os
-
-from django.core.wsgi import get_wsgi_application
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'matrix_backend.settings')
+from .startup import get_wsgi_application
 
 application = get_wsgi_application()